@@ -0,0 +1,66 @@
+"""CPU time per page for handing a rendered PDF page to the OCR stage.
+
+Compares the previous path (JPEG encode in PDFExtractorService, JPEG decode in
+OCRService, PNG encode for the LLM request) with the direct path (PNG encode
+only).
+
+    python -m benchmarks.bench_page_handoff --dpi 200 --pages 5
+"""
+import time
+import argparse
+from io import BytesIO
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from core.services.ocr_llm import OCRLLMService
+
+
+def make_page_image(dpi: int) -> Image.Image:
+    pdf = fitz.open()
+    page = pdf.new_page(width=595, height=842)  # A4
+    y = 60
+    for i in range(45):
+        page.insert_text((60, y), f"Line {i}: The quick brown fox jumps over the lazy dog 0123456789.", fontsize=10)
+        y += 16
+    pix = page.get_pixmap(dpi=dpi, alpha=False)
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    pdf.close()
+    return image
+
+
+def jpeg_round_trip(service: OCRLLMService, image: Image.Image) -> str:
+    buf = BytesIO()
+    image.save(buf, format="JPEG")
+    decoded = Image.open(BytesIO(buf.getvalue()))
+    return service.image_to_base64(decoded)
+
+
+def direct(service: OCRLLMService, image: Image.Image) -> str:
+    return service.image_to_base64(image)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+
+    service = OCRLLMService.provider()
+    image = make_page_image(args.dpi)
+    print(f"Page: {image.width}x{image.height} px at {args.dpi} DPI, {args.pages} pages")
+
+    timings = {}
+    for name, func in [("jpeg_round_trip", jpeg_round_trip), ("direct", direct)]:
+        started = time.process_time()
+        for _ in range(args.pages):
+            func(service, image)
+        timings[name] = (time.process_time() - started) / args.pages
+        print(f"{name:>16}: {timings[name] * 1000:8.1f} ms CPU/page")
+
+    saved = timings["jpeg_round_trip"] - timings["direct"]
+    print(f"{'saved':>16}: {saved * 1000:8.1f} ms CPU/page ({saved / timings['jpeg_round_trip']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
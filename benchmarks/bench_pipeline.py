@@ -0,0 +1,332 @@
+"""Offline benchmark suite for the CPU-side pipeline stages.
+
+Times each stage over synthetic and recorded fixtures (see `benchmarks.fixtures`)
+across page counts, and reports ops/sec and peak memory. One op runs the stage
+over every page of the document. Needs no GPU, network, Redis or MinIO: uploads
+are discarded, picture URLs are still hashed and their static copies written to a
+temp directory.
+
+Stages:
+- render: rasterize the PDF, page by page (`render_page_range`)
+- encode: encode page images for the LLM (`OCRLLMService.encode_image`)
+- parse: stream each page's OCR JSON through `OCROutputStream` and validate it
+- crop: cut out picture regions (`PictureCrops`)
+- markdown: page markdown, with picture uploads (`OCRService.convert_to_markdown`)
+- merge: table-aware document merge (`TableAwareMergeService.merge`)
+
+Page images are rendered once for the first `--image-pages` pages and reused
+for the rest. Pass --json to save the results, and --baseline to fail (exit 1)
+when a case is more than --max-regression slower than a saved run:
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --stages merge --pages 10,300 --fixtures synthetic-dense
+    python -m benchmarks.bench_pipeline --json baseline.json
+    python -m benchmarks.bench_pipeline --baseline baseline.json --max-regression 0.2
+"""
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from dataclasses import dataclass, asdict
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from core.services import minio as minio_module
+from core.services.minio import MinioService
+from core.services.ocr_llm import OCRLLMService, EncodedImage, ExtractionResult
+from core.services.ocr_stream import OCROutputStream
+from services.ocr.service import OCRService, PictureCrops
+from services.pdf_extractor.renderer import PDFRendererService, render_page_range
+from services.pdf_extractor.merge_services.table_aware import (
+    TableAwareMergeConfig,
+    TableAwareResultInput,
+    TableAwareMergeService,
+)
+from benchmarks.fixtures import Fixture, synthetic_fixture, recorded_fixture, recorded_names
+
+STAGES = ("render", "encode", "parse", "crop", "markdown", "merge")
+SYNTHETIC_FIXTURES = ("synthetic-sparse", "synthetic-normal", "synthetic-dense")
+STREAM_CHUNK_CHARS = 16  # About the text of a few tokens per streamed delta
+MIB = 1024 * 1024
+
+
+@dataclass
+class Document:
+    fixture: Fixture
+    pdf: fitz.Document
+    images: list[Image.Image]  # The first pages, reused for the rest
+    results: list[list[ExtractionResult]]  # Bboxes in image pixels
+    outputs: list[str]  # OCR LLM output of each page
+    crops: list[PictureCrops]
+
+    def image(self, page_idx: int) -> Image.Image:
+        return self.images[page_idx % len(self.images)]
+
+
+@dataclass
+class BenchResult:
+    stage: str
+    fixture: str
+    pages: int
+    elements: int
+    ops: int
+    seconds: float
+    ops_per_sec: float
+    ms_per_op: float
+    pages_per_sec: float
+    py_peak_mib: float | None  # Python heap, from tracemalloc
+    rss_peak_mib: float | None  # Resident set growth, includes image buffers; approximate
+
+
+def _rss() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _RSSSampler(threading.Thread):
+    def __init__(self, interval: float = 0.002):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.start_rss = _rss()
+        self.peak = self.start_rss or 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss() or 0)
+
+    def stop(self) -> float | None:
+        self._done.set()
+        self.join()
+        if self.start_rss is None:
+            return None
+        return max(self.peak, _rss() or 0) - self.start_rss
+
+
+@contextmanager
+def use_offline_object_storage() -> Iterator[None]:
+    '''Discard uploads on the shared MinIO client, and write static copies to a temp directory
+    removed on exit, so nothing leaves the process or lands in the working tree.'''
+    minio = MinioService.provider()
+    patched = ("bucket_exists", "put_object", "fput_object")
+    originals = {name: getattr(minio, name) for name in patched}
+    temp_dir, static_dir = minio_module.TEMP_DIR, tempfile.mkdtemp(prefix="bench_static_")
+
+    minio.bucket_exists = lambda bucket_name: True  # type: ignore
+    minio.put_object = lambda bucket_name, object_name, data, length, **kwargs: data.read(length)  # type: ignore
+    minio.fput_object = lambda bucket_name, object_name, file_path, **kwargs: None  # type: ignore
+    minio_module.TEMP_DIR = static_dir
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(minio, name, original)
+        minio_module.TEMP_DIR = temp_dir
+        shutil.rmtree(static_dir, ignore_errors=True)
+
+
+class PipelineBench:
+    def __init__(self, max_dpi: float | None, image_pages: int):
+        self.ocr_llm_service = OCRLLMService.provider()
+        self.ocr_service = OCRService.provider()
+        self.merge_service = TableAwareMergeService.provider()
+        self.render_options = PDFRendererService.provider().render_options.copy()
+        if max_dpi is not None:
+            self.render_options["max_dpi"] = max_dpi
+        self.image_pages = image_pages
+
+    def load(self, fixture: Fixture) -> Document:
+        pdf = fitz.open(stream=fixture.to_pdf(), filetype="pdf")
+        pixmaps = render_page_range(pdf, 0, min(self.image_pages, pdf.page_count), self.render_options)
+        images = [Image.frombytes("RGB", (p["width"], p["height"]), p["samples"]) for p in pixmaps]
+        results = fixture.scaled(pixmaps[0]["dpi"] / 72)
+        return Document(
+            fixture=fixture,
+            pdf=pdf,
+            images=images,
+            results=results,
+            outputs=[json.dumps([r.model_dump() for r in page], ensure_ascii=False) for page in results],
+            crops=[PictureCrops(images[i % len(images)], page) for i, page in enumerate(results)],
+        )
+
+    def render(self, doc: Document):
+        # One page at a time, so a long document's pixmaps are never all held at once
+        for page_idx in range(doc.pdf.page_count):
+            render_page_range(doc.pdf, page_idx, page_idx + 1, self.render_options)
+
+    def encode(self, doc: Document):
+        for page_idx in range(len(doc.results)):
+            self.ocr_llm_service.encode_image(doc.image(page_idx), self.ocr_llm_service.image_encoding)
+
+    def parse(self, doc: Document):
+        for page_idx, text in enumerate(doc.outputs):
+            image = doc.image(page_idx)
+            output = OCROutputStream(self.ocr_llm_service.degeneration)
+            for start in range(0, len(text), STREAM_CHUNK_CHARS):
+                output.feed(text[start:start + STREAM_CHUNK_CHARS])
+            self.ocr_llm_service._parse_output(
+                output,
+                EncodedImage(data_url="", width=image.width, height=image.height),
+            )
+
+    def crop(self, doc: Document):
+        for page_idx, results in enumerate(doc.results):
+            PictureCrops(doc.image(page_idx), results)
+
+    def markdown(self, doc: Document):
+        for page_idx, results in enumerate(doc.results):
+            self.ocr_service.convert_to_markdown(doc.crops[page_idx], results, f"{doc.fixture.name}_page_{page_idx}")
+
+    def merge(self, doc: Document):
+        self.merge_service.merge(
+            images=doc.crops,
+            filename=doc.fixture.name,
+            results=[
+                TableAwareResultInput(page_number=page_idx + 1, ocr_results=results)
+                for page_idx, results in enumerate(doc.results)
+            ],
+            config=TableAwareMergeConfig(),
+        )
+
+
+def measure(op: Callable[[], object], min_time: float, min_ops: int) -> tuple[int, float]:
+    op()  # Warm-up
+    ops = 0
+    started = time.perf_counter()
+    while ops < min_ops or time.perf_counter() - started < min_time:
+        op()
+        ops += 1
+    return ops, time.perf_counter() - started
+
+
+def peak_memory(op: Callable[[], object]) -> tuple[float, float | None]:
+    '''Peak Python heap and resident set growth of one op, in MiB; measured
+    apart from the timed runs, since tracing allocations slows them down.'''
+    gc.collect()
+    sampler = _RSSSampler()
+    sampler.start()
+    tracemalloc.start()
+    try:
+        op()
+        _, py_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        rss_peak = sampler.stop()
+    return py_peak / MIB, None if rss_peak is None else rss_peak / MIB
+
+
+def load_fixture(name: str, page_count: int) -> Fixture:
+    if name.startswith("synthetic-"):
+        return synthetic_fixture(name.removeprefix("synthetic-"), page_count)  # type: ignore
+    return recorded_fixture(name, page_count)
+
+
+def compare(results: list[BenchResult], baseline_path: str, max_regression: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = {(r["stage"], r["fixture"], r["pages"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get((r.stage, r.fixture, r.pages))
+        if base is not None and r.ms_per_op > base["ms_per_op"] * (1 + max_regression):
+            regressions.append(
+                f"{r.stage} {r.fixture} {r.pages}p: {base['ms_per_op']:.2f} -> {r.ms_per_op:.2f} ms/op "
+                f"(+{r.ms_per_op / base['ms_per_op'] - 1:.0%})"
+            )
+    return regressions
+
+
+def _csv(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stages", type=_csv, default=list(STAGES), help=f"Comma-separated, of {', '.join(STAGES)}")
+    parser.add_argument("--fixtures", type=_csv, default=None, help="Comma-separated (default: all)")
+    parser.add_argument("--pages", type=_csv, default=["1", "10"], help="Comma-separated page counts")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to repeat each case for")
+    parser.add_argument("--min-ops", type=int, default=1)
+    parser.add_argument("--max-dpi", type=float, default=None, help="Render DPI (default: PDF_MAX_DPI)")
+    parser.add_argument("--image-pages", type=int, default=4, help="Distinct page images per document")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory runs")
+    parser.add_argument("--json", type=str, default=None, help="Save results to this file")
+    parser.add_argument("--baseline", type=str, default=None, help="Results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown vs the baseline")
+    args = parser.parse_args()
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    fixtures = args.fixtures or [*SYNTHETIC_FIXTURES, *recorded_names()]
+    unknown = set(fixtures) - {*SYNTHETIC_FIXTURES, *recorded_names()}
+    if unknown:
+        parser.error(f"Unknown fixtures: {', '.join(sorted(unknown))}")
+
+    with use_offline_object_storage():
+        bench = PipelineBench(args.max_dpi, args.image_pages)
+        results: list[BenchResult] = []
+        print(
+            f"{'stage':>8} {'fixture':>18} {'pages':>5} {'elems':>6} {'ops':>4} "
+            f"{'ops/s':>9} {'ms/op':>10} {'pages/s':>9} {'py MiB':>8} {'rss MiB':>8}"
+        )
+        for page_count in map(int, args.pages):
+            for name in fixtures:
+                doc = bench.load(load_fixture(name, page_count))
+                for stage in args.stages:
+                    op = getattr(bench, stage)
+                    ops, seconds = measure(lambda: op(doc), args.min_time, args.min_ops)
+                    py_peak, rss_peak = (None, None) if args.no_memory else peak_memory(lambda: op(doc))
+                    r = BenchResult(
+                        stage=stage,
+                        fixture=name,
+                        pages=page_count,
+                        elements=doc.fixture.elements,
+                        ops=ops,
+                        seconds=round(seconds, 4),
+                        ops_per_sec=round(ops / seconds, 3),
+                        ms_per_op=round(seconds / ops * 1000, 3),
+                        pages_per_sec=round(ops * page_count / seconds, 2),
+                        py_peak_mib=None if py_peak is None else round(py_peak, 2),
+                        rss_peak_mib=None if rss_peak is None else round(rss_peak, 2),
+                    )
+                    results.append(r)
+                    print(
+                        f"{r.stage:>8} {r.fixture:>18} {r.pages:>5} {r.elements:>6} {r.ops:>4} "
+                        f"{r.ops_per_sec:>9.2f} {r.ms_per_op:>10.2f} {r.pages_per_sec:>9.1f} "
+                        f"{'-' if r.py_peak_mib is None else f'{r.py_peak_mib:.1f}':>8} "
+                        f"{'-' if r.rss_peak_mib is None else f'{r.rss_peak_mib:.1f}':>8}"
+                    )
+                doc.pdf.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "cpu_count": os.cpu_count(),
+                "render_options": bench.render_options,
+                "results": [asdict(r) for r in results],
+            }, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Encode time, payload size and end-to-end latency of the image wire encodings.
+
+Encode time and payload size are measured offline. Pass --endpoint to also
+measure end-to-end OCR latency against a running vLLM server (the OCR cache
+is bypassed).
+
+    python -m benchmarks.bench_wire_encoding --dpi 400
+    python -m benchmarks.bench_wire_encoding --dpi 400 --endpoint http://localhost:4377
+"""
+import os
+import time
+import asyncio
+import argparse
+
+from core.services.ocr_llm import OCRLLMService, ImageEncodingOptions
+from benchmarks.bench_page_handoff import make_page_image
+
+CONFIGS: dict[str, ImageEncodingOptions] = {
+    "png-6 (previous)": ImageEncodingOptions(format="PNG", png_compress_level=6, max_pixels=0),
+    "png-1": ImageEncodingOptions(format="PNG", png_compress_level=1, max_pixels=0),
+    "png-1 budget": ImageEncodingOptions(format="PNG", png_compress_level=1),
+    "jpeg-90 budget": ImageEncodingOptions(format="JPEG", quality=90),
+    "webp-90 budget": ImageEncodingOptions(format="WEBP", quality=90),
+}
+
+
+async def measure_latency(
+    service: OCRLLMService,
+    options: ImageEncodingOptions,
+    image,
+    repeat: int,
+) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await service.extract_text_async(image, options)
+    return (time.perf_counter() - started) / repeat
+
+
+async def run(args: argparse.Namespace):
+    if args.endpoint:
+        os.environ["OCR_LLM_ENDPOINTS"] = args.endpoint
+    service = OCRLLMService.provider()
+    service.cache_service.enabled = False
+
+    image = make_page_image(args.dpi)
+    print(f"Page: {image.width}x{image.height} px at {args.dpi} DPI")
+    print(f"{'encoding':>18} {'encode ms':>10} {'payload KB':>11} {'sent px':>12} {'e2e s':>8}")
+
+    for name, options in CONFIGS.items():
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            encoded = service.encode_image(image, options)
+        encode_ms = (time.perf_counter() - started) / args.repeat * 1000
+        payload_kb = len(encoded.data_url) / 1024
+
+        e2e = "-"
+        if args.endpoint:
+            e2e = f"{await measure_latency(service, options, image, args.repeat):.2f}"
+
+        print(f"{name:>18} {encode_ms:10.1f} {payload_kb:11.1f} {f'{encoded.width}x{encoded.height}':>12} {e2e:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dpi", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--endpoint", type=str, default=None, help="vLLM endpoint for end-to-end latency")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
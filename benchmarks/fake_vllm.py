@@ -0,0 +1,343 @@
+"""A fake OpenAI-compatible vLLM server that answers with canned dots.ocr-style layout JSON.
+
+Simulates what matters to the API's scheduling and backpressure, so they can be
+tuned without a GPU:
+- at most --max-num-seqs requests run at once, the rest wait in a queue
+  (reported by /metrics as `vllm:num_requests_waiting`, like vLLM)
+- time to first token drawn from --ttft, plus prefill time for the image tokens
+- decode at --tokens-per-second per request, shared out of --max-tokens-per-second
+  across the running requests
+- random errors, truncated output (finish_reason "length") and repetition loops
+
+The layout of each answer is a synthetic page (see `benchmarks.fixtures`) scaled
+to the image size. Distributions are `fixed:S`, `uniform:LOW,HIGH`,
+`lognormal:MEDIAN,SIGMA` or `exponential:MEAN`, in seconds.
+
+    python -m benchmarks.fake_vllm --port 4377
+    python -m benchmarks.fake_vllm --port 4377 --max-num-seqs 8 --ttft lognormal:0.8,0.5 \\
+        --tokens-per-second 60 --max-tokens-per-second 1500 --error-rate 0.02 --truncate-rate 0.05
+"""
+import io
+import json
+import math
+import time
+import base64
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+
+import uvicorn
+from PIL import Image
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from benchmarks.fixtures import PAGE_WIDTH, PAGE_HEIGHT, Density, synthetic_fixture
+
+IMAGE_PATCH_PIXELS = 28 * 28  # Pixels per image token in dots.ocr
+POOL_PAGES = 64  # Distinct canned layouts
+LOOP_PHRASE = "the same words again "
+
+
+@dataclass
+class Distribution:
+    kind: str
+    params: tuple[float, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> "Distribution":
+        kind, _, values = spec.partition(":")
+        if not values:
+            kind, values = "fixed", kind
+        params = tuple(float(v) for v in values.split(","))
+        arity = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+        if arity.get(kind) != len(params):
+            raise argparse.ArgumentTypeError(f"Invalid distribution: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        return self.params[0]
+
+
+@dataclass
+class FakeConfig:
+    model: str = "rednote-hilab/dots.ocr"
+    max_num_seqs: int = 16
+    ttft: Distribution = field(default_factory=lambda: Distribution("fixed", (0.2,)))
+    prefill_tokens_per_second: float = 10000  # 0 for no prefill time
+    tokens_per_second: float = 100  # Per request
+    max_tokens_per_second: float = 0  # Across running requests, 0 for no limit
+    chars_per_token: float = 4
+    chunk_tokens: int = 4  # Tokens per streamed delta
+    error_rate: float = 0.0
+    error_status: int = 503
+    truncate_rate: float = 0.0
+    loop_rate: float = 0.0
+    density: Density = "normal"
+    seed: int = 0
+
+
+class FakeEngine:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.pages = synthetic_fixture(config.density, POOL_PAGES, config.seed).pages
+        self.running = 0
+        self.waiting = 0
+        self.prompt_tokens = 0
+        self.generation_tokens = 0
+        self.finished: dict[str, int] = {"stop": 0, "length": 0, "abort": 0}
+        self._slots = asyncio.Semaphore(config.max_num_seqs)
+
+    @asynccontextmanager
+    async def sequence(self):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def decode_rate(self) -> float:
+        rate = self.config.tokens_per_second
+        if self.config.max_tokens_per_second > 0:
+            rate = min(rate, self.config.max_tokens_per_second / max(1, self.running))
+        return rate
+
+    def tokens(self, chars: int) -> int:
+        return math.ceil(chars / self.config.chars_per_token)
+
+    def answer(self, width: int, height: int, max_tokens: int) -> tuple[str, str]:
+        '''Output text and finish reason for an image of the given size.'''
+        scale_x, scale_y = width / PAGE_WIDTH, height / PAGE_HEIGHT
+        elements = [
+            {
+                "bbox": [round(r.bbox[0] * scale_x), round(r.bbox[1] * scale_y),
+                         round(r.bbox[2] * scale_x), round(r.bbox[3] * scale_y)],
+                "category": r.category,
+                **({"text": r.text} if r.category != "Picture" else {}),
+            }
+            for r in self.rng.choice(self.pages)
+        ]
+        text = json.dumps(elements, ensure_ascii=False)
+        max_chars = int(max_tokens * self.config.chars_per_token)
+
+        roll = self.rng.random()
+        if roll < self.config.loop_rate:
+            # Degenerate output: one element repeats the same words until max_tokens
+            prefix = text[:-1] + ', {"bbox": [0, 0, 10, 10], "category": "Text", "text": "'
+            repeats = max(0, (max_chars - len(prefix)) // len(LOOP_PHRASE) + 1)
+            return (prefix + LOOP_PHRASE * repeats)[:max_chars], "length"
+        if roll < self.config.loop_rate + self.config.truncate_rate:
+            return text[:int(len(text) * self.rng.uniform(0.3, 0.9))], "length"
+        if len(text) > max_chars:
+            return text[:max_chars], "length"
+        return text, "stop"
+
+
+def _image_size(body: dict) -> tuple[int, int]:
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if not isinstance(content, list):
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                url = part["image_url"]["url"]
+                data = base64.b64decode(url.split(",", 1)[1])
+                return Image.open(io.BytesIO(data)).size  # Reads the header only
+    return PAGE_WIDTH, PAGE_HEIGHT
+
+
+def _prompt_text_chars(body: dict) -> int:
+    chars = 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(part.get("text", "")) for part in content)
+    return chars
+
+
+def _error(message: str, status: int) -> JSONResponse:
+    return JSONResponse({"object": "error", "message": message, "type": "InternalServerError", "code": status}, status)
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    engine = FakeEngine(config)
+
+    @app.get("/health")
+    def health():
+        return PlainTextResponse("")
+
+    @app.get("/v1/models")
+    def models():
+        return {"object": "list", "data": [{"id": config.model, "object": "model", "owned_by": "vllm"}]}
+
+    @app.get("/metrics")
+    def metrics():
+        label = f'model_name="{config.model}"'
+        lines = [
+            "# TYPE vllm:num_requests_running gauge",
+            f"vllm:num_requests_running{{{label}}} {float(engine.running)}",
+            "# TYPE vllm:num_requests_waiting gauge",
+            f"vllm:num_requests_waiting{{{label}}} {float(engine.waiting)}",
+            "# TYPE vllm:prompt_tokens_total counter",
+            f"vllm:prompt_tokens_total{{{label}}} {float(engine.prompt_tokens)}",
+            "# TYPE vllm:generation_tokens_total counter",
+            f"vllm:generation_tokens_total{{{label}}} {float(engine.generation_tokens)}",
+            "# TYPE vllm:request_success_total counter",
+            *(
+                f'vllm:request_success_total{{finished_reason="{reason}",{label}}} {float(count)}'
+                for reason, count in engine.finished.items()
+            ),
+        ]
+        return PlainTextResponse("\n".join(lines) + "\n")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if engine.rng.random() < config.error_rate:
+            return _error("Simulated server error", config.error_status)
+
+        width, height = _image_size(body)
+        prompt_tokens = math.ceil(width * height / IMAGE_PATCH_PIXELS) + engine.tokens(_prompt_text_chars(body))
+        max_tokens = int(body.get("max_completion_tokens") or body.get("max_tokens") or 32768)
+        text, finish_reason = engine.answer(width, height, max_tokens)
+        ttft = config.ttft.sample(engine.rng)
+        if config.prefill_tokens_per_second > 0:
+            ttft += prompt_tokens / config.prefill_tokens_per_second
+
+        completion_id = f"chatcmpl-{engine.rng.getrandbits(64):016x}"
+        created = int(time.time())
+        model = body.get("model", config.model)
+        chunk_chars = max(1, int(config.chunk_tokens * config.chars_per_token))
+
+        def usage(completion_tokens: int) -> dict:
+            return {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+
+        def chunk(delta: dict, finish: str | None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }) + "\n\n"
+
+        async def generate():
+            sent = 0
+            async with engine.sequence():
+                engine.prompt_tokens += prompt_tokens
+                await asyncio.sleep(ttft)
+                try:
+                    yield chunk({"role": "assistant", "content": ""}, None)
+                    for start in range(0, len(text), chunk_chars):
+                        part = text[start:start + chunk_chars]
+                        tokens = engine.tokens(len(part))
+                        await asyncio.sleep(tokens / engine.decode_rate())
+                        sent += tokens
+                        engine.generation_tokens += tokens
+                        yield chunk({"content": part}, None)
+                    yield chunk({}, finish_reason)
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        yield "data: " + json.dumps({
+                            "id": completion_id,
+                            "object": "chat.completion.chunk",
+                            "created": created,
+                            "model": model,
+                            "choices": [],
+                            "usage": usage(sent),
+                        }) + "\n\n"
+                    yield "data: [DONE]\n\n"
+                except BaseException:
+                    engine.finished["abort"] += 1
+                    raise
+                engine.finished[finish_reason] += 1
+
+        if body.get("stream"):
+            return StreamingResponse(generate(), media_type="text/event-stream")
+
+        async with engine.sequence():
+            engine.prompt_tokens += prompt_tokens
+            completion_tokens = engine.tokens(len(text))
+            await asyncio.sleep(ttft + completion_tokens / engine.decode_rate())
+            engine.generation_tokens += completion_tokens
+            engine.finished[finish_reason] += 1
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage(completion_tokens),
+        }
+
+    return app
+
+
+def main():
+    defaults = FakeConfig()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4377)
+    parser.add_argument("--model", type=str, default=defaults.model)
+    parser.add_argument("--max-num-seqs", type=int, default=defaults.max_num_seqs, help="Requests running at once")
+    parser.add_argument("--ttft", type=Distribution.parse, default=defaults.ttft, help="Time to first token, seconds")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=defaults.prefill_tokens_per_second)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="Decode rate per request")
+    parser.add_argument("--max-tokens-per-second", type=float, default=defaults.max_tokens_per_second,
+                        help="Decode rate across running requests, 0 for no limit")
+    parser.add_argument("--chunk-tokens", type=int, default=defaults.chunk_tokens, help="Tokens per streamed delta")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+    parser.add_argument("--truncate-rate", type=float, default=defaults.truncate_rate,
+                        help="Share of answers cut short with finish_reason 'length'")
+    parser.add_argument("--loop-rate", type=float, default=defaults.loop_rate,
+                        help="Share of answers that repeat until max_tokens")
+    parser.add_argument("--density", type=str, default=defaults.density, choices=["sparse", "normal", "dense"])
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        model=args.model,
+        max_num_seqs=args.max_num_seqs,
+        ttft=args.ttft,
+        prefill_tokens_per_second=args.prefill_tokens_per_second,
+        tokens_per_second=args.tokens_per_second,
+        max_tokens_per_second=args.max_tokens_per_second,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        truncate_rate=args.truncate_rate,
+        loop_rate=args.loop_rate,
+        density=args.density,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Page fixtures for the offline benchmarks: OCR results per page, and a PDF drawn from them.
+
+Synthetic fixtures are generated at a given element density. Recorded
+fixtures are the merged markdown outputs in `output_bug_images/`, split back
+into layout elements; both are laid out on A4 pages, splitting tables across
+page breaks like dots.ocr does, and repeated to reach the page count.
+"""
+import re
+import math
+import random
+import itertools
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Literal
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from core.interfaces.api_interface import ExtractionCategory
+from core.services.ocr_llm import ExtractionResult
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4, in PDF points
+MARGIN = 48
+BLOCK_GAP = 6
+TABLE_ROW_HEIGHT = 14
+PICTURE_HEIGHT = 160
+CHARS_PER_LINE = 95
+LINE_HEIGHTS: dict[str, int] = {"Title": 22, "Section-header": 18, "Page-header": 16}
+
+RECORDED_DIR = Path(__file__).resolve().parent.parent / "output_bug_images"
+
+Density = Literal["sparse", "normal", "dense"]
+
+_WORDS = (
+    "revenue quarter growth margin supplier contract delivery invoice region "
+    "capacity pipeline volume price unit total annual report review budget "
+    "forecast material standard origin transport warehouse order balance "
+    "customer service network project schedule quality audit policy index"
+).split()
+
+# Words per paragraph, picture / table / list / heading probabilities, table rows and columns
+_DENSITIES: dict[str, dict] = {
+    "sparse": dict(words=(80, 160), picture=0.25, table=0.05, list=0.0, heading=0.1, rows=(3, 6), cols=(3, 4)),
+    "normal": dict(words=(25, 70), picture=0.08, table=0.1, list=0.15, heading=0.1, rows=(5, 15), cols=(4, 7)),
+    "dense": dict(words=(4, 16), picture=0.03, table=0.06, list=0.4, heading=0.05, rows=(4, 10), cols=(6, 10)),
+}
+
+_ROW = re.compile(r"<tr\b.*?</tr>", re.S | re.I)
+_THEAD = re.compile(r"<thead\b.*?</thead>", re.S | re.I)
+_TAG = re.compile(r"<[^>]+>")
+_HEADER_CATEGORIES: dict[int, ExtractionCategory] = {1: "Page-header", 2: "Section-header", 3: "Title"}
+
+
+@dataclass
+class Block:
+    category: ExtractionCategory
+    text: str = ""
+    header_rows: list[str] = field(default_factory=list)  # Tables only
+    rows: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Fixture:
+    name: str
+    pages: list[list[ExtractionResult]]  # Bboxes in PDF points
+
+    @property
+    def elements(self) -> int:
+        return sum(len(page) for page in self.pages)
+
+    def scaled(self, scale: float) -> list[list[ExtractionResult]]:
+        '''Results with bboxes in the pixels of pages rendered at `scale` pixels per point.'''
+        return [
+            [r.model_copy(update={"bbox": [round(v * scale) for v in r.bbox]}) for r in page]
+            for page in self.pages
+        ]
+
+    def to_pdf(self) -> bytes:
+        '''A PDF with each element drawn in its bbox, pictures as noise.'''
+        rng = random.Random(0)
+        picture = Image.frombytes("RGB", (96, 72), rng.randbytes(96 * 72 * 3))
+        picture_pixmap = fitz.Pixmap(fitz.csRGB, picture.width, picture.height, picture.tobytes(), False)
+
+        pdf = fitz.open()
+        for results in self.pages:
+            page = pdf.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            for r in results:
+                rect = fitz.Rect(*r.bbox)
+                if r.category == "Picture":
+                    page.insert_image(rect, pixmap=picture_pixmap, keep_proportion=False)
+                elif r.category == "Table":
+                    page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                    text = "\n".join(" | ".join(_cells(row)) for row in _ROW.findall(r.text))
+                    page.insert_textbox(rect, text, fontsize=6)
+                else:
+                    page.insert_textbox(rect, r.text, fontsize=LINE_HEIGHTS.get(r.category, 12) - 3)
+        data = pdf.tobytes()
+        pdf.close()
+        return data
+
+
+def _cells(row: str) -> list[str]:
+    return [c.strip() for c in _TAG.sub("\t", row).split("\t") if c.strip()]
+
+
+def _table_html(header_rows: list[str], rows: list[str]) -> str:
+    head = f"<thead>{''.join(header_rows)}</thead>" if header_rows else ""
+    return f"<table>{head}<tbody>{''.join(rows)}</tbody></table>"
+
+
+def _block_height(block: Block) -> int:
+    if block.category == "Picture":
+        return PICTURE_HEIGHT
+    if block.category == "Formula":
+        return 28
+    lines = max(1, math.ceil(len(block.text) / CHARS_PER_LINE))
+    return lines * LINE_HEIGHTS.get(block.category, 12)
+
+
+def paginate(
+    blocks: Iterable[Block],
+    page_count: int,
+    page_header: str | None = None,
+) -> list[list[ExtractionResult]]:
+    '''Lay blocks out top to bottom until `page_count` pages are full.'''
+    pages: list[list[ExtractionResult]] = []
+    page: list[ExtractionResult] = []
+    top = MARGIN + (LINE_HEIGHTS["Page-header"] + BLOCK_GAP if page_header else 0)
+    bottom = PAGE_HEIGHT - MARGIN
+    y = top
+
+    def place(category: ExtractionCategory, text: str, height: int):
+        nonlocal y
+        page.append(ExtractionResult(
+            bbox=[MARGIN, y, PAGE_WIDTH - MARGIN, y + height],
+            category=category,
+            text=text,
+        ))
+        y += height + BLOCK_GAP
+
+    def next_page() -> bool:
+        nonlocal page, y
+        if page_header:
+            page.insert(0, ExtractionResult(
+                bbox=[MARGIN, MARGIN, PAGE_WIDTH - MARGIN, MARGIN + LINE_HEIGHTS["Page-header"]],
+                category="Page-header",
+                text=page_header,
+            ))
+        page.append(ExtractionResult(
+            bbox=[MARGIN, bottom + 8, PAGE_WIDTH - MARGIN, bottom + 20],
+            category="Page-footer",
+            text=f"Page {len(pages) + 1}",
+        ))
+        pages.append(page)
+        page, y = [], top
+        return len(pages) < page_count
+
+    for block in blocks:
+        if block.category == "Table":
+            # Split at page breaks; continuations have no header, like dots.ocr output
+            header_rows, rows = block.header_rows, block.rows
+            while rows:
+                fit = (bottom - y) // TABLE_ROW_HEIGHT - len(header_rows)
+                if fit < 1 and page:
+                    if not next_page():
+                        return pages
+                    continue
+                part, rows = rows[:max(1, fit)], rows[max(1, fit):]
+                place("Table", _table_html(header_rows, part), (len(header_rows) + len(part)) * TABLE_ROW_HEIGHT)
+                header_rows = []
+                if rows and not next_page():
+                    return pages
+            continue
+
+        height = min(_block_height(block), bottom - top)
+        if y + height > bottom and page and not next_page():
+            return pages
+        place(block.category, block.text, height)
+
+    if page:
+        next_page()
+    return pages
+
+
+def _synthetic_blocks(density: Density, seed: int) -> Iterator[Block]:
+    params = _DENSITIES[density]
+    rng = random.Random(seed)
+
+    def words(low: int, high: int) -> str:
+        return " ".join(rng.choices(_WORDS, k=rng.randint(low, high))).capitalize()
+
+    yield Block("Title", words(4, 8))
+    while True:
+        roll = rng.random()
+        if roll < params["picture"]:
+            yield Block("Picture")
+            yield Block("Caption", words(5, 12))
+        elif roll < params["picture"] + params["table"]:
+            cols = rng.randint(*params["cols"])
+            header = "<tr>" + "".join(f"<th>{words(1, 3)}</th>" for _ in range(cols)) + "</tr>"
+            rows = [
+                "<tr>" + "".join(
+                    f"<td>{words(1, 4) if c == 0 else f'{rng.uniform(0, 100000):,.2f}'}</td>"
+                    for c in range(cols)
+                ) + "</tr>"
+                for _ in range(rng.randint(*params["rows"]))
+            ]
+            yield Block("Table", header_rows=[header], rows=rows)
+        elif roll < params["picture"] + params["table"] + params["list"]:
+            for _ in range(rng.randint(2, 6)):
+                yield Block("List-item", "- " + words(3, 12))
+        elif roll < params["picture"] + params["table"] + params["list"] + params["heading"]:
+            yield Block("Section-header", words(2, 6))
+        elif roll < params["picture"] + params["table"] + params["list"] + params["heading"] + 0.03:
+            yield Block("Formula", "E = \\sum_{i=1}^{n} p_i q_i")
+        else:
+            yield Block("Text", words(*params["words"]) + ".")
+
+
+def synthetic_fixture(density: Density, page_count: int, seed: int = 0) -> Fixture:
+    return Fixture(
+        name=f"synthetic-{density}",
+        pages=paginate(_synthetic_blocks(density, seed), page_count, page_header="Annual report 2025"),
+    )
+
+
+def parse_markdown(markdown: str) -> list[Block]:
+    '''Split markdown produced by `OCRService.convert_to_markdown` back into layout blocks.'''
+    blocks: list[Block] = []
+    for part in re.split(r"\n\s*\n", markdown):
+        part = part.strip()
+        if not part:
+            continue
+        if part.lower().startswith("<table"):
+            thead = _THEAD.search(part)
+            header_rows = _ROW.findall(thead.group(0)) if thead else []
+            body = _THEAD.sub("", part)
+            blocks.append(Block("Table", header_rows=header_rows, rows=_ROW.findall(body) or [body]))
+        elif part.startswith("!["):
+            blocks.append(Block("Picture"))
+        elif heading := re.match(r"^(#{1,3})\s+(.*)", part, re.S):
+            blocks.append(Block(_HEADER_CATEGORIES[len(heading.group(1))], heading.group(2)))
+        elif part.startswith("$"):
+            blocks.append(Block("Formula", part.strip("$")))
+        elif part.startswith("*") and part.endswith("*"):
+            blocks.append(Block("Caption", part.strip("*")))
+        elif part.startswith("_") and part.endswith("_"):
+            blocks.append(Block("Footnote", part.strip("_")))
+        elif re.match(r"^([-*+]|\d+[.)])\s", part):
+            blocks.append(Block("List-item", part))
+        else:
+            blocks.append(Block("Text", part))
+    return blocks
+
+
+def recorded_names() -> list[str]:
+    return sorted(path.parent.name for path in RECORDED_DIR.glob("*/*.md"))
+
+
+def recorded_fixture(name: str, page_count: int) -> Fixture:
+    '''A recorded document, repeated as needed to reach `page_count` pages.'''
+    path = RECORDED_DIR / name / f"{name}.md"
+    blocks = parse_markdown(path.read_text(encoding="utf-8"))
+    return Fixture(name=name, pages=paginate(itertools.cycle(blocks), page_count))
@@ -0,0 +1,264 @@
+"""Load generator for a running API: image or PDF OCR at a fixed rate or concurrency.
+
+Open loop (--rps) starts requests on a fixed schedule whether or not earlier
+ones have finished, so queueing shows up as latency; closed loop
+(--concurrency) keeps N requests in flight back to back. Reports throughput,
+latency percentiles of the successful requests, errors by status, and the
+API's event loop lag and concurrency limit, sampled from /stats during the run.
+
+The payload is a synthetic page (see `benchmarks.fixtures`) rendered at --dpi,
+or a synthetic PDF of --pages pages, unless --file is given. Run it against the
+API backed by `benchmarks.fake_vllm` to test scheduling without a GPU:
+
+    python -m benchmarks.fake_vllm --port 4377 --max-num-seqs 8 &
+    OCR_LLM_ENDPOINTS=http://localhost:4377 OCR_CACHE_ENABLED=false uvicorn main:app --port 8000 &
+    python -m benchmarks.load_test --target image --rps 4 --duration 60
+    python -m benchmarks.load_test --target pdf --pages 10 --concurrency 4 --requests 20 --json load.json
+"""
+import time
+import json
+import asyncio
+import argparse
+import mimetypes
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass, asdict
+
+import fitz  # PyMuPDF
+import httpx
+
+from benchmarks.fixtures import synthetic_fixture
+
+TARGETS: dict[str, tuple[str, str]] = {  # Route, upload field
+    "image": ("/api/ocr/extract", "image"),
+    "pdf": ("/api/pdf/extract", "pdf"),
+}
+
+
+@dataclass
+class Sample:
+    started: float  # Seconds since the start of the run
+    latency: float
+    status: int | None  # None when the request failed before a response
+    error: str | None = None
+
+
+@dataclass
+class StatsSample:
+    at: float
+    lag_ms: float
+    lag_p99_ms: float
+    lag_max_ms: float
+    limit: int
+    in_flight: int
+    waiters: int
+
+
+@dataclass
+class Payload:
+    filename: str
+    data: bytes
+    content_type: str
+    pages: int
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_payload(args: argparse.Namespace) -> Payload:
+    if args.file:
+        path = Path(args.file)
+        data = path.read_bytes()
+        pages = 1
+        if args.target == "pdf":
+            with fitz.open(stream=data, filetype="pdf") as pdf:
+                pages = pdf.page_count
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        return Payload(path.name, data, content_type, pages)
+
+    pages = args.pages if args.target == "pdf" else 1
+    pdf_data = synthetic_fixture(args.density, pages, args.seed).to_pdf()
+    if args.target == "pdf":
+        return Payload("load.pdf", pdf_data, "application/pdf", pages)
+    with fitz.open(stream=pdf_data, filetype="pdf") as pdf:
+        png = pdf[0].get_pixmap(dpi=args.dpi).tobytes("png")
+    return Payload("load.png", png, "image/png", 1)
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, payload: Payload):
+        self.args = args
+        self.payload = payload
+        self.route, self.field = TARGETS[args.target]
+        self.form = dict(pair.split("=", 1) for pair in args.form)
+        self.samples: list[Sample] = []
+        self.stats: list[StatsSample] = []
+        self.client_lag = 0.0
+        self.sent = 0
+        self.started = 0.0
+        self._running = True
+
+    def _should_send(self, elapsed: float) -> bool:
+        if self.args.requests:
+            return self.sent < self.args.requests
+        return elapsed < self.args.duration
+
+    async def request(self, client: httpx.AsyncClient):
+        started = time.monotonic()
+        files = {self.field: (self.payload.filename, self.payload.data, self.payload.content_type)}
+        try:
+            response = await client.post(self.route, files=files, data=self.form)
+            error = None if response.status_code == 200 else response.text[:200]
+            sample = Sample(started - self.started, time.monotonic() - started, response.status_code, error)
+        except httpx.HTTPError as e:
+            sample = Sample(started - self.started, time.monotonic() - started, None, type(e).__name__)
+        self.samples.append(sample)
+
+    async def open_loop(self, client: httpx.AsyncClient):
+        interval = 1 / self.args.rps
+        tasks: list[asyncio.Task] = []
+        while self._should_send(self.sent * interval):
+            await asyncio.sleep(max(0.0, self.started + self.sent * interval - time.monotonic()))
+            tasks.append(asyncio.create_task(self.request(client)))
+            self.sent += 1
+        await asyncio.gather(*tasks)
+
+    async def closed_loop(self, client: httpx.AsyncClient):
+        async def worker():
+            while self._should_send(time.monotonic() - self.started):
+                self.sent += 1
+                await self.request(client)
+
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def sample_stats(self, client: httpx.AsyncClient):
+        interval = self.args.stats_interval
+        while self._running:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            # Lag of this process' own loop, which skews the measured latencies when high
+            self.client_lag = max(self.client_lag, time.monotonic() - expected)
+            try:
+                response = await client.get("/stats", timeout=5)
+                data = response.json()["data"]
+            except (httpx.HTTPError, ValueError, KeyError):
+                continue
+            lag, concurrency = data["event_loop_lag"], data["concurrency"]
+            self.stats.append(StatsSample(
+                at=time.monotonic() - self.started,
+                lag_ms=lag["last_ms"],
+                lag_p99_ms=lag["p99_ms"],
+                lag_max_ms=lag["max_ms"],
+                limit=concurrency["limit"],
+                in_flight=concurrency["in_flight"],
+                waiters=concurrency["waiters"],
+            ))
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=self.args.url, timeout=self.args.timeout, limits=limits) as client:
+            self.started = time.monotonic()
+            sampler = asyncio.create_task(self.sample_stats(client))
+            if self.args.rps:
+                await self.open_loop(client)
+            else:
+                await self.closed_loop(client)
+            elapsed = time.monotonic() - self.started
+            self._running = False
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+        return self.summary(elapsed)
+
+    def summary(self, elapsed: float) -> dict:
+        ok = [s.latency for s in self.samples if s.status == 200]
+        errors = Counter(str(s.status or s.error) for s in self.samples if s.status != 200)
+        return {
+            "target": self.args.target,
+            "mode": f"rps={self.args.rps}" if self.args.rps else f"concurrency={self.args.concurrency}",
+            "payload_bytes": len(self.payload.data),
+            "pages_per_request": self.payload.pages,
+            "requests": len(self.samples),
+            "ok": len(ok),
+            "errors": dict(errors),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+            "pages_per_s": round(len(ok) * self.payload.pages / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(ok, 0.5) * 1000, 1),
+                "p95": round(percentile(ok, 0.95) * 1000, 1),
+                "p99": round(percentile(ok, 0.99) * 1000, 1),
+                "max": round(max(ok, default=0.0) * 1000, 1),
+            },
+            "event_loop_lag_ms": {
+                "last_max": max((s.lag_ms for s in self.stats), default=0.0),
+                "p99_max": max((s.lag_p99_ms for s in self.stats), default=0.0),
+                "max_since_start": self.stats[-1].lag_max_ms if self.stats else 0.0,
+            },
+            "concurrency": {
+                "limit_min": min((s.limit for s in self.stats), default=0),
+                "limit_max": max((s.limit for s in self.stats), default=0),
+                "in_flight_max": max((s.in_flight for s in self.stats), default=0),
+                "waiters_max": max((s.waiters for s in self.stats), default=0),
+            },
+            "client_loop_lag_ms": round(self.client_lag * 1000, 1),
+        }
+
+
+def print_summary(summary: dict):
+    latency, lag, concurrency = summary["latency_ms"], summary["event_loop_lag_ms"], summary["concurrency"]
+    errors = ", ".join(f"{k}: {v}" for k, v in summary["errors"].items()) or "none"
+    print(f"{summary['target']} x {summary['requests']} at {summary['mode']}, "
+          f"{summary['payload_bytes'] / 1024:.0f} KB and {summary['pages_per_request']} pages per request")
+    print(f"  ok {summary['ok']}, errors {errors}")
+    print(f"  throughput {summary['throughput_rps']:.2f} req/s, {summary['pages_per_s']:.2f} pages/s "
+          f"over {summary['elapsed_s']:.1f} s")
+    print(f"  latency ms p50 {latency['p50']:.0f}  p95 {latency['p95']:.0f}  "
+          f"p99 {latency['p99']:.0f}  max {latency['max']:.0f}")
+    print(f"  event loop lag ms: sampled max {lag['last_max']:.1f}, window p99 max {lag['p99_max']:.1f}, "
+          f"max since start {lag['max_since_start']:.1f}")
+    print(f"  concurrency limit {concurrency['limit_min']}-{concurrency['limit_max']}, "
+          f"in flight max {concurrency['in_flight_max']}, waiters max {concurrency['waiters_max']}")
+    if summary["client_loop_lag_ms"] > 50:
+        print(f"  warning: the load generator's own loop lagged {summary['client_loop_lag_ms']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--target", type=str, default="image", choices=list(TARGETS))
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, default=None, help="Open loop: requests started per second")
+    mode.add_argument("--concurrency", type=int, default=1, help="Closed loop: requests in flight")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to send requests for")
+    parser.add_argument("--requests", type=int, default=0, help="Send this many requests instead")
+    parser.add_argument("--file", type=str, default=None, help="Image or PDF to send (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=5, help="Synthetic PDF pages")
+    parser.add_argument("--dpi", type=int, default=200, help="Synthetic image DPI")
+    parser.add_argument("--density", type=str, default="normal", choices=["sparse", "normal", "dense"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--form", type=str, action="append", default=[],
+                        help="Extra form field as key=value, e.g. response_format=markdown (repeatable)")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-request timeout, seconds")
+    parser.add_argument("--stats-interval", type=float, default=1, help="Seconds between /stats samples")
+    parser.add_argument("--json", type=str, default=None, help="Save the summary and samples to this file")
+    args = parser.parse_args()
+
+    load_test = LoadTest(args, make_payload(args))
+    summary = asyncio.run(load_test.run())
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "summary": summary,
+                "samples": [asdict(s) for s in load_test.samples],
+                "stats": [asdict(s) for s in load_test.stats],
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
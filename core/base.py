@@ -5,6 +5,6 @@ from functools import lru_cache
 class BaseService(ABC):
     '''Base class for all services.'''
     @classmethod
-    @lru_cache(maxsize=1)
+    @lru_cache(maxsize=None)  # One instance per subclass, shared by all of them
     def provider(cls):
         return cls()
\ No newline at end of file
@@ -0,0 +1,220 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from dataclasses import dataclass
+from typing import Sequence
+
+HTML_TABLE_CACHE_CHARS = int(os.getenv("HTML_TABLE_CACHE_CHARS", 16 * 1024 * 1024))  # Total HTML of cached fragments
+MAX_CELL_SPAN = 1000  # Clamp for colspan / rowspan, against malformed output
+
+_TAG = re.compile(r"<(/?)(table|thead|tbody|tfoot|tr|td|th)\b([^>]*)>", re.I)
+_TABLE_TAG = re.compile(r"<(/?)table\b[^>]*>", re.I)
+_SPAN_ATTR = re.compile(r"\b(colspan|rowspan)\s*=\s*[\"']?\s*(\d+)", re.I)
+
+
+@dataclass(frozen=True)
+class TableCell:
+    header: bool  # <th>
+    colspan: int = 1
+    rowspan: int = 1
+
+
+@dataclass(frozen=True)
+class TableRow:
+    html: str  # The <tr> element, as in the source
+    section: str  # "thead", "tbody", "tfoot", or "" for rows outside a section
+    cells: tuple[TableCell, ...]
+
+
+@dataclass(frozen=True)
+class HTMLTable:
+    '''The first top-level table of an HTML fragment, tokenized once.
+
+    Rows keep their source text, so tables are merged by splicing rows instead
+    of rebuilding and serializing a document tree. Tables nested in cells are
+    kept inside their cell and not parsed.
+    '''
+    html: str  # The whole fragment, including any text around the table
+    rows: tuple[TableRow, ...]
+    body_end: int  # Offset in `html` where rows appended to the body go
+    has_tbody: bool
+
+    @cached_property
+    def has_header(self) -> bool:
+        return any(cell.header for row in self.rows for cell in row.cells)
+
+    @cached_property
+    def body_rows(self) -> tuple[TableRow, ...]:
+        '''Rows of the <tbody> sections, or all rows when the table has none.'''
+        if not self.has_tbody:
+            return self.rows
+        return tuple(row for row in self.rows if row.section == "tbody")
+
+    @property
+    def first_row_cell_count(self) -> int:
+        '''Number of cells in the first row, spans not expanded. Fragments of one table are matched on it.'''
+        return len(self.rows[0].cells) if self.rows else 0
+
+    @cached_property
+    def column_count(self) -> int:
+        '''Width of the table in grid columns, following colspan and rowspan.'''
+        width = 0
+        covered: list[int] = []  # Rows each grid column stays covered by a rowspan from above
+        for row in self.rows:
+            col = 0
+            for cell in row.cells:
+                while col < len(covered) and covered[col] > 0:
+                    col += 1
+                if col + cell.colspan > len(covered):
+                    covered.extend([0] * (col + cell.colspan - len(covered)))
+                covered[col:col + cell.colspan] = [cell.rowspan] * cell.colspan
+                col += cell.colspan
+            occupied = max((c + 1 for c, rows in enumerate(covered) if rows > 0), default=0)
+            width = max(width, col, occupied)
+            covered = [max(0, rows - 1) for rows in covered]
+        return width
+
+
+_PLAIN_CELLS = {"td": TableCell(header=False), "th": TableCell(header=True)}  # Shared, most cells have no spans
+
+
+def _span(attributes: str, name: str) -> int:
+    for match in _SPAN_ATTR.finditer(attributes):
+        if match.group(1).lower() == name:
+            return min(max(1, int(match.group(2))), MAX_CELL_SPAN)
+    return 1
+
+
+class _TableCache:
+    '''LRU of parsed fragments, bounded by the total length of their HTML, which the tables keep.'''
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._tables: OrderedDict[str, HTMLTable | None] = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, html: str) -> tuple[bool, HTMLTable | None]:
+        with self._lock:
+            if html not in self._tables:
+                return False, None
+            self._tables.move_to_end(html)
+            return True, self._tables[html]
+
+    def put(self, html: str, table: HTMLTable | None):
+        if len(html) > self.max_chars:
+            return
+        with self._lock:
+            if html in self._tables:
+                return
+            self._tables[html] = table
+            self._chars += len(html)
+            while self._chars > self.max_chars:
+                evicted, _ = self._tables.popitem(last=False)
+                self._chars -= len(evicted)
+
+
+_cache = _TableCache(HTML_TABLE_CACHE_CHARS)
+
+
+def parse_table(html: str) -> HTMLTable | None:
+    '''Parse the first table in `html`, or None when there is none. Cached, as results are immutable.'''
+    found, table = _cache.get(html)
+    if not found:
+        table = _parse_table(html)
+        _cache.put(html, table)
+    return table
+
+
+def _parse_table(html: str) -> HTMLTable | None:
+    rows: list[TableRow] = []
+    cells: list[TableCell] = []
+    depth = 0
+    section = ""
+    row_start: int | None = None
+    table_start: int | None = None
+    table_end = len(html)  # Unterminated tables end with the fragment
+    tbody_end: int | None = None
+
+    def close_row(at: int):
+        nonlocal row_start
+        if row_start is not None:
+            rows.append(TableRow(html[row_start:at], section, tuple(cells)))
+            row_start = None
+
+    for match in _TAG.finditer(html):
+        closing, name, attributes = match.groups()
+        name = name.lower()
+        if name == "table":
+            depth += -1 if closing else 1
+            if depth == 1 and not closing and table_start is None:
+                table_start = match.start()
+            if depth == 0 and closing and table_start is not None:
+                table_end = match.start()
+                break
+            continue
+        if depth != 1:
+            continue
+
+        if name == "tr":
+            # A new row, or the end of the section, closes a row left open
+            close_row(match.end() if closing else match.start())
+            if not closing:
+                row_start = match.start()
+                cells = []
+        elif name in ("td", "th"):
+            if not closing and row_start is not None:
+                if "span" not in attributes.lower():
+                    cells.append(_PLAIN_CELLS[name])
+                else:
+                    cells.append(TableCell(
+                        header=name == "th",
+                        colspan=_span(attributes, "colspan"),
+                        rowspan=_span(attributes, "rowspan"),
+                    ))
+        else:
+            close_row(match.start())
+            if closing:
+                if name == "tbody":
+                    tbody_end = match.start()
+                section = ""
+            else:
+                section = name
+
+    if table_start is None:
+        return None
+    close_row(table_end)
+    has_tbody = any(row.section == "tbody" for row in rows) or tbody_end is not None
+    return HTMLTable(
+        html=html,
+        rows=tuple(rows),
+        body_end=tbody_end if tbody_end is not None else table_end,
+        has_tbody=has_tbody,
+    )
+
+
+def find_tables(text: str) -> list[tuple[int, int, HTMLTable]]:
+    '''Top-level tables in a document, e.g. markdown, with their start and end offsets.'''
+    tables: list[tuple[int, int, HTMLTable]] = []
+    depth = 0
+    start = 0
+    for match in _TABLE_TAG.finditer(text):
+        if not match.group(1):
+            if depth == 0:
+                start = match.start()
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                table = parse_table(text[start:match.end()])
+                if table is not None:
+                    tables.append((start, match.end(), table))
+    return tables
+
+
+def merge_tables(tables: Sequence[HTMLTable]) -> str:
+    '''The first table's fragment, with the body rows of the other tables appended to its body.'''
+    base = tables[0]
+    appended = "".join(row.html for table in tables[1:] for row in table.body_rows)
+    return base.html[:base.body_end] + appended + base.html[base.body_end:]
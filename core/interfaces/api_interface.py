@@ -10,12 +10,23 @@ DefaultOCRResponseFormat = "markdown"
 
 ExtractionCategory = Literal['Caption', 'Footnote', 'Formula', 'List-item', 'Page-footer', 'Page-header', 'Picture', 'Section-header', 'Table', 'Text', 'Title']
 
+ImageWireFormat = Literal["PNG", "JPEG", "WEBP"]
+DefaultImageWireFormat = "PNG"
+
 PDFExtractionMode = Literal["markdown", "json", "merged"]
 DefaultPDFExtractionMode = "merged"
 
 PDFMergeAlgorithm = Literal["simple", "table_aware"]
 DefaultPDFMergeAlgorithm = "table_aware"
 
+PDFStreamFormat = Literal["ndjson", "sse"]
+DefaultPDFStreamFormat = "ndjson"
+
+PDFOCRStrategy = Literal["vision", "hybrid"]
+DefaultPDFOCRStrategy = "vision"
+
+PDFJobStatus = Literal["queued", "running", "completed", "failed"]
+
 
 # General Interfaces
 class ApiResponse(BaseModel, Generic[T]):
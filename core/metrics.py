@@ -0,0 +1,289 @@
+import math
+import time
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds, from sub-millisecond CPU steps up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+GaugeFunction = Callable[[], float | dict[tuple[str, ...], float]]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        for v in values
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    @abstractmethod
+    def _new_child(self):
+        '''State of one label combination.'''
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @property
+    def exposed_name(self) -> str:
+        '''Name of the metric family in the exposition, matching its samples.'''
+        return self.name
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        '''Exposition lines of every label combination.'''
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.exposed_name} {self.documentation}", f"# TYPE {self.exposed_name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    @property
+    def exposed_name(self) -> str:
+        return self.name if self.name.endswith("_total") else f"{self.name}_total"
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.exposed_name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"  # type: ignore
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(_Metric):
+    '''A value read at scrape time, so keeping it current costs nothing on the hot path.'''
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: GaugeFunction | None = None
+
+    def _new_child(self):
+        raise TypeError(f"{self.name} is read from its function, set it with set_function")
+
+    def set_function(self, function: GaugeFunction):
+        '''`function` returns the value, or a value per label tuple.'''
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        if self._function is None:
+            return []
+        try:
+            values = self._function()
+        except Exception as e:
+            logger.warning(f"Failed to collect metric {self.name}: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+            if value is not None
+        ]
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        '''Observe the duration of the block, in seconds.'''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> list[str]:
+        lines: list[str] = []
+        for values, child in list(self._children.items()):
+            with child._lock:  # type: ignore
+                counts, total = list(child.counts), child.sum  # type: ignore
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels((*self.labelnames, "le"), (*values, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def expose(self) -> str:
+        '''All metrics in the Prometheus text exposition format.'''
+        return "\n".join(metric.expose() for metric in self._metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def serve_metrics(port: int, host: str = "0.0.0.0"):
+    '''Minimal HTTP server answering every request with the metrics, for processes without an API.'''
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = REGISTRY.expose().encode()
+            writer.write(
+                f"HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "ocr_pipeline_stage_duration_seconds",
+    "Time spent per pipeline stage and call.",
+    ["stage"],
+)
+CPU_QUEUE_WAIT_SECONDS = Histogram(
+    "ocr_cpu_executor_queue_wait_seconds",
+    "Time CPU stage calls waited for a free thread.",
+    ["stage"],
+)
+PAGES = Counter(
+    "ocr_pages",
+    "Pages OCR'd, by where their result came from.",
+    ["source"],
+)
+ELEMENTS = Counter(
+    "ocr_elements",
+    "Layout elements extracted from pages, by category.",
+    ["category"],
+)
+LLM_COMPLETIONS = Counter(
+    "ocr_llm_completions",
+    "OCR LLM completions, by finish reason ('aborted' for degenerate output).",
+    ["finish_reason"],
+)
+LLM_PROMPT_TOKENS = Counter(
+    "ocr_llm_prompt_tokens",
+    "Prompt tokens reported by the OCR LLM.",
+)
+LLM_COMPLETION_TOKENS = Counter(
+    "ocr_llm_completion_tokens",
+    "Completion tokens reported by the OCR LLM.",
+)
+PARSE_FAILURES = Counter(
+    "ocr_parse_failures",
+    "OCR LLM outputs that could not be fully parsed, by reason.",
+    ["reason"],
+)
+LLM_IN_FLIGHT = Gauge(
+    "ocr_llm_in_flight_requests",
+    "Requests outstanding on each OCR LLM replica.",
+    ["replica"],
+)
+CONCURRENCY = Gauge(
+    "ocr_concurrency",
+    "Adaptive limiter state: current limit, in-flight requests and waiters.",
+    ["value"],
+)
+CPU_EXECUTOR_TASKS = Gauge(
+    "ocr_cpu_executor_tasks",
+    "CPU stage calls queued or running.",
+    ["stage", "state"],
+)
+EVENT_LOOP_LAG_SECONDS = Gauge(
+    "ocr_event_loop_lag_seconds",
+    "Last measured event loop lag.",
+)
@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Literal, Sequence, TypeVar, TypedDict, get_args
+
+from core.base import BaseService
+from core.metrics import PIPELINE_STAGE_SECONDS, CPU_QUEUE_WAIT_SECONDS, CPU_EXECUTOR_TASKS, EVENT_LOOP_LAG_SECONDS
+from core.tracing import span, bind_context
+
+T = TypeVar("T")
+
+logger = logging.getLogger("uvicorn.error")
+
+# Decoding uploads, cropping pictures, hashing and encoding pages for the LLM,
+# building markdown, and merging pages
+CPUStage = Literal["decode", "crop", "encode", "markdown", "merge"]
+
+
+class CPUStageStats(TypedDict):
+    workers: int
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    queue_wait_avg_ms: float
+    queue_wait_p95_ms: float
+    run_time_avg_ms: float
+    run_time_p95_ms: float
+
+
+class EventLoopLagStats(TypedDict):
+    interval_ms: float
+    last_ms: float
+    avg_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+def _ms(samples: Sequence[float], quantile: float | None = None) -> float:
+    if not samples:
+        return 0.0
+    if quantile is None:
+        return round(sum(samples) / len(samples) * 1000, 2)
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * quantile))] * 1000, 2)
+
+
+class _Stage:
+    def __init__(self, name: str, workers: int, window: int):
+        self.name = name
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"cpu-{name}")
+        self.lock = threading.Lock()  # Counters are updated from the event loop and the pool threads
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.queue_waits: deque[float] = deque(maxlen=window)
+        self.run_times: deque[float] = deque(maxlen=window)
+        self.queue_wait_metric = CPU_QUEUE_WAIT_SECONDS.labels(name)
+        self.run_time_metric = PIPELINE_STAGE_SECONDS.labels(name)
+
+    def call(self, func: Callable[[], T], submitted: float) -> T:
+        started = time.monotonic()
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self.queue_waits.append(started - submitted)
+        self.queue_wait_metric.observe(started - submitted)
+        failed = True
+        try:
+            with span(self.name, queue_wait_ms=round((started - submitted) * 1000, 3)):
+                result = func()
+            failed = False
+            return result
+        finally:
+            run_time = time.monotonic() - started
+            with self.lock:
+                self.running -= 1
+                self.completed += not failed
+                self.failed += failed
+                self.run_times.append(run_time)
+            self.run_time_metric.observe(run_time)
+
+    def stats(self) -> CPUStageStats:
+        with self.lock:
+            queue_waits, run_times = list(self.queue_waits), list(self.run_times)
+        return CPUStageStats(
+            workers=self.workers,
+            queued=self.queued,
+            running=self.running,
+            completed=self.completed,
+            failed=self.failed,
+            queue_wait_avg_ms=_ms(queue_waits),
+            queue_wait_p95_ms=_ms(queue_waits, 0.95),
+            run_time_avg_ms=_ms(run_times),
+            run_time_p95_ms=_ms(run_times, 0.95),
+        )
+
+
+class CPUExecutorService(BaseService):
+    '''Runs CPU-bound steps off the event loop thread, on one thread pool per
+    stage so a burst of one kind of work cannot starve the others.
+
+    Stage threads still share the GIL with the loop. PIL, zlib and hashlib
+    release it for their heavy lifting; MuPDF does not, so page rendering runs
+    in the renderer's process pool instead.
+    '''
+    def __init__(self):
+        default_workers = int(os.getenv("CPU_EXECUTOR_WORKERS", os.cpu_count() or 1))
+        window = int(os.getenv("CPU_EXECUTOR_STATS_WINDOW", 1000))
+        self.stages: dict[str, _Stage] = {
+            stage: _Stage(
+                stage,
+                max(1, int(os.getenv(f"CPU_EXECUTOR_{stage.upper()}_WORKERS", default_workers))),
+                window,
+            )
+            for stage in get_args(CPUStage)
+        }
+
+        self.lag_interval = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.1))  # Seconds, 0 to disable
+        self.lag_warn_threshold = float(os.getenv("EVENT_LOOP_LAG_WARN_THRESHOLD", 0.1))
+        self._lags: deque[float] = deque(maxlen=window)
+        self._max_lag = 0.0
+        self._monitor: asyncio.Task | None = None
+
+        CPU_EXECUTOR_TASKS.set_function(lambda: {
+            (name, state): getattr(stage, state)
+            for name, stage in self.stages.items()
+            for state in ("queued", "running")
+        })
+        EVENT_LOOP_LAG_SECONDS.set_function(lambda: self._lags[-1] if self._lags else 0.0)
+
+    async def run(self, stage: CPUStage, func: Callable[..., T], *args, **kwargs) -> T:
+        cpu_stage = self.stages[stage]
+        with cpu_stage.lock:
+            cpu_stage.queued += 1
+        future = cpu_stage.executor.submit(
+            bind_context(cpu_stage.call, partial(func, *args, **kwargs), time.monotonic())
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if future.cancelled():
+                # Cancelled while still queued, it never ran
+                with cpu_stage.lock:
+                    cpu_stage.queued -= 1
+
+    async def _monitor_lag(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, time.monotonic() - started - self.lag_interval)
+            self._lags.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+            if lag > self.lag_warn_threshold:
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def start(self):
+        '''Start measuring event loop lag.'''
+        if self.lag_interval > 0 and (self._monitor is None or self._monitor.done()):
+            self._monitor = asyncio.create_task(self._monitor_lag())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+
+    def stats(self) -> dict[str, CPUStageStats]:
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+    def lag_stats(self) -> EventLoopLagStats:
+        return EventLoopLagStats(
+            interval_ms=self.lag_interval * 1000,
+            last_ms=round(self._lags[-1] * 1000, 2) if self._lags else 0.0,
+            avg_ms=_ms(self._lags),
+            p99_ms=_ms(self._lags, 0.99),
+            max_ms=round(self._max_lag * 1000, 2),
+        )
@@ -0,0 +1,156 @@
+import time
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Literal, TypedDict
+from contextlib import asynccontextmanager
+
+import httpx
+from openai import AsyncOpenAI, APIConnectionError
+
+logger = logging.getLogger("uvicorn.error")
+
+ReplicaRoutingStrategy = Literal["requests", "tokens"]
+
+
+class ReplicaStats(TypedDict):
+    endpoint: str
+    healthy: bool
+    outstanding_requests: int
+    outstanding_tokens: int
+    consecutive_failures: int
+
+
+class LLMReplica:
+    def __init__(
+        self,
+        endpoint: str,
+        http_client: httpx.AsyncClient,
+    ):
+        self.endpoint = endpoint.rstrip("/")
+        self.client = AsyncOpenAI(
+            api_key="0",
+            base_url=f"{self.endpoint}/v1",
+            http_client=http_client,
+            max_retries=0,  # Retried by OCRLLMService, possibly on another replica
+        )
+        # The SDK imports its chat resources on first access, which takes seconds; do it at startup
+        # rather than on the event loop during the first request
+        self.completions = self.client.chat.completions
+        self.healthy = True
+        self.outstanding_requests = 0
+        self.outstanding_tokens = 0
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+
+    def stats(self) -> ReplicaStats:
+        return ReplicaStats(
+            endpoint=self.endpoint,
+            healthy=self.healthy,
+            outstanding_requests=self.outstanding_requests,
+            outstanding_tokens=self.outstanding_tokens,
+            consecutive_failures=self.consecutive_failures,
+        )
+
+
+class LLMReplicaPool:
+    '''Client-side load balancer over a set of vLLM replicas.
+
+    Each request goes to the healthy replica with the fewest outstanding
+    requests (or estimated tokens). Replicas are ejected after
+    `unhealthy_threshold` consecutive failed health checks or connection
+    errors, and re-admitted after `healthy_threshold` consecutive successful
+    health checks.
+    '''
+    def __init__(
+        self,
+        endpoints: list[str],
+        http_client: httpx.AsyncClient,
+        routing: ReplicaRoutingStrategy = "requests",
+        health_check_interval: float = 10,
+        unhealthy_threshold: int = 3,
+        healthy_threshold: int = 2,
+    ):
+        if not endpoints:
+            raise ValueError("At least one OCR LLM endpoint is required")
+
+        self.http_client = http_client
+        self.replicas = [LLMReplica(endpoint, http_client) for endpoint in endpoints]
+        self.routing = routing
+        self.health_check_interval = health_check_interval
+        self.unhealthy_threshold = unhealthy_threshold
+        self.healthy_threshold = healthy_threshold
+        self._health_task: asyncio.Task | None = None
+
+    def stats(self) -> list[ReplicaStats]:
+        return [replica.stats() for replica in self.replicas]
+
+    def _load(self, replica: LLMReplica) -> tuple[int, int]:
+        if self.routing == "tokens":
+            return (replica.outstanding_tokens, replica.outstanding_requests)
+        return (replica.outstanding_requests, replica.outstanding_tokens)
+
+    def pick(self, exclude: LLMReplica | None = None) -> LLMReplica:
+        candidates = [r for r in self.replicas if r.healthy and r is not exclude]
+        if not candidates:
+            # Every replica is ejected, try the least loaded one anyway
+            candidates = [r for r in self.replicas if r is not exclude] or self.replicas
+
+        lowest = min(self._load(r) for r in candidates)
+        # Break ties randomly so idle replicas share the load
+        return random.choice([r for r in candidates if self._load(r) == lowest])
+
+    def _mark_failure(self, replica: LLMReplica, reason: str):
+        replica.consecutive_successes = 0
+        replica.consecutive_failures += 1
+        if replica.healthy and replica.consecutive_failures >= self.unhealthy_threshold:
+            replica.healthy = False
+            logger.warning(f"Ejected OCR LLM replica {replica.endpoint}: {reason}")
+
+    def _mark_success(self, replica: LLMReplica):
+        replica.consecutive_failures = 0
+        replica.consecutive_successes += 1
+        if not replica.healthy and replica.consecutive_successes >= self.healthy_threshold:
+            replica.healthy = True
+            logger.info(f"Re-admitted OCR LLM replica {replica.endpoint}")
+
+    async def _check_replica(self, replica: LLMReplica):
+        try:
+            response = await self.http_client.get(f"{replica.endpoint}/health", timeout=5.0)
+            if response.status_code == 200:
+                self._mark_success(replica)
+            else:
+                self._mark_failure(replica, f"health check returned {response.status_code}")
+        except Exception as e:
+            self._mark_failure(replica, f"health check failed: {e}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check_replica(r) for r in self.replicas))
+            await asyncio.sleep(self.health_check_interval)
+
+    def ensure_started(self):
+        if self.health_check_interval <= 0:
+            return
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        tokens: int = 0,
+        exclude: LLMReplica | None = None,
+    ) -> AsyncIterator[LLMReplica]:
+        self.ensure_started()
+        replica = self.pick(exclude=exclude)
+        replica.outstanding_requests += 1
+        replica.outstanding_tokens += tokens
+        started = time.monotonic()
+        try:
+            yield replica
+        except APIConnectionError as e:
+            self._mark_failure(replica, f"request failed after {time.monotonic() - started:.1f}s: {e}")
+            raise
+        finally:
+            replica.outstanding_requests -= 1
+            replica.outstanding_tokens -= tokens
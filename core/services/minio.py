@@ -1,16 +1,37 @@
 import os
+import asyncio
+import threading
 from io import BytesIO
 from hashlib import sha256
+from typing import BinaryIO, Callable
 from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 
+import urllib3
 from minio import Minio
 
 from core.base import BaseService
+from core.metrics import PIPELINE_STAGE_SECONDS
+from core.tracing import span, bind_context
 
 TEMP_DIR = "tmp/ocr_service"
 os.makedirs(TEMP_DIR, exist_ok=True)
 
 
+class _HashingCopyReader:
+    '''Reads a file for upload, hashing it and copying it to `copy` on the way.'''
+    def __init__(self, source: BinaryIO, copy: BinaryIO):
+        self.source = source
+        self.copy = copy
+        self.hasher = sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        self.hasher.update(data)
+        self.copy.write(data)
+        return data
+
+
 class MinioService(Minio, BaseService):
     def __init__(self):
         self.minio_download_url = os.getenv("MINIO_DOWNLOAD_URL", "http://localhost:8000")
@@ -18,12 +39,43 @@ class MinioService(Minio, BaseService):
         self.minio_endpoint = os.getenv("MINIO_ENDPOINT", "localhost:9000")
         minio_access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
         minio_secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+
+        # Uploads, and downloads, run on bounded thread pools sharing one keep-alive connection pool
+        self.upload_workers = int(os.getenv("MINIO_UPLOAD_WORKERS", 8))
+        self.download_workers = int(os.getenv("MINIO_DOWNLOAD_WORKERS", 4))
+        self.max_connections = int(os.getenv(
+            "MINIO_MAX_CONNECTIONS",
+            max(10, (self.upload_workers + self.download_workers) * 2),
+        ))
+        self.part_size = int(os.getenv("MINIO_PART_SIZE", 16 * 1024 * 1024))  # Larger objects use multipart uploads
+        self.parallel_part_uploads = int(os.getenv("MINIO_PARALLEL_PART_UPLOADS", 4))
+        timeout = float(os.getenv("MINIO_TIMEOUT", 300))
         super().__init__(
             endpoint=self.minio_endpoint,
             access_key=minio_access_key,
             secret_key=minio_secret_key,
             secure=False,
+            http_client=urllib3.PoolManager(
+                timeout=urllib3.Timeout(connect=timeout, read=timeout),
+                maxsize=self.max_connections,
+                retries=urllib3.Retry(
+                    total=5,
+                    backoff_factor=0.2,
+                    status_forcelist=[500, 502, 503, 504],
+                ),
+            ),
         )
+        self.upload_executor = ThreadPoolExecutor(
+            max_workers=self.upload_workers,
+            thread_name_prefix="minio-upload",
+        )
+        # Downloads and deletes get their own pool: CPU workers wait on picture uploads, which must
+        # not queue behind large downloads
+        self.download_executor = ThreadPoolExecutor(
+            max_workers=self.download_workers,
+            thread_name_prefix="minio-download",
+        )
+        self.upload_seconds_metric = PIPELINE_STAGE_SECONDS.labels("upload")
 
     def health_check(self) -> bool:
         try:
@@ -46,11 +98,24 @@ class MinioService(Minio, BaseService):
         object_name: str,
         data: bytes,
     ):
-        self.put_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            data=BytesIO(data),
-            length=len(data),
+        with self.upload_seconds_metric.time(), span("upload", object=object_name, bytes=len(data)):
+            self.put_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=BytesIO(data),
+                length=len(data),
+                part_size=self.part_size if len(data) > self.part_size else 0,
+                num_parallel_uploads=self.parallel_part_uploads,
+            )
+
+    async def upload_async(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+    ):
+        await asyncio.wrap_future(
+            self.upload_executor.submit(bind_context(self.upload, bucket_name, object_name, data))
         )
 
     def download(
@@ -66,36 +131,177 @@ class MinioService(Minio, BaseService):
         response.close()
         response.release_conn()
         return data
-    
+
     def get_access_url(
         self,
         bucket_name: str,
         object_name: str,
         expires: int = 3600,
+        data: bytes | None = None,
     ) -> str:
-        # download bytes
-        data = self.download(bucket_name, object_name)
+        # Objects uploaded by this process are hashed from the bytes in memory, others are downloaded
+        if data is None:
+            data = self.download(bucket_name, object_name)
+
+        def write(path: str):
+            with open(path, "wb") as f:
+                f.write(data)
+
+        return self._static_url(object_name, sha256(data).hexdigest(), write)
 
+    def _static_url(
+        self,
+        object_name: str,
+        content_hash: str,
+        write: Callable[[str], None],
+    ) -> str:
         # sanitize and build filename: keep original basename + short content hash + extension
         base = os.path.basename(object_name)
         name, ext = os.path.splitext(base)
         # simple sanitize: replace path separators and spaces
         safe_name = name.replace(os.path.sep, "_").replace(" ", "_")
-        content_hash = sha256(data).hexdigest()[:10]
-        filename = f"{safe_name}_{content_hash}{ext or ''}"
+        filename = f"{safe_name}_{content_hash[:10]}{ext or ''}"
 
-        # write file
+        # write file, unless this exact content is already served
         out_path = os.path.join(TEMP_DIR, filename)
-        # atomic write: write to temp then rename
-        tmp_path = out_path + ".tmp"
-        with open(tmp_path, "wb") as f:
-            f.write(data)
-            f.flush()
-            os.fsync(f.fileno())
-        os.replace(tmp_path, out_path)
+        if not os.path.exists(out_path):
+            # atomic write: write to temp then rename
+            tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            write(tmp_path)
+            os.replace(tmp_path, out_path)
 
         # return URL-encoded path suitable for use in a browser
         quoted = quote(filename)
         static_root = self.minio_download_url.rstrip("/")
         # assuming you mount tmp/ocr_service under /static
-        return f"{static_root}/static/{quoted}"
\ No newline at end of file
+        return f"{static_root}/static/{quoted}"
+
+    def publish(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+        expires: int = 3600,
+    ) -> str:
+        '''Upload an object and return its access URL, without reading it back.'''
+        self.upload(bucket_name, object_name, data)
+        return self.get_access_url(bucket_name, object_name, expires, data=data)
+
+    def publish_many(
+        self,
+        bucket_name: str,
+        objects: list[tuple[str, bytes]],
+        expires: int = 3600,
+    ) -> list[str]:
+        '''Upload (object name, data) pairs concurrently; returns their access URLs in order.
+
+        The calling thread uploads the first object itself rather than idle while it waits.
+        '''
+        if not objects:
+            return []
+        futures = [
+            self.upload_executor.submit(bind_context(self.publish, bucket_name, object_name, data, expires))
+            for object_name, data in objects[1:]
+        ]
+        first_name, first_data = objects[0]
+        return [self.publish(bucket_name, first_name, first_data, expires)] + [future.result() for future in futures]
+
+    def publish_file(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str,
+        expires: int = 3600,
+    ) -> str:
+        '''Stream a local file to MinIO and return its access URL.
+
+        The file is read once: it is hashed, and copied to the static directory, as it is uploaded.
+        '''
+        size = os.path.getsize(file_path)
+        copy_path = os.path.join(TEMP_DIR, f".{os.getpid()}.{threading.get_ident()}.upload")
+        try:
+            with open(file_path, "rb") as source, open(copy_path, "wb") as copy:
+                reader = _HashingCopyReader(source, copy)
+                with self.upload_seconds_metric.time(), span("upload", object=object_name, bytes=size):
+                    self.put_object(
+                        bucket_name=bucket_name,
+                        object_name=object_name,
+                        data=reader,
+                        length=size,
+                        part_size=self.part_size if size > self.part_size else 0,
+                        num_parallel_uploads=self.parallel_part_uploads,
+                    )
+            return self._static_url(object_name, reader.hasher.hexdigest(), lambda path: os.replace(copy_path, path))
+        finally:
+            if os.path.exists(copy_path):
+                os.remove(copy_path)
+
+    async def publish_async(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+        expires: int = 3600,
+    ) -> str:
+        return await asyncio.wrap_future(
+            self.upload_executor.submit(bind_context(self.publish, bucket_name, object_name, data, expires))
+        )
+
+    async def publish_file_async(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str,
+        expires: int = 3600,
+    ) -> str:
+        return await asyncio.wrap_future(
+            self.upload_executor.submit(
+                bind_context(self.publish_file, bucket_name, object_name, file_path, expires)
+            )
+        )
+
+    def upload_file(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str,
+    ):
+        size = os.path.getsize(file_path)
+        with self.upload_seconds_metric.time(), span("upload", object=object_name, bytes=size):
+            self.fput_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                file_path=file_path,
+                part_size=self.part_size if size > self.part_size else 0,
+                num_parallel_uploads=self.parallel_part_uploads,
+            )
+
+    async def upload_file_async(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str,
+    ):
+        await asyncio.wrap_future(
+            self.upload_executor.submit(bind_context(self.upload_file, bucket_name, object_name, file_path))
+        )
+
+    async def download_file_async(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str,
+    ):
+        '''Stream an object to a local file without holding it in memory.'''
+        await asyncio.wrap_future(
+            self.download_executor.submit(bind_context(self.fget_object, bucket_name, object_name, file_path))
+        )
+
+    async def remove_object_async(
+        self,
+        bucket_name: str,
+        object_name: str,
+    ):
+        await asyncio.wrap_future(
+            self.download_executor.submit(bind_context(self.remove_object, bucket_name, object_name))
+        )
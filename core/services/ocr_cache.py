@@ -0,0 +1,118 @@
+import os
+import time
+import json
+import logging
+from hashlib import sha256
+
+from PIL import Image
+from pydantic import BaseModel
+
+from core.base import BaseService
+from core.services.redis import RedisService
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class OCRCacheStats(BaseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    entries: int
+    max_entries: int
+    ttl_seconds: int
+
+
+class OCRCacheService(BaseService):
+    '''Content-addressed cache for OCR LLM results, stored in Redis.
+
+    Entries expire after `OCR_CACHE_TTL` seconds. A sorted set indexed by last
+    access time bounds the number of entries to `OCR_CACHE_MAX_ENTRIES`; the
+    least recently used entries are evicted first.
+    '''
+    def __init__(self):
+        # Off unless asked for, so the API runs without Redis
+        self.enabled = os.getenv("OCR_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.ttl_seconds = int(os.getenv("OCR_CACHE_TTL", 604800))  # 7 days
+        self.max_entries = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 100000))
+
+        self.key_prefix = "ocr_cache"
+        self.lru_key = f"{self.key_prefix}:lru"
+        self.redis_service = RedisService.provider()
+
+        self.hits = 0  # Lookups of this process, reported at /stats
+        self.misses = 0
+
+    def _entry_key(self, digest: str) -> str:
+        return f"{self.key_prefix}:entry:{digest}"
+
+    def make_key(
+        self,
+        image: Image.Image,
+        params: dict,
+    ) -> str:
+        '''Hash the raw pixels plus everything that influences the completion.'''
+        hasher = sha256()
+        hasher.update(f"{image.mode}:{image.width}x{image.height}".encode())
+        hasher.update(image.tobytes())
+        hasher.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return hasher.hexdigest()
+
+    def get(self, digest: str) -> list[dict] | None:
+        if not self.enabled:
+            return None
+
+        try:
+            value = self.redis_service.get(self._entry_key(digest))
+            if value is None:
+                # Expired entries may still be referenced by the LRU index
+                self.redis_service.zrem(self.lru_key, digest)
+                self.misses += 1
+                return None
+
+            self.redis_service.zadd(self.lru_key, {digest: time.time()})
+            self.hits += 1
+            return value["results"]
+        except Exception as e:
+            logger.warning(f"OCR cache lookup failed: {e}")
+            return None
+
+    def set(self, digest: str, results: list[dict]):
+        if not self.enabled:
+            return
+
+        try:
+            self.redis_service.set(
+                self._entry_key(digest),
+                {"results": results},
+                expire=self.ttl_seconds,
+            )
+            self.redis_service.zadd(self.lru_key, {digest: time.time()})
+
+            # Evict least recently used entries over the size bound
+            overflow = self.redis_service.zcard(self.lru_key) - self.max_entries  # type: ignore
+            if overflow > 0:
+                evicted = self.redis_service.zpopmin(self.lru_key, overflow)
+                if evicted:
+                    self.redis_service.delete(*[
+                        self._entry_key(member.decode() if isinstance(member, bytes) else member)
+                        for member, _ in evicted  # type: ignore
+                    ])
+        except Exception as e:
+            logger.warning(f"OCR cache store failed: {e}")
+
+    def stats(self) -> OCRCacheStats:
+        entries = 0
+        if self.enabled:
+            try:
+                entries = int(self.redis_service.zcard(self.lru_key))  # type: ignore
+            except Exception as e:
+                logger.warning(f"OCR cache stats failed: {e}")
+
+        return OCRCacheStats(
+            enabled=self.enabled,
+            hits=self.hits,
+            misses=self.misses,
+            entries=entries,
+            max_entries=self.max_entries,
+            ttl_seconds=self.ttl_seconds,
+        )
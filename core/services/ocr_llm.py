@@ -1,4 +1,11 @@
 import os
+import math
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Coroutine, TypedDict, TypeVar, cast
 import httpx
 import json
 import base64
@@ -7,14 +14,33 @@ from io import BytesIO
 import re
 
 from PIL import Image
-from pydantic import BaseModel
-from openai import OpenAI
+from pydantic import BaseModel, ValidationError
+from openai import OpenAI, APIConnectionError, APIStatusError
+from openai.types import CompletionUsage
 
-from core.interfaces.api_interface import ExtractionCategory
+from core.interfaces.api_interface import ExtractionCategory, ImageWireFormat, DefaultImageWireFormat
 from core.base import BaseService
+from core.services.ocr_cache import OCRCacheService
+from core.services.cpu_executor import CPUExecutorService
+from core.metrics import (
+    PIPELINE_STAGE_SECONDS,
+    PAGES,
+    ELEMENTS,
+    LLM_COMPLETIONS,
+    LLM_PROMPT_TOKENS,
+    LLM_COMPLETION_TOKENS,
+    LLM_IN_FLIGHT,
+    PARSE_FAILURES,
+)
+from core.services.llm_replicas import LLMReplica, LLMReplicaPool, ReplicaRoutingStrategy
+from core.services.ocr_stream import DegenerationOptions, JSONArrayStreamParser, OCROutputStream
+from core.utils import limiter
+from core.tracing import span, current_span
 
 logger = logging.getLogger("uvicorn.error")
 
+T = TypeVar("T")
+
 
 PROMPT = """Please output the layout information from the PDF image, including each layout element's bbox, its category, and the corresponding text content within the bbox.
 
@@ -41,12 +67,59 @@ class ExtractionResult(BaseModel):
     text: str = ""
 
 
+class ImageEncodingOptions(BaseModel):
+    format: ImageWireFormat = DefaultImageWireFormat
+    quality: int = 90  # JPEG / WebP quality
+    max_pixels: int = 11289600  # dots.ocr preprocessing limit, 0 to disable
+    png_compress_level: int = 1  # 0 (none) - 9 (smallest, slowest)
+
+
+DefaultImageEncoding = ImageEncodingOptions()
+
+
+class EncodedImage(BaseModel):
+    data_url: str
+    width: int
+    height: int
+    bbox_scale: tuple[float, float] = (1.0, 1.0)  # Maps bboxes back to the original image
+
+
+class OCRCompletion(BaseModel):
+    results: list[ExtractionResult]
+    truncated: bool = False  # Output ended before the whole image was read
+
+
+class OCRRequestStats(TypedDict):
+    retries: int
+    hedges: int
+    hedge_wins: int
+    hedge_delay: float | None
+
+
+def _is_retryable_error(error: BaseException) -> bool:
+    # Attempt timeouts, connection errors, throttling and server errors are worth another try
+    if isinstance(error, (TimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
 class OCRLLMService(OpenAI, BaseService):
     def __init__(self):
         self.ocr_model = os.environ.get("OCR_LLM_MODEL", "rednote-hilab/dots.ocr")
         self.max_completion_tokens = int(os.environ.get("OCR_LLM_MAX_TOKENS", 32768))
 
-        self.ocr_endpoint = os.environ.get("OCR_LLM_ENDPOINT", "http://localhost:4377")
+        # Comma separated replica endpoints, falling back to the single endpoint
+        self.ocr_endpoints = [
+            e.strip().rstrip("/")
+            for e in os.environ.get(
+                "OCR_LLM_ENDPOINTS",
+                os.environ.get("OCR_LLM_ENDPOINT", "http://localhost:4377"),
+            ).split(",")
+            if e.strip()
+        ]
+        self.ocr_endpoint = self.ocr_endpoints[0]
         super().__init__(
             api_key="0",
             base_url=f"{self.ocr_endpoint}/v1",
@@ -54,62 +127,562 @@ class OCRLLMService(OpenAI, BaseService):
         self.temperature = 0.1
         self.top_p = 0.9
 
+        # Stream completions, and stop generating once the output degenerates into a loop
+        self.stream_completions = os.environ.get("OCR_LLM_STREAM", "true").lower() in ("1", "true", "yes")
+        self.degeneration = DegenerationOptions(
+            window=int(os.environ.get("OCR_LLM_REPETITION_WINDOW", 4096)),
+            max_period=int(os.environ.get("OCR_LLM_REPETITION_MAX_PERIOD", 256)),
+            check_interval=int(os.environ.get("OCR_LLM_REPETITION_CHECK_INTERVAL", 1024)),
+            duplicate_bbox_limit=int(os.environ.get("OCR_LLM_DUPLICATE_BBOX_LIMIT", 4)),
+        )
+
+        # Truncated completions are resumed by re-OCR of the unread part of the page
+        self.truncation_retries = int(os.environ.get("OCR_LLM_TRUNCATION_RETRIES", 2))
+        self.min_truncated_region_height = int(os.environ.get("OCR_LLM_MIN_TRUNCATED_REGION_HEIGHT", 56))
+
+        # Server-level defaults for how page images are sent to vLLM
+        self.image_encoding = ImageEncodingOptions(
+            format=cast(ImageWireFormat, os.environ.get("OCR_LLM_IMAGE_FORMAT", DefaultImageEncoding.format).upper()),
+            quality=int(os.environ.get("OCR_LLM_IMAGE_QUALITY", DefaultImageEncoding.quality)),
+            max_pixels=int(os.environ.get("OCR_LLM_MAX_PIXELS", DefaultImageEncoding.max_pixels)),
+            png_compress_level=int(os.environ.get("OCR_LLM_PNG_COMPRESS_LEVEL", DefaultImageEncoding.png_compress_level)),
+        )
+
+        # Shared keep-alive connection pool for the async replica clients
+        self.max_connections = int(os.environ.get("OCR_LLM_MAX_CONNECTIONS", 512))
+        self.max_keepalive_connections = int(os.environ.get("OCR_LLM_MAX_KEEPALIVE_CONNECTIONS", 128))
+        self.keepalive_expiry = float(os.environ.get("OCR_LLM_KEEPALIVE_EXPIRY", 60))
+        self.request_timeout = float(os.environ.get("OCR_LLM_TIMEOUT", 3000))
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.request_timeout, connect=5.0),
+        )
+        self.replica_pool = LLMReplicaPool(
+            endpoints=self.ocr_endpoints,
+            http_client=self.http_client,
+            routing=cast(ReplicaRoutingStrategy, os.environ.get("OCR_LLM_ROUTING", "requests")),
+            health_check_interval=float(os.environ.get("OCR_LLM_HEALTH_CHECK_INTERVAL", 10)),
+            unhealthy_threshold=int(os.environ.get("OCR_LLM_UNHEALTHY_THRESHOLD", 3)),
+            healthy_threshold=int(os.environ.get("OCR_LLM_HEALTHY_THRESHOLD", 2)),
+        )
+        self.cache_service = OCRCacheService.provider()
+        self.cpu_executor = CPUExecutorService.provider()
+        self.llm_seconds_metric = PIPELINE_STAGE_SECONDS.labels("llm")
+        self.parse_seconds_metric = PIPELINE_STAGE_SECONDS.labels("parse")
+        LLM_IN_FLIGHT.set_function(lambda: {
+            (replica.endpoint,): replica.outstanding_requests
+            for replica in self.replica_pool.replicas
+        })
+
+        # Tail latency control: per-attempt deadline, retries on another replica, and hedging
+        self.attempt_timeout = float(os.environ.get("OCR_LLM_ATTEMPT_TIMEOUT", 0))  # Seconds, 0 to disable
+        self.max_retries = int(os.environ.get("OCR_LLM_MAX_RETRIES", 2))
+        self.retry_backoff = float(os.environ.get("OCR_LLM_RETRY_BACKOFF", 0.5))
+        self.retry_backoff_max = float(os.environ.get("OCR_LLM_RETRY_BACKOFF_MAX", 10))
+        self.hedge_percentile = float(os.environ.get("OCR_LLM_HEDGE_PERCENTILE", 0))  # e.g. 0.95, 0 to disable
+        self.hedge_min_samples = int(os.environ.get("OCR_LLM_HEDGE_MIN_SAMPLES", 20))
+        self.hedge_min_delay = float(os.environ.get("OCR_LLM_HEDGE_MIN_DELAY", 1))
+        self._latencies: deque[float] = deque(maxlen=int(os.environ.get("OCR_LLM_LATENCY_WINDOW", 200)))
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        # Feed vLLM's scheduler queue depth into the adaptive concurrency limiter
+        self.metrics_poll_interval = float(os.environ.get("OCR_LLM_METRICS_POLL_INTERVAL", 0))
+        if self.metrics_poll_interval > 0:
+            limiter.set_queue_depth_probe(self.fetch_queue_depth, self.metrics_poll_interval)
+
+        self._sync_loop: asyncio.AbstractEventLoop | None = None
+        self._sync_loop_lock = threading.Lock()
+
     def health_check(self) -> bool:
-        try:
-            response = httpx.get(f"{self.ocr_endpoint}/health")
-            return response.status_code == 200
-        except Exception as e:
-            logger.error(f"OCR LLM health check failed: {e}")
-            return False
+        # Ready as long as one replica can serve requests
+        for endpoint in self.ocr_endpoints:
+            try:
+                response = httpx.get(f"{endpoint}/health")
+                if response.status_code == 200:
+                    return True
+            except Exception as e:
+                logger.error(f"OCR LLM health check failed for {endpoint}: {e}")
+        return False
+
+    async def _fetch_replica_queue_depth(self, endpoint: str) -> float | None:
+        response = await self.http_client.get(f"{endpoint}/metrics", timeout=5.0)
+        if response.status_code != 200:
+            return None
+
+        depth = None
+        for line in response.text.splitlines():
+            if line.startswith("vllm:num_requests_waiting"):
+                depth = (depth or 0.0) + float(line.rsplit(" ", 1)[-1])
+        return depth
+
+    async def fetch_queue_depth(self) -> float | None:
+        """Mean number of requests waiting in vLLM's scheduler per healthy replica, from /metrics."""
+        endpoints = [r.endpoint for r in self.replica_pool.replicas if r.healthy]
+        depths = await asyncio.gather(
+            *(self._fetch_replica_queue_depth(e) for e in endpoints),
+            return_exceptions=True,
+        )
+        depths = [d for d in depths if isinstance(d, float)]
+        if not depths:
+            return None
+        return sum(depths) / len(depths)
+
+    def _estimate_prompt_tokens(self, image: EncodedImage) -> int:
+        # dots.ocr emits one vision token per 28x28 pixel patch
+        return (image.width * image.height) // (28 * 28)
 
     def image_to_base64(
         self,
         image: Image.Image,
-        format: str = "PNG",
+        format: str = DefaultImageEncoding.format,
+        quality: int = DefaultImageEncoding.quality,
+        png_compress_level: int = DefaultImageEncoding.png_compress_level,
     ) -> str:
         buffered = BytesIO()
-        image.save(buffered, format=format)
+        if format == "PNG":
+            image.save(buffered, format=format, compress_level=png_compress_level)
+        else:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(buffered, format=format, quality=quality)
         base64_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
         return f"data:image/{format.lower()};base64,{base64_str}"
+
+    def encoding_options(self, **overrides) -> ImageEncodingOptions:
+        """Server-level encoding options with per-request overrides (None values are ignored)."""
+        return self.image_encoding.model_copy(update={
+            k: v for k, v in overrides.items() if v is not None
+        })
+
+    def _fit_pixel_budget(
+        self,
+        image: Image.Image,
+        max_pixels: int,
+    ) -> Image.Image:
+        if max_pixels <= 0 or image.width * image.height <= max_pixels:
+            return image
+
+        # Same rounding as dots.ocr preprocessing: sides are multiples of 28
+        factor = 28
+        ratio = math.sqrt(max_pixels / (image.width * image.height))
+        width = max(factor, math.floor(image.width * ratio / factor) * factor)
+        height = max(factor, math.floor(image.height * ratio / factor) * factor)
+        return image.resize((width, height), Image.Resampling.BICUBIC)
+
+    def encode_image(
+        self,
+        image: Image.Image,
+        options: ImageEncodingOptions | None = None,
+    ) -> EncodedImage:
+        options = options or self.image_encoding
+        resized = self._fit_pixel_budget(image, options.max_pixels)
+        return EncodedImage(
+            data_url=self.image_to_base64(
+                resized,
+                format=options.format,
+                quality=options.quality,
+                png_compress_level=options.png_compress_level,
+            ),
+            width=resized.width,
+            height=resized.height,
+            bbox_scale=(image.width / resized.width, image.height / resized.height),
+        )
     
     def safe_json_loads(self, s: str):
         try:
             return json.loads(s)
         except:
-            return []  # return empty list on failure
+            # Truncated output: recover the complete elements of the array
+            PARSE_FAILURES.labels("invalid_json").inc()
+            return JSONArrayStreamParser().feed(s)
 
-    def extract_text(
-        self,
-        image: Image.Image,
-    ) -> list[ExtractionResult]:
-        messages = []
-        messages.append({
+    def _cache_params(self, options: ImageEncodingOptions) -> dict:
+        return {
+            "model": self.ocr_model,
+            "prompt": PROMPT,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_completion_tokens,
+            "encoding": options.model_dump(),
+        }
+
+    def _build_messages(self, image: EncodedImage) -> list:
+        return [{
             "role": "user",
             "content": [
                 {
                     "type": "image_url",
-                    "image_url": {"url": self.image_to_base64(image)}
+                    "image_url": {"url": image.data_url}
                 },
                 {
                     "type": "text",
                     "text": PROMPT,
                 }
             ]
-        })
+        }]
+
+    def _parse_result_text(
+        self,
+        result_text: str | None,
+        image: EncodedImage,
+    ) -> list[ExtractionResult]:
+        if not result_text:
+            logger.error("OCR LLM returned empty result")
+            PARSE_FAILURES.labels("empty").inc()
+            return []
+
+        return self._to_results(self.safe_json_loads(result_text), image)
+
+    def _parse_result_stream(
+        self,
+        output: OCROutputStream,
+        image: EncodedImage,
+    ) -> list[ExtractionResult]:
+        started = time.perf_counter()
+        try:
+            with span("parse", streamed_parse_ms=round(output.parse_seconds * 1000, 3), chars=len(output.text)) as s:
+                results = self._parse_output(output, image)
+                s.set_attribute("elements", len(results))
+                return results
+        finally:
+            # Elements were mostly parsed while the completion streamed in
+            self.parse_seconds_metric.observe(output.parse_seconds + time.perf_counter() - started)
+
+    def _parse_output(
+        self,
+        output: OCROutputStream,
+        image: EncodedImage,
+    ) -> list[ExtractionResult]:
+        if output.abort_reason is not None:
+            # Keep the elements completed before the output degenerated
+            logger.warning(
+                f"Aborted degenerate OCR LLM output after {len(output.text)} characters "
+                f"({output.abort_reason}), kept {len(output.items)} elements"
+            )
+            return self._to_results(output.items, image)
+        if not output.items:
+            # Not a plain JSON array, parse the whole text
+            return self._parse_result_text(output.text, image)
+        return self._to_results(output.items, image)
+
+    def _to_results(
+        self,
+        result_json: list,
+        image: EncodedImage,
+    ) -> list[ExtractionResult]:
+        try:
+            results = [ExtractionResult.model_validate(item) for item in result_json]
+        except ValidationError:
+            PARSE_FAILURES.labels("invalid_element").inc()
+            raise
+
+        # Map bboxes from the downscaled image back to the original image
+        sx, sy = image.bbox_scale
+        if (sx, sy) != (1.0, 1.0):
+            for r in results:
+                r.bbox = [
+                    round(v * (sx if i % 2 == 0 else sy))
+                    for i, v in enumerate(r.bbox)
+                ]
+        return results
+
+    def _record_completion(self, finish_reason: str | None, usage: CompletionUsage | None):
+        LLM_COMPLETIONS.labels(finish_reason or "unknown").inc()
+        current_span().set_attribute("finish_reason", finish_reason or "unknown")
+        if usage is not None:
+            LLM_PROMPT_TOKENS.inc(usage.prompt_tokens)
+            LLM_COMPLETION_TOKENS.inc(usage.completion_tokens)
+            current_span().set_attributes(
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+            )
+
+    def _record_page(self, results: list[ExtractionResult]):
+        PAGES.labels("vision").inc()
+        for r in results:
+            ELEMENTS.labels(r.category).inc()
+
+    def _get_cached(self, cache_key: str) -> list[ExtractionResult] | None:
+        cached = self.cache_service.get(cache_key)
+        if cached is None:
+            return None
+        return [ExtractionResult.model_validate(item) for item in cached]
+
+    def _set_cached(self, cache_key: str, extraction_results: list[ExtractionResult]):
+        # Only cache non-empty results, so failed pages are retried
+        if extraction_results:
+            self.cache_service.set(cache_key, [r.model_dump() for r in extraction_results])
+
+    # Redis calls run on a thread, so a slow Redis never stalls the event loop
+    async def _get_cached_async(self, cache_key: str) -> list[ExtractionResult] | None:
+        if not self.cache_service.enabled:
+            return None
+        return await asyncio.to_thread(self._get_cached, cache_key)
+
+    async def _set_cached_async(self, cache_key: str, extraction_results: list[ExtractionResult]):
+        if self.cache_service.enabled and extraction_results:
+            await asyncio.to_thread(self._set_cached, cache_key, extraction_results)
 
-        response = self.chat.completions.create(
+    def _truncated_region(
+        self,
+        image: Image.Image,
+        results: list[ExtractionResult],
+    ) -> int | None:
+        '''Top of the part of a page left unread by a truncated completion, if worth re-OCR.'''
+        if not results:
+            return None  # Nothing recovered, a re-OCR of the same region would end the same way
+        top = max(0, min(results[-1].bbox[3], image.height))
+        if image.height - top < self.min_truncated_region_height:
+            return None
+        return top
+
+    def _stitch(
+        self,
+        results: list[ExtractionResult],
+        region_results: list[ExtractionResult],
+        top: int,
+    ) -> list[ExtractionResult]:
+        for r in region_results:
+            r.bbox = [v + top if i % 2 == 1 else v for i, v in enumerate(r.bbox)]
+        return results + region_results
+
+    async def _complete_on(
+        self,
+        replica: LLMReplica,
+        encoded: EncodedImage,
+    ) -> OCRCompletion:
+        if not self.stream_completions:
+            response = await replica.completions.create(
+                model=self.ocr_model,
+                messages=self._build_messages(encoded),
+                temperature=self.temperature,
+                top_p=self.top_p,
+                max_tokens=self.max_completion_tokens
+            )
+            choice = response.choices[0]
+            self._record_completion(choice.finish_reason, response.usage)
+            with self.parse_seconds_metric.time(), span("parse", chars=len(choice.message.content or "")) as s:
+                results = self._parse_result_text(choice.message.content, encoded)
+                s.set_attribute("elements", len(results))
+            return OCRCompletion(
+                results=results,
+                truncated=choice.finish_reason == "length",
+            )
+
+        output = OCROutputStream(self.degeneration)
+        finish_reason = None
+        usage: CompletionUsage | None = None
+        stream = await replica.completions.create(
             model=self.ocr_model,
-            messages=messages,
+            messages=self._build_messages(encoded),
             temperature=self.temperature,
             top_p=self.top_p,
-            max_tokens=self.max_completion_tokens
+            max_tokens=self.max_completion_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
         )
-        result_text = response.choices[0].message.content
-        
-        if not result_text:
-            logger.error("OCR LLM returned empty result")
-            return []
-        
-        result_json = self.safe_json_loads(result_text)
-        extraction_results = [ExtractionResult.model_validate(item) for item in result_json]
-        return extraction_results
\ No newline at end of file
+        try:
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if chunk.choices[0].delta.content and not output.feed(chunk.choices[0].delta.content):
+                    break
+        finally:
+            # Closing the connection makes vLLM abort the generation
+            await stream.close()
+        self._record_completion("aborted" if output.abort_reason is not None else finish_reason, usage)
+        return OCRCompletion(
+            results=self._parse_result_stream(output, encoded),
+            truncated=finish_reason == "length" or output.abort_reason is not None,
+        )
+
+    async def _attempt(
+        self,
+        encoded: EncodedImage,
+        exclude: LLMReplica | None,
+        replicas: list[LLMReplica],
+    ) -> OCRCompletion:
+        '''One request to the least loaded replica other than `exclude`, appended to `replicas`.'''
+        started = time.monotonic()
+        with span(
+            "llm",
+            attempt=len(replicas) + 1,
+            width=encoded.width,
+            height=encoded.height,
+            request_bytes=len(encoded.data_url),
+        ) as s:
+            async with self.replica_pool.lease(tokens=self._estimate_prompt_tokens(encoded), exclude=exclude) as replica:
+                replicas.append(replica)
+                s.set_attribute("replica", replica.endpoint)
+                if self.attempt_timeout > 0:
+                    completion = await asyncio.wait_for(self._complete_on(replica, encoded), self.attempt_timeout)
+                else:
+                    completion = await self._complete_on(replica, encoded)
+        self._latencies.append(time.monotonic() - started)
+        self.llm_seconds_metric.observe(time.monotonic() - started)
+        return completion
+
+    def hedge_delay(self) -> float | None:
+        '''Seconds after which a slow request is hedged, from recent request latencies.'''
+        if (
+            self.hedge_percentile <= 0
+            or len(self.replica_pool.replicas) < 2
+            or len(self._latencies) < self.hedge_min_samples
+        ):
+            return None
+        latencies = sorted(self._latencies)
+        idx = min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile))
+        return max(self.hedge_min_delay, latencies[idx])
+
+    async def _hedged_attempt(
+        self,
+        encoded: EncodedImage,
+        exclude: LLMReplica | None,
+        replicas: list[LLMReplica],
+    ) -> OCRCompletion:
+        started = time.monotonic()
+        primary = asyncio.create_task(self._attempt(encoded, exclude, replicas))
+        delay = self.hedge_delay()
+        if delay is None:
+            return await primary
+
+        hedge: asyncio.Task[OCRCompletion] | None = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            # Slower than usual: race a duplicate on another replica, first answer wins
+            self.hedges += 1
+            hedge = asyncio.create_task(self._hedge(encoded, replicas[-1] if replicas else exclude, replicas))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                            if primary.done() and not primary.cancelled() and primary.exception() is not None:
+                                # The slot only observes the hedge's success, report the failure it hid
+                                limiter.observe(time.monotonic() - started, primary.exception())
+                        return task.result()
+            raise primary.exception()  # type: ignore
+        finally:
+            # Cancelling the loser closes its connection, which aborts it in vLLM
+            tasks = [task for task in (primary, hedge) if task is not None]
+            for task in tasks:
+                task.cancel()
+            # Collect the loser's outcome, so its exception is not reported as never retrieved
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _hedge(
+        self,
+        encoded: EncodedImage,
+        exclude: LLMReplica | None,
+        replicas: list[LLMReplica],
+    ) -> OCRCompletion:
+        # A hedge takes a concurrency slot of its own, so hedging never exceeds the adaptive limit
+        async with limiter.slot():
+            return await self._attempt(encoded, exclude, replicas)
+
+    async def complete_async(self, encoded: EncodedImage) -> OCRCompletion:
+        '''Run one encoded page through the least loaded OCR LLM replica, retrying
+        retryable errors on another replica with jittered exponential backoff.'''
+        replicas: list[LLMReplica] = []
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                return await self._hedged_attempt(encoded, replicas[-1] if replicas else None, replicas)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable_error(e):
+                    raise
+                # The limiter only sees the final outcome on release, so overload hidden by retries is reported here
+                limiter.observe(time.monotonic() - started, e)
+                self.retries += 1
+                backoff = random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt))
+                logger.warning(
+                    f"OCR LLM attempt {attempt + 1} failed ({type(e).__name__}: {e}), "
+                    f"retrying in {backoff:.2f}s"
+                )
+                await asyncio.sleep(backoff)
+        raise AssertionError("unreachable")
+
+    def request_stats(self) -> OCRRequestStats:
+        return OCRRequestStats(
+            retries=self.retries,
+            hedges=self.hedges,
+            hedge_wins=self.hedge_wins,
+            hedge_delay=self.hedge_delay(),
+        )
+
+    def _run_sync(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        # One private loop for all blocking callers, as the replica clients share a connection pool
+        with self._sync_loop_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._sync_loop.run_forever, name="ocr-llm-sync", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._sync_loop).result()
+
+    def complete(self, encoded: EncodedImage) -> OCRCompletion:
+        '''Blocking `complete_async`, for callers without an event loop, e.g. scripts.'''
+        return self._run_sync(self.complete_async(encoded))
+
+    def extract_text(
+        self,
+        image: Image.Image,
+        options: ImageEncodingOptions | None = None,
+    ) -> list[ExtractionResult]:
+        '''Blocking `extract_text_async`, for callers without an event loop, e.g. scripts.
+
+        Not meant for a process that also runs the async methods on its own loop.
+        '''
+        return self._run_sync(self.extract_text_async(image, options))
+
+    async def extract_text_async(
+        self,
+        image: Image.Image,
+        options: ImageEncodingOptions | None = None,
+        complete: Callable[[EncodedImage], Awaitable[OCRCompletion]] | None = None,
+    ) -> list[ExtractionResult]:
+        '''OCR an image; `complete` runs the encoded page, by default against the OCR LLM directly.'''
+        options = options or self.image_encoding
+        complete = complete or self.complete_async
+
+        # Serve repeated pages from cache; the key hashes every pixel, so skip it when caching is off
+        cache_key = None
+        if self.cache_service.enabled:
+            cache_key = await self.cpu_executor.run("encode", self.cache_service.make_key, image, self._cache_params(options))
+            cached = await self._get_cached_async(cache_key)
+            if cached is not None:
+                PAGES.labels("cache").inc()
+                current_span().set_attribute("cache_hit", True)
+                return cached
+
+        completion = await complete(await self.cpu_executor.run("encode", self.encode_image, image, options))
+        extraction_results = completion.results
+
+        # Re-OCR only the part of the page below the last element a truncated completion recovered
+        for _ in range(self.truncation_retries):
+            top = self._truncated_region(image, extraction_results) if completion.truncated else None
+            if top is None:
+                break
+            logger.info(f"Re-OCR of truncated page below y={top} ({len(extraction_results)} elements recovered)")
+            region = image.crop((0, top, image.width, image.height))
+            completion = await complete(await self.cpu_executor.run("encode", self.encode_image, region, options))
+            extraction_results = self._stitch(extraction_results, completion.results, top)
+            if not completion.results:
+                break  # The region pass recovered nothing, another one would read the same crop
+
+        self._record_page(extraction_results)
+        # A page still cut short, or aborted on degenerate output, is OCR'd again next time
+        if cache_key is not None and not completion.truncated:
+            await self._set_cached_async(cache_key, extraction_results)
+        return extraction_results
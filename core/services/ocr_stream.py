@@ -0,0 +1,138 @@
+import re
+import json
+import time
+from collections import Counter
+from typing import Any, TypedDict
+
+# Characters that change the nesting state of a JSON document
+_STRUCTURAL_CHARS = re.compile(r'[\[\]{}"\\]')
+
+
+class DegenerationOptions(TypedDict):
+    window: int  # Tail of the output checked for verbatim repetition, 0 to disable
+    max_period: int  # Longest repeated unit, in characters
+    check_interval: int  # Characters generated between two repetition checks
+    duplicate_bbox_limit: int  # Times one bbox may appear before the output is degenerate, 0 to disable
+
+
+class JSONArrayStreamParser:
+    '''Incrementally parses a streamed top-level JSON array, returning each
+    element as soon as its closing bracket arrives.'''
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # Next position of the buffer to scan
+        self._depth = 0
+        self._in_string = False
+        self._skip_to = 0  # End of an escape sequence inside a string
+        self._element_start: int | None = None
+
+    def feed(self, text: str) -> list[Any]:
+        self._buffer += text
+        buffer = self._buffer
+        items: list[Any] = []
+
+        for match in _STRUCTURAL_CHARS.finditer(buffer, self._pos):
+            i = match.start()
+            if i < self._skip_to:
+                continue
+            c = match.group()
+            if self._in_string:
+                if c == "\\":
+                    self._skip_to = i + 2
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "[{":
+                self._depth += 1
+                if self._depth == 2:
+                    self._element_start = i
+            elif c in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._element_start is not None:
+                    try:
+                        items.append(json.loads(buffer[self._element_start:i + 1]))
+                    except ValueError:
+                        pass  # Malformed element, leave it to the full-text fallback
+                    self._element_start = None
+
+        # Only the element being parsed needs to stay buffered
+        scanned = len(buffer)
+        keep_from = self._element_start if self._element_start is not None else scanned
+        self._buffer = buffer[keep_from:]
+        self._pos = scanned - keep_from
+        self._skip_to = max(0, self._skip_to - keep_from)
+        if self._element_start is not None:
+            self._element_start = 0
+        return items
+
+
+class OCROutputStream:
+    '''Accumulates a streamed OCR completion, parsing layout elements as they
+    close and flagging degenerate output: a tail that repeats one short unit
+    verbatim, or the same bbox emitted over and over.'''
+    def __init__(self, options: DegenerationOptions):
+        self.options = options
+        self.parser = JSONArrayStreamParser()
+        self.items: list[Any] = []
+        self.abort_reason: str | None = None
+        self.parse_seconds = 0.0  # Time spent parsing and checking the output
+
+        self._parts: list[str] = []
+        self._tail = ""
+        self._unchecked = 0
+        self._bboxes: Counter[tuple] = Counter()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def _check_repetition(self) -> str | None:
+        tail = self._tail
+        if len(tail) < self.options["window"]:
+            return None
+        for period in range(1, self.options["max_period"] + 1):
+            if tail[period:] == tail[:-period]:
+                return f"last {len(tail)} characters repeat a {period}-character pattern"
+        return None
+
+    def _check_element(self, item: Any) -> str | None:
+        limit = self.options["duplicate_bbox_limit"]
+        if limit <= 0 or not isinstance(item, dict) or not isinstance(item.get("bbox"), list):
+            return None
+        bbox = tuple(item["bbox"])
+        self._bboxes[bbox] += 1
+        if self._bboxes[bbox] > limit:
+            return f"bbox {list(bbox)} emitted {self._bboxes[bbox]} times"
+        return None
+
+    def feed(self, delta: str) -> bool:
+        '''Add generated text; returns False once the output is degenerate.'''
+        started = time.perf_counter()
+        self._parts.append(delta)
+
+        for item in self.parser.feed(delta):
+            if self.abort_reason is not None:
+                break
+            reason = self._check_element(item)
+            if reason is not None:
+                self.abort_reason = reason
+                # Keep only the first of the repeated elements
+                first = next(i for i, it in enumerate(self.items) if isinstance(it, dict) and it.get("bbox") == item["bbox"])
+                self.items = self.items[:first + 1] + [
+                    it for it in self.items[first + 1:]
+                    if not (isinstance(it, dict) and it.get("bbox") == item["bbox"])
+                ]
+                break
+            self.items.append(item)
+
+        window = self.options["window"]
+        if window > 0 and self.abort_reason is None:
+            self._tail = (self._tail + delta)[-window:]
+            self._unchecked += len(delta)
+            if self._unchecked >= self.options["check_interval"]:
+                self._unchecked = 0
+                self.abort_reason = self._check_repetition()
+
+        self.parse_seconds += time.perf_counter() - started
+        return self.abort_reason is None
@@ -0,0 +1,225 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Literal, cast
+
+from pydantic import BaseModel
+
+from core.base import BaseService
+from core.services.redis import AsyncRedisService
+from core.services.ocr_llm import EncodedImage, ExtractionResult, OCRCompletion
+from core.tracing import span
+
+logger = logging.getLogger("uvicorn.error")
+
+OCRDispatchMode = Literal["inline", "local", "redis"]
+
+
+class OCRTask(BaseModel):
+    task_id: str
+    image: EncodedImage
+    deadline: float  # Epoch seconds after which the submitter no longer waits
+    reply_to: str = ""  # Redis list the result is pushed to
+    traceparent: str | None = None  # Span the worker's spans are children of
+
+
+class OCRTaskResult(BaseModel):
+    task_id: str
+    results: list[ExtractionResult] = []
+    truncated: bool = False
+    error: str | None = None
+
+
+class OCRTaskError(RuntimeError):
+    '''An OCR task failed on the worker that ran it.'''
+
+
+class OCRTaskQueue(ABC):
+    '''Queue of page-level OCR tasks between the API, which encodes pages and
+    assembles results, and the workers calling the OCR LLM.'''
+    def __init__(self):
+        self.task_timeout = float(os.getenv("OCR_TASK_TIMEOUT", os.getenv("OCR_LLM_TIMEOUT", 3000)))
+        self._waiters: dict[str, asyncio.Future[OCRTaskResult]] = {}
+
+    @abstractmethod
+    async def _put(self, task: OCRTask):
+        ...
+
+    @abstractmethod
+    async def get(self, timeout: float) -> OCRTask | None:
+        '''Next task for a worker, or None after `timeout` seconds.'''
+
+    @abstractmethod
+    async def complete(self, task: OCRTask, result: OCRTaskResult):
+        '''Hand a task result back to its submitter.'''
+
+    @abstractmethod
+    async def discard(self, task: OCRTask):
+        '''Drop a task taken by `get` without a result, e.g. one past its deadline.'''
+
+    def _resolve(self, result: OCRTaskResult):
+        future = self._waiters.get(result.task_id)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def submit(self, image: EncodedImage) -> OCRCompletion:
+        '''Queue an encoded page and wait for a worker's result.'''
+        with span("ocr_task") as task_span:
+            task = OCRTask(
+                task_id=uuid.uuid4().hex,
+                image=image,
+                deadline=time.time() + self.task_timeout,
+                traceparent=task_span.traceparent or None,
+            )
+            task_span.set_attribute("task_id", task.task_id)
+            future: asyncio.Future[OCRTaskResult] = asyncio.get_running_loop().create_future()
+            self._waiters[task.task_id] = future
+            try:
+                await self._put(task)
+                result = await asyncio.wait_for(future, self.task_timeout)
+            finally:
+                self._waiters.pop(task.task_id, None)
+
+        if result.error is not None:
+            raise OCRTaskError(result.error)
+        return OCRCompletion(results=result.results, truncated=result.truncated)
+
+
+class LocalOCRTaskQueue(OCRTaskQueue, BaseService):
+    '''In-process stand-in for the Redis queue, served by an embedded worker.'''
+    def __init__(self):
+        super().__init__()
+        self._queue: asyncio.Queue[OCRTask] = asyncio.Queue()
+
+    async def _put(self, task: OCRTask):
+        await self._queue.put(task)
+
+    async def get(self, timeout: float) -> OCRTask | None:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def complete(self, task: OCRTask, result: OCRTaskResult):
+        self._resolve(result)
+
+    async def discard(self, task: OCRTask):
+        pass
+
+
+class RedisOCRTaskQueue(OCRTaskQueue, BaseService):
+    '''Tasks are pushed to a shared Redis list; each API process reads the
+    results of its own tasks from a reply list by a single background listener.
+
+    A task taken by a worker is parked in the worker's own processing list
+    until its result is sent. Each worker process holds a lease it renews
+    every third of `OCR_TASK_LEASE` seconds, and the tasks of a worker whose
+    lease expired, e.g. after a crash, are queued again by the other workers.
+    Workers skip tasks past their deadline.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.redis_service = AsyncRedisService.provider()
+        self.key_prefix = "ocr_tasks"
+        self.queue_key = f"{self.key_prefix}:queue"
+        self.reply_key = f"{self.key_prefix}:replies:{uuid.uuid4().hex}"
+        self.reply_ttl_seconds = 3600  # Replies to processes that are gone expire
+        self._listener: asyncio.Task | None = None
+
+        # Worker side: tasks in flight are redelivered when their worker's lease expires
+        self.lease_seconds = int(os.getenv("OCR_TASK_LEASE", 30))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.workers_key = f"{self.key_prefix}:workers"
+        self.processing_key = self._processing_key(self.worker_id)
+        self._claimed: dict[str, bytes] = {}  # Task id -> its payload in the processing list
+        self._heartbeat: asyncio.Task | None = None
+
+    def _processing_key(self, worker_id: str) -> str:
+        return f"{self.key_prefix}:processing:{worker_id}"
+
+    def _lease_key(self, worker_id: str) -> str:
+        return f"{self.key_prefix}:lease:{worker_id}"
+
+    async def _requeue_expired(self):
+        for worker_id in await self.redis_service.smembers(self.workers_key):  # type: ignore
+            worker_id = worker_id.decode() if isinstance(worker_id, bytes) else worker_id
+            if worker_id == self.worker_id or await self.redis_service.exists(self._lease_key(worker_id)):
+                continue
+            # Requeued at the head, each task moved atomically so concurrent reclaims never duplicate one
+            while await self.redis_service.lmove(self._processing_key(worker_id), self.queue_key, "RIGHT", "LEFT"):
+                logger.info(f"Requeued an OCR task of stopped worker {worker_id}")
+            await self.redis_service.srem(self.workers_key, worker_id)  # type: ignore
+
+    async def _keep_lease(self):
+        while True:
+            try:
+                await self.redis_service.set(self._lease_key(self.worker_id), time.time(), ex=self.lease_seconds)
+                await self.redis_service.sadd(self.workers_key, self.worker_id)  # type: ignore
+                await self._requeue_expired()
+            except Exception as e:
+                logger.warning(f"OCR task lease renewal failed: {e}")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _release(self, task: OCRTask):
+        payload = self._claimed.pop(task.task_id, None)
+        if payload is not None:
+            await self.redis_service.lrem(self.processing_key, 1, payload)  # type: ignore
+
+    async def _listen(self):
+        while True:
+            try:
+                popped = await self.redis_service.blpop([self.reply_key], timeout=5)  # type: ignore
+            except Exception as e:
+                logger.warning(f"OCR task reply listener failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if popped is not None:
+                self._resolve(OCRTaskResult.model_validate_json(popped[1]))
+
+    async def _put(self, task: OCRTask):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        task.reply_to = self.reply_key
+        await self.redis_service.rpush(self.queue_key, task.model_dump_json())  # type: ignore
+
+    async def get(self, timeout: float) -> OCRTask | None:
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._keep_lease())
+        payload = await self.redis_service.blmove(  # type: ignore
+            self.queue_key,
+            self.processing_key,
+            timeout,
+            "LEFT",
+            "RIGHT",
+        )
+        if payload is None:
+            return None
+        task = OCRTask.model_validate_json(payload)
+        self._claimed[task.task_id] = payload
+        return task
+
+    async def complete(self, task: OCRTask, result: OCRTaskResult):
+        await self.redis_service.rpush(task.reply_to, result.model_dump_json())  # type: ignore
+        await self.redis_service.expire(task.reply_to, self.reply_ttl_seconds)
+        await self._release(task)
+
+    async def discard(self, task: OCRTask):
+        await self._release(task)
+
+
+def ocr_dispatch_mode() -> OCRDispatchMode:
+    return cast(OCRDispatchMode, os.getenv("OCR_DISPATCH", "inline").lower())
+
+
+def get_task_queue() -> OCRTaskQueue | None:
+    '''Task queue selected by `OCR_DISPATCH`, None when pages are OCR'd inline.'''
+    mode = ocr_dispatch_mode()
+    if mode == "local":
+        return LocalOCRTaskQueue.provider()
+    if mode == "redis":
+        return RedisOCRTaskQueue.provider()
+    return None
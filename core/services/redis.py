@@ -2,6 +2,7 @@ import os
 import json
 
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 from core.base import BaseService
 
@@ -15,8 +16,17 @@ class RedisService(Redis, BaseService):
             host=redis_host,
             port=redis_port,
             db=redis_db,
+            # Bounded, so an unreachable Redis fails a call instead of hanging it
+            socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 5)),
+            socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", 2)),
         )
 
+    def health_check(self) -> bool:
+        try:
+            return bool(self.ping())
+        except Exception:
+            return False
+
     def set(
         self,
         key: str,
@@ -32,4 +42,17 @@ class RedisService(Redis, BaseService):
         value = super().get(key)
         if value is not None:
             return json.loads(value)  # type: ignore
-        return None
\ No newline at end of file
+        return None
+
+
+class AsyncRedisService(AsyncRedis, BaseService):
+    '''asyncio client, for blocking queue operations that must not hold a thread.'''
+    def __init__(self):
+        redis_host = os.getenv("REDIS_HOST", "localhost")
+        redis_port = int(os.getenv("REDIS_PORT", 6379))
+        redis_db = int(os.getenv("REDIS_DB", 0))
+        super().__init__(
+            host=redis_host,
+            port=redis_port,
+            db=redis_db,
+        )
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import secrets
+import threading
+from functools import partial
+from contextvars import ContextVar, copy_context
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Literal, TypeVar, cast
+
+import httpx
+
+T = TypeVar("T")
+
+logger = logging.getLogger("uvicorn.error")
+
+TracingExporter = Literal["none", "jsonl", "otlp"]
+
+TRACING_EXPORTER = cast(TracingExporter, os.getenv("TRACING_EXPORTER", "none").lower())
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "ocr-service")
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "tmp/traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_BATCH_SIZE = int(os.getenv("TRACING_BATCH_SIZE", 512))
+TRACING_FLUSH_INTERVAL = float(os.getenv("TRACING_FLUSH_INTERVAL", 2))  # Seconds
+TRACING_MAX_QUEUE = int(os.getenv("TRACING_MAX_QUEUE", 100000))  # Spans beyond this are dropped
+
+
+class Span:
+    '''A timed operation within a trace. Attributes should be strings, numbers or booleans.'''
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None,
+        attributes: dict[str, Any],
+        start: float | None = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time() if start is None else start
+        self.end: float | None = None
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    @property
+    def traceparent(self) -> str:
+        '''W3C trace context of this span, to continue the trace in another process.'''
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": TRACING_SERVICE_NAME,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": round(((self.end or self.start) - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan(Span):
+    def __init__(self):
+        super().__init__("", "", None, {}, 0.0)
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes: Any):
+        pass
+
+    @property
+    def traceparent(self) -> str:
+        return ""
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_remote_parent: ContextVar[tuple[str, str] | None] = ContextVar("remote_parent", default=None)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> dict:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # Internal
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int((span.end or span.start) * 1e9)),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+class SpanExporter:
+    '''Batches finished spans on a background thread, so exporting never blocks a request.'''
+    def __init__(self, exporter: TracingExporter):
+        self.exporter = exporter
+        self._queue: queue.Queue[Span | None] = queue.Queue(maxsize=TRACING_MAX_QUEUE)  # None stops the thread
+        self._dropped = 0
+        self._client = httpx.Client(timeout=10) if exporter == "otlp" else None
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self._dropped += 1
+
+    def _drain(self, timeout: float) -> list[Span | None]:
+        spans: list[Span | None] = []
+        try:
+            spans.append(self._queue.get(timeout=timeout))
+            while len(spans) < TRACING_BATCH_SIZE:
+                spans.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return spans
+
+    def _export(self, spans: list[Span]):
+        if self.exporter == "jsonl":
+            os.makedirs(os.path.dirname(TRACING_JSONL_PATH) or ".", exist_ok=True)
+            with open(TRACING_JSONL_PATH, "a") as f:
+                f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        elif self._client is not None:
+            self._client.post(TRACING_OTLP_ENDPOINT, json={"resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "ocr-service"},
+                    "spans": [_otlp_span(span) for span in spans],
+                }],
+            }]}).raise_for_status()
+
+    def _run(self):
+        while True:
+            batch = self._drain(TRACING_FLUSH_INTERVAL)
+            spans = [span for span in batch if span is not None]
+            if spans:
+                try:
+                    self._export(spans)
+                except Exception as e:
+                    logger.warning(f"Failed to export {len(spans)} spans: {e}")
+            if self._dropped:
+                logger.warning(f"Dropped {self._dropped} spans, the export queue was full")
+                self._dropped = 0
+            if len(spans) < len(batch):
+                return
+
+    def shutdown(self, timeout: float = 10):
+        '''Export the queued spans and stop the thread.'''
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+_exporter = SpanExporter(TRACING_EXPORTER) if TRACING_EXPORTER != "none" else None
+
+
+def current_span() -> Span:
+    '''The innermost active span, or a no-op span outside of any trace.'''
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, start: float | None = None, **attributes: Any) -> Iterator[Span]:
+    '''Time the block as a child of the current span, or as the root of a new trace.
+
+    `start` backdates the span (epoch seconds) to cover work done before the block.
+    '''
+    if _exporter is None:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = _remote_parent.get() or (secrets.token_hex(16), None)
+
+    current = Span(name, trace_id, parent_id, attributes, start)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end = time.time()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Exited in another context, e.g. an async generator finalized by the garbage collector
+            pass
+        _exporter.submit(current)
+
+
+def record_span(name: str, start: float, end: float, **attributes: Any):
+    '''Record an operation timed elsewhere, e.g. in a worker process, as a child of the current span.'''
+    parent = _current_span.get()
+    if _exporter is None or parent is None:
+        return
+    finished = Span(name, parent.trace_id, parent.span_id, attributes, start)
+    finished.end = end
+    _exporter.submit(finished)
+
+
+def bind_context(func: Callable[..., T], *args, **kwargs) -> Callable[[], T]:
+    '''Bind a call to a copy of the current context, so spans opened on a pool thread keep their parent.'''
+    return partial(copy_context().run, func, *args, **kwargs)
+
+
+@contextmanager
+def continue_trace(traceparent: str | None) -> Iterator[None]:
+    '''Make the spans opened in the block children of a span from another process.'''
+    parts = (traceparent or "").split("-")
+    if _exporter is None or len(parts) != 4 or not parts[1] or not parts[2]:
+        yield
+        return
+    token = _remote_parent.set((parts[1], parts[2]))
+    try:
+        yield
+    finally:
+        _remote_parent.reset(token)
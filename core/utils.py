@@ -1,21 +1,269 @@
 import os
-from typing import Callable, TypeVar, TypedDict
+import time
+import logging
+import tempfile
+from typing import AsyncIterator, Awaitable, Callable, TypeVar, TypedDict
+from contextlib import asynccontextmanager
+from collections import deque
 from functools import partial
 import asyncio
 
+from fastapi import UploadFile
+
+from core.metrics import CONCURRENCY
+from core.tracing import span
+
 T = TypeVar("T")
 
-MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", 1))  # Default to 2 to avoid out-of-memory in vllm
-semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+logger = logging.getLogger("uvicorn.error")
+
+MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", 1))  # Initial limit, low to avoid out-of-memory in vllm
+CONCURRENCY_ADAPTIVE = os.getenv("CONCURRENCY_ADAPTIVE", "true").lower() in ("1", "true", "yes")
+CONCURRENCY_FLOOR = int(os.getenv("CONCURRENCY_FLOOR", 1))
+CONCURRENCY_CEILING = int(os.getenv("CONCURRENCY_CEILING", 16))
+CONCURRENCY_BACKOFF = float(os.getenv("CONCURRENCY_BACKOFF", 0.5))  # Multiplicative decrease factor
+CONCURRENCY_LATENCY_THRESHOLD = float(os.getenv("CONCURRENCY_LATENCY_THRESHOLD", 0))  # Seconds, 0 to disable
+CONCURRENCY_QUEUE_DEPTH_THRESHOLD = float(os.getenv("CONCURRENCY_QUEUE_DEPTH_THRESHOLD", 4))
+CONCURRENCY_DECREASE_COOLDOWN = float(os.getenv("CONCURRENCY_DECREASE_COOLDOWN", 5))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # None: system temp directory
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+
+class ConcurrencyStats(TypedDict):
+    adaptive: bool
+    limit: int
+    in_flight: int
+    waiters: int
+    floor: int
+    ceiling: int
+    queue_depth: float | None
+
+
+def _is_overload_error(error: BaseException) -> bool:
+    """Timeouts, 429 and 5xx responses mean the model server is saturated."""
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter for in-flight LLM requests.
+
+    The limit starts in slow start (one more slot per success) until the first
+    congestion signal. After that it grows by one for every window of successful requests that used
+    the whole limit, and is multiplied by `backoff` on timeouts, 5xx/429
+    errors, latency above `latency_threshold`, or a model server queue deeper
+    than `queue_depth_threshold`. It always stays within [floor, ceiling].
+    """
+    def __init__(
+        self,
+        initial: int,
+        floor: int,
+        ceiling: int,
+        adaptive: bool = True,
+        backoff: float = 0.5,
+        latency_threshold: float = 0,
+        queue_depth_threshold: float = 0,
+        decrease_cooldown: float = 5,
+    ):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.adaptive = adaptive
+        self.backoff = backoff
+        self.latency_threshold = latency_threshold
+        self.queue_depth_threshold = queue_depth_threshold
+        self.decrease_cooldown = decrease_cooldown
+
+        self._limit = float(min(max(initial, self.floor), self.ceiling))
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._slow_start = True
+        self._queue_depth: float | None = None
+
+        self._queue_depth_probe: Callable[[], Awaitable[float | None]] | None = None
+        self._queue_depth_interval = 0.0
+        self._queue_depth_task: asyncio.Task | None = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def stats(self) -> ConcurrencyStats:
+        return ConcurrencyStats(
+            adaptive=self.adaptive,
+            limit=self.limit,
+            in_flight=self._in_flight,
+            waiters=len(self._waiters),
+            floor=self.floor,
+            ceiling=self.ceiling,
+            queue_depth=self._queue_depth,
+        )
+
+    def set_queue_depth_probe(
+        self,
+        probe: Callable[[], Awaitable[float | None]],
+        interval: float,
+    ):
+        """Poll the model server queue depth every `interval` seconds."""
+        self._queue_depth_probe = probe
+        self._queue_depth_interval = interval
+
+    async def _poll_queue_depth(self):
+        assert self._queue_depth_probe is not None
+        while True:
+            try:
+                depth = await self._queue_depth_probe()
+                if depth is not None:
+                    self.observe_queue_depth(depth)
+            except Exception as e:
+                logger.warning(f"Queue depth probe failed: {e}")
+            await asyncio.sleep(self._queue_depth_interval)
+
+    def _ensure_polling(self):
+        if self._queue_depth_probe is None or self._queue_depth_interval <= 0:
+            return
+        if self._queue_depth_task is None or self._queue_depth_task.done():
+            self._queue_depth_task = asyncio.create_task(self._poll_queue_depth())
+
+    def _increase(self):
+        # Only grow when the current limit is actually in use
+        if self._in_flight + 1 < self.limit:
+            return
+        step = 1 if self._slow_start else 1 / self._limit
+        self._limit = min(self.ceiling, self._limit + step)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self._slow_start = False
+        self._limit = max(self.floor, self._limit * self.backoff)
+        logger.info(f"Concurrency limit decreased to {self.limit}")
+
+    def observe_queue_depth(self, depth: float):
+        self._queue_depth = depth
+        if self.adaptive and self.queue_depth_threshold > 0 and depth > self.queue_depth_threshold:
+            self._decrease()
+
+    def observe(self, latency: float, error: BaseException | None = None):
+        """Adjust the limit to one request outcome. Called on release, and directly for attempts retried within a slot."""
+        if not self.adaptive:
+            return
+        if error is not None:
+            if _is_overload_error(error):
+                self._decrease()
+            return
+        if self.latency_threshold > 0 and latency > self.latency_threshold:
+            self._decrease()
+            return
+        if self._queue_depth is not None and self.queue_depth_threshold > 0 \
+                and self._queue_depth > self.queue_depth_threshold:
+            return
+        self._increase()
+
+    def _wake_waiters(self):
+        # Free slots are handed to waiters in arrival order, so a newcomer cannot take one first
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self):
+        self._ensure_polling()
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                if waiter in self._waiters:  # Not yet skipped by _wake_waiters
+                    self._waiters.remove(waiter)
+            else:
+                # Cancelled after a slot was handed over, pass it on to the next waiter
+                self._in_flight -= 1
+                self._wake_waiters()
+            raise
+
+    def release(
+        self,
+        latency: float,
+        error: BaseException | None = None,
+    ):
+        self._in_flight -= 1
+        self.observe(latency, error)
+        self._wake_waiters()
+
+    def discard(self):
+        '''Give a slot back without observing it, for cancelled work that says nothing about the backend.'''
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        with span("semaphore_wait", limit=self.limit, in_flight=self._in_flight):
+            await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.discard()
+            raise
+        except BaseException as e:
+            self.release(time.monotonic() - started, e)
+            raise
+        else:
+            self.release(time.monotonic() - started)
+
+
+limiter = AdaptiveLimiter(
+    initial=MAX_CONCURRENT_TASKS,
+    floor=CONCURRENCY_FLOOR,
+    ceiling=CONCURRENCY_CEILING,
+    adaptive=CONCURRENCY_ADAPTIVE,
+    backoff=CONCURRENCY_BACKOFF,
+    latency_threshold=CONCURRENCY_LATENCY_THRESHOLD,
+    queue_depth_threshold=CONCURRENCY_QUEUE_DEPTH_THRESHOLD,
+    decrease_cooldown=CONCURRENCY_DECREASE_COOLDOWN,
+)
 
 async def run_in_async(func: Callable[..., T], *args, **kwargs) -> T:
     loop = asyncio.get_running_loop()
     # run_in_executor does NOT support kwargs → wrap with partial
     wrapped = partial(func, *args, **kwargs)
-    async with semaphore:
+    async with limiter.slot():
         return await loop.run_in_executor(None, wrapped)
 
 
+@asynccontextmanager
+async def spool_upload(upload: UploadFile, suffix: str = "") -> AsyncIterator[str]:
+    '''Copy an uploaded file to a named temp file chunk by chunk, yielding its path;
+    the file is removed on exit.'''
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(f.write, chunk)
+        yield path
+    finally:
+        os.remove(path)
+
+
+CONCURRENCY.set_function(lambda: {
+    ("limit",): limiter.limit,
+    ("in_flight",): limiter.stats()["in_flight"],
+    ("waiters",): limiter.stats()["waiters"],
+})
+
+
 class HealthCheckFunc(TypedDict):
     name: str
     func: Callable[..., bool]
@@ -1,18 +1,55 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from core.interfaces.api_interface import ApiResponse
 from core.services.minio import MinioService
 from core.services.ocr_llm import OCRLLMService
-from core.utils import health_checker
+from core.services.ocr_cache import OCRCacheService
+from core.services.redis import RedisService
+from core.services.ocr_tasks import ocr_dispatch_mode
+from core.services.cpu_executor import CPUExecutorService
+from core.metrics import REGISTRY, CONTENT_TYPE
+from core.utils import health_checker, HealthCheckFunc, limiter
 from services.ocr.router import router as ocr_router
 from services.pdf_extractor.router import router as pdf_extractor_router
+from services.pdf_jobs.router import router as pdf_jobs_router
+from services.pdf_jobs.service import PDFJobService
+from services.ocr_worker.service import OCRWorkerService
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Event loop lag is sampled for /stats
+    cpu_executor = CPUExecutorService.provider()
+    cpu_executor.start()
+
+    # Background workers for the PDF job queue, opted into per deployment
+    pdf_jobs = PDFJobService.provider()
+    if os.getenv("PDF_JOB_WORKER_EMBEDDED", "false").lower() in ("1", "true", "yes"):
+        pdf_jobs.start()
+
+    # OCR worker embedded in the API process, always needed for the local task queue
+    ocr_worker = None
+    embedded = os.getenv("OCR_WORKER_EMBEDDED", "false").lower() in ("1", "true", "yes")
+    if ocr_dispatch_mode() == "local" or (ocr_dispatch_mode() == "redis" and embedded):
+        ocr_worker = OCRWorkerService.provider()
+        ocr_worker.start()
+
+    yield
+    await pdf_jobs.stop()
+    if ocr_worker is not None:
+        await ocr_worker.stop()
+    await cpu_executor.stop()
 
 
 app = FastAPI(
     title="OCR Service",
     docs_url="/",
+    lifespan=lifespan,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +62,7 @@ app.mount("/static", StaticFiles(directory="tmp/ocr_service"), name="static")
 
 app.include_router(ocr_router, prefix="/api/ocr", tags=["OCR"])
 app.include_router(pdf_extractor_router, prefix="/api/pdf", tags=["PDF Extractor"])
+app.include_router(pdf_jobs_router, prefix="/api/pdf/jobs", tags=["PDF Jobs"])
 
 # Basic health check endpoint
 @app.get("/health", tags=["Utils"])
@@ -32,16 +70,28 @@ def health_check():
     minio = MinioService.provider()
     ocr_llm = OCRLLMService.provider()
 
-    health_status, is_service_ready = health_checker([
+    checks: list[HealthCheckFunc] = [
         {
             "name": f"MinIO Service - {minio.minio_endpoint}",
             "func": minio.health_check,
         },
         {
-            "name": f"OCR LLM Service - {ocr_llm.ocr_endpoint}",
+            "name": f"OCR LLM Service - {', '.join(ocr_llm.ocr_endpoints)}",
             "func": ocr_llm.health_check,
         },
-    ])
+    ]
+    # Redis is only required by the cache, the redis task queue and the embedded PDF job workers
+    if (
+        OCRCacheService.provider().enabled
+        or ocr_dispatch_mode() == "redis"
+        or os.getenv("PDF_JOB_WORKER_EMBEDDED", "false").lower() in ("1", "true", "yes")
+    ):
+        checks.append({
+            "name": "Redis Service",
+            "func": RedisService.provider().health_check,
+        })
+
+    health_status, is_service_ready = health_checker(checks)
 
     return ApiResponse(
         message="Health check completed",
@@ -49,6 +99,32 @@ def health_check():
     ).as_json_response(200 if is_service_ready else 503)
 
 
+# Runtime statistics endpoint
+@app.get("/stats", tags=["Utils"])
+def stats():
+    return ApiResponse(
+        message="Stats collected",
+        data={
+            "ocr_cache": OCRCacheService.provider().stats().model_dump(),
+            "concurrency": limiter.stats(),
+            "ocr_llm_replicas": OCRLLMService.provider().replica_pool.stats(),
+            "ocr_llm_requests": OCRLLMService.provider().request_stats(),
+            "pdf_jobs": PDFJobService.provider().stats().model_dump(),
+            "cpu_executor": CPUExecutorService.provider().stats(),
+            "event_loop_lag": CPUExecutorService.provider().lag_stats(),
+        },
+    ).as_json_response()
+
+
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["Utils"])
+def metrics():
+    # Instantiate the instrumented services so their gauges are registered
+    OCRLLMService.provider()
+    CPUExecutorService.provider()
+    return Response(REGISTRY.expose(), media_type=CONTENT_TYPE)
+
+
 # Exception handlers, routers, and other endpoints would be added here
 @app.exception_handler(Exception)
 async def global_exception_handler(_, exc):
@@ -1,6 +1,7 @@
 import os
 import re
 import json
+import time
 import requests
 from pathlib import Path
 from urllib.parse import urlparse
@@ -11,7 +12,8 @@ import argparse
 PDF_FOLDER = "pdfs/input"          # Folder that contains PDFs
 OUTPUT_FOLDER = "output"     # Where result folders + zip files go
 LOG_FILE = "logs.json"
-API_URL = "http://localhost:8005/api/pdf/extract"
+API_URL = "http://localhost:8005/api/pdf/jobs"
+POLL_INTERVAL = 5  # Seconds between job status checks
 
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
@@ -41,9 +43,25 @@ def send_api_request(pdf_path):
             "merge_algorithm": "simple",
             "max_pages": 0
         }
-        response = requests.post(API_URL, files=files, data=data, timeout=None)
+        response = requests.post(API_URL, files=files, data=data, timeout=300)
         response.raise_for_status()
-        return response.json()
+        job_id = response.json()["data"]["job_id"]
+
+    # Poll the job instead of holding a connection open for the whole document
+    while True:
+        response = requests.get(f"{API_URL}/{job_id}", timeout=30)
+        response.raise_for_status()
+        job = response.json()["data"]
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+        if job["status"] == "completed":
+            break
+        print(f"  - {job['status']}: {job['completed_pages']}/{job['total_pages']} pages")
+        time.sleep(POLL_INTERVAL)
+
+    response = requests.get(f"{API_URL}/{job_id}/result", timeout=300)
+    response.raise_for_status()
+    return response.json()
 
 def save_markdown(pdf_folder, pdf_name, text):
     md_path = pdf_folder / (pdf_name.stem + ".md")
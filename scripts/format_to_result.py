@@ -3,11 +3,12 @@ import re
 import zipfile
 import shutil
 from pathlib import Path
-from bs4 import BeautifulSoup
 from minio import Minio
 from minio.error import S3Error
 import argparse
 
+from core.html_table import HTMLTable, find_tables, merge_tables
+
 RESULT_DIR = "tmp"
 OUTPUT_ZIP = "OCR.zip"
 
@@ -46,6 +47,7 @@ RE_MARKDOWN_IMAGE = re.compile(r"!\[.*?\]\((.*?)\)", flags=re.IGNORECASE)
 RE_NORMALIZE_IMAGE_PLACEHOLDER = re.compile(
     r"\|\s*<?\s*image[_\s-]?(\d+)\s*>?\s*\|", flags=re.IGNORECASE
 )
+RE_IMAGE_PLACEHOLDER = re.compile(r"\|<image_\d+>\|")
 
 ############################################################
 # HELPERS
@@ -134,72 +136,38 @@ def replace_and_fetch_images(md_text: str, img_folder: Path) -> str:
 
 
 def merge_adjacent_tables(md_text: str) -> str:
-    soup = BeautifulSoup(md_text, "html.parser")
-    tables = soup.find_all("table")
-    i = 0
-
-    while i < len(tables) - 1:
-        t1 = tables[i]
-        t2 = tables[i + 1]
-
-        between = []
-        node = t1.next_sibling
-        while node and node != t2:
-            between.append(node)
-            node = node.next_sibling
-
-        is_ok = True
-        image_placeholders = []
-        for b in between:
-            text = str(b).strip()
-            if not text:
-                continue
-            if re.fullmatch(r"\|\<image_\d+\>\|", text):
-                image_placeholders.append(text)
-                continue
-            is_ok = False
-            break
-
-        if not is_ok:
-            i += 1
-            continue
-
-        for tbl in (t1, t2):
-            if not tbl.find("tbody"):
-                tb = soup.new_tag("tbody")
-                for row in tbl.find_all("tr"):
-                    tb.append(row)
-                tbl.append(tb)
-
-        t1_body = t1.find("tbody")
-        t2_body = t2.find("tbody")
-
-        r1 = t1.find("tr")
-        r2 = t2.find("tr")
-        if not r1 or not r2:
-            i += 1
-            continue
+    """Merge tables separated only by whitespace or image placeholders, when their column counts match.
 
-        cols1 = len(r1.find_all(["td", "th"]))
-        cols2 = len(r2.find_all(["td", "th"]))
-
-        if cols1 == cols2:
-            for row in t2_body.find_all("tr"):
-                t1_body.append(row)
-
-            t2.decompose()
-            tables.pop(i + 1)
-
-            after = t1
-            for ph in image_placeholders:
-                p = soup.new_tag("p")
-                p.string = ph
-                after.insert_after(p)
-                after = p
+    Only the tables are rewritten; the placeholders move after the merged table.
+    """
+    parts: list[str] = []
+    group: list[HTMLTable] = []
+    placeholders: list[str] = []
+    last_end = 0
+
+    def flush():
+        if group:
+            parts.append(merge_tables(group))
+            parts.extend(f"\n{ph}" for ph in placeholders)
+        group.clear()
+        placeholders.clear()
+
+    for start, end, table in find_tables(md_text):
+        between = md_text[last_end:start].split()
+        if group and \
+            all(RE_IMAGE_PLACEHOLDER.fullmatch(b) for b in between) and \
+            group[0].rows and table.rows and \
+            group[0].first_row_cell_count == table.first_row_cell_count:
+            placeholders.extend(between)
         else:
-            i += 1
-
-    return str(soup)
+            flush()
+            parts.append(md_text[last_end:start])
+        group.append(table)
+        last_end = end
+
+    flush()
+    parts.append(md_text[last_end:])
+    return "".join(parts)
 
 
 ############################################################
@@ -2,7 +2,7 @@ from typing import Annotated
 from fastapi import APIRouter, UploadFile, File, Form
 
 from core.interfaces.api_interface import ApiResponse
-from core.interfaces.api_interface import OCRResponseFormat, DefaultOCRResponseFormat
+from core.interfaces.api_interface import OCRResponseFormat, DefaultOCRResponseFormat, ImageWireFormat
 from services.ocr.service import OCRService, ExtractionResult
 
 
@@ -13,14 +13,25 @@ router = APIRouter()
 async def extract_from_image(
     image: Annotated[UploadFile, File(...)],
     response_format: Annotated[OCRResponseFormat, Form(...)] = DefaultOCRResponseFormat,
+    image_format: Annotated[ImageWireFormat | None, Form()] = None,
+    image_quality: Annotated[int | None, Form(ge=1, le=100)] = None,
+    max_pixels: Annotated[int | None, Form(ge=0)] = None,
+    png_compress_level: Annotated[int | None, Form(ge=0, le=9)] = None,
 ):
     service = OCRService.provider()
+    encoding = service.ocr_llm_service.encoding_options(
+        format=image_format,
+        quality=image_quality,
+        max_pixels=max_pixels,
+        png_compress_level=png_compress_level,
+    )
 
-    image_data = await image.read()
+    # Decode straight from the spooled upload, without another in-memory copy
     result = await service.extract(
-        data=image_data,
+        data=image.file,
         filename=image.filename,
         mode=response_format,
+        encoding=encoding,
     )
 
     return ApiResponse(
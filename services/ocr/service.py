@@ -2,18 +2,55 @@ from PIL import Image
 from io import BytesIO
 import re
 import uuid
+from typing import BinaryIO
 
 from core.base import BaseService
-from core.utils import run_in_async
+from core.utils import limiter
 from core.interfaces.api_interface import OCRResponseFormat, DefaultOCRResponseFormat
-from core.services.ocr_llm import OCRLLMService, ExtractionResult
+from core.services.ocr_llm import OCRLLMService, ExtractionResult, ImageEncodingOptions, EncodedImage, OCRCompletion
+from core.services.ocr_tasks import get_task_queue
 from core.services.minio import MinioService
+from core.services.cpu_executor import CPUExecutorService
+from core.tracing import span
+
+
+def _decode_image(data: bytes | BinaryIO) -> Image.Image:
+    image = Image.open(BytesIO(data) if isinstance(data, bytes) else data)
+    image.load()
+    return image
+
+
+class PictureCrops:
+    '''Cropped 'Picture' regions of a page, standing in for the full page image
+    in `OCRService.convert_to_markdown` once the page raster has been released.'''
+    def __init__(
+        self,
+        image: Image.Image,
+        results: list[ExtractionResult],
+        image_bbox_scale_factor: tuple[float, float] = (1.0, 1.0),
+    ):
+        self.crops: dict[tuple[float, float, float, float], Image.Image] = {}
+        for result in results:
+            if result.category != 'Picture':
+                continue
+            bbox = (
+                result.bbox[0] * image_bbox_scale_factor[0],
+                result.bbox[1] * image_bbox_scale_factor[1],
+                result.bbox[2] * image_bbox_scale_factor[0],
+                result.bbox[3] * image_bbox_scale_factor[1],
+            )
+            self.crops[bbox] = image.crop(bbox)
+
+    def crop(self, box: tuple[float, float, float, float]) -> Image.Image:
+        return self.crops[box]
 
 
 class OCRService(BaseService):
     def __init__(self):
         self.ocr_llm_service = OCRLLMService.provider()
         self.minio_service = MinioService.provider()
+        self.task_queue = get_task_queue()  # None: call the OCR LLM from this process
+        self.cpu_executor = CPUExecutorService.provider()
 
         self.image_bucket = "ocr-images"
         self.minio_service.create_bucket(self.image_bucket)
@@ -29,12 +66,13 @@ class OCRService(BaseService):
     
     def convert_to_markdown(
         self,
-        image: Image.Image,
+        image: Image.Image | PictureCrops | None,  # Only read for 'Picture' results
         results: list[ExtractionResult],
         filename: str | None = None,
         image_bbox_scale_factor: tuple[float, float] = (1.0, 1.0)
     ) -> str:
         markdown_parts = []
+        pictures: list[tuple[int, str, bytes]] = []  # Markdown part index, object name, PNG data
         filename = filename or str(uuid.uuid4())
         img_idx = 0
 
@@ -73,25 +111,11 @@ class OCRService(BaseService):
                 )
                 cropped_image = image.crop((bbox[0], bbox[1], bbox[2], bbox[3]))
 
-                # Upload to Minio
+                # Encode now, upload together with the page's other pictures
                 img_buffer = BytesIO()
                 cropped_image.save(img_buffer, format="PNG")
-                object_name = f"{filename}_{page_idx}_{img_idx}.png"
-                self.minio_service.upload(
-                    bucket_name=self.image_bucket,
-                    object_name=object_name,
-                    data=img_buffer.getvalue(),
-                )
-
-                # Get access URL
-                access_url = self.minio_service.get_access_url(
-                    bucket_name=self.image_bucket,
-                    object_name=object_name,
-                    expires=self.image_expire_seconds,
-                )
-
-                # Add to markdown
-                markdown_parts.append(f"![{filename}]({access_url})\n\n")
+                pictures.append((len(markdown_parts), f"{filename}_{page_idx}_{img_idx}.png", img_buffer.getvalue()))
+                markdown_parts.append("")
                 img_idx += 1
 
             else:
@@ -101,19 +125,61 @@ class OCRService(BaseService):
                     _t = self._normalize_header(page_result.text)
                     markdown_parts.append(f"{'#' * level} {_t}\n\n")
 
+        # Upload to Minio concurrently, URLs are derived from the bytes in memory
+        if pictures:
+            access_urls = self.minio_service.publish_many(
+                bucket_name=self.image_bucket,
+                objects=[(object_name, data) for _, object_name, data in pictures],
+                expires=self.image_expire_seconds,
+            )
+            for (part_idx, _, _), access_url in zip(pictures, access_urls):
+                markdown_parts[part_idx] = f"![{filename}]({access_url})\n\n"
+
         return "".join(markdown_parts)
     
+    async def _complete(self, encoded: EncodedImage) -> OCRCompletion:
+        # Only the LLM call holds a slot, cache hits and encoding would tell the limiter nothing
+        async with limiter.slot():
+            return await self.ocr_llm_service.complete_async(encoded)
+
     async def extract(
         self,
-        data: bytes,
+        data: bytes | BinaryIO,  # Encoded image, or a file object it is read from
+        filename: str | None = None,
+        mode: OCRResponseFormat = DefaultOCRResponseFormat,
+        encoding: ImageEncodingOptions | None = None,
+    ):
+        with span(
+            "ocr.extract",
+            filename=filename or "",
+            mode=mode,
+            bytes=len(data) if isinstance(data, bytes) else -1,
+        ) as root:
+            image = await self.cpu_executor.run("decode", _decode_image, data)
+            root.set_attributes(width=image.width, height=image.height)
+            return await self.extract_image(image, filename, mode, encoding)
+
+    async def extract_image(
+        self,
+        image: Image.Image,
         filename: str | None = None,
         mode: OCRResponseFormat = DefaultOCRResponseFormat,
+        encoding: ImageEncodingOptions | None = None,
     ):
-        image = Image.open(BytesIO(data))
-        results = await run_in_async(self.ocr_llm_service.extract_text, image)
+        """OCR an already decoded image; it is encoded once, right before the LLM call."""
+        if self.task_queue is None:
+            results = await self.ocr_llm_service.extract_text_async(image, encoding, complete=self._complete)
+        else:
+            # Workers bound their own concurrency
+            results = await self.ocr_llm_service.extract_text_async(
+                image,
+                encoding,
+                complete=self.task_queue.submit,
+            )
 
         if mode == "json":
             return results
         
         elif mode == "markdown":
-            return self.convert_to_markdown(image, results, filename)
\ No newline at end of file
+            # Picture crops are encoded and uploaded off the event loop
+            return await self.cpu_executor.run("markdown", self.convert_to_markdown, image, results, filename)
\ No newline at end of file
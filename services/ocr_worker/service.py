@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+import logging
+
+from core.base import BaseService
+from core.utils import limiter
+from core.services.ocr_llm import OCRLLMService
+from core.services.ocr_tasks import OCRTask, OCRTaskResult, get_task_queue
+from core.tracing import span, continue_trace
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class OCRWorkerService(BaseService):
+    '''Pulls page OCR tasks from the task queue selected by `OCR_DISPATCH` and
+    runs them against the OCR LLM, as many at once as the adaptive limiter allows.
+
+    Runs standalone via `worker.py`, or embedded in the API process.
+    '''
+    def __init__(self):
+        task_queue = get_task_queue()
+        if task_queue is None:
+            raise ValueError("OCR workers need OCR_DISPATCH set to 'local' or 'redis'")
+
+        self.task_queue = task_queue
+        self.ocr_llm_service = OCRLLMService.provider()
+        self.poll_timeout = float(os.getenv("OCR_WORKER_POLL_TIMEOUT", 5))
+
+        self._consumer: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def _handle(self, task: OCRTask):
+        started = time.monotonic()
+        error: BaseException | None = None
+        try:
+            with continue_trace(task.traceparent), span(
+                "ocr_task.run",
+                task_id=task.task_id,
+                queue_wait_ms=round((time.time() - task.deadline + self.task_queue.task_timeout) * 1000, 3),
+            ):
+                completion = await self.ocr_llm_service.complete_async(task.image)
+            result = OCRTaskResult(
+                task_id=task.task_id,
+                results=completion.results,
+                truncated=completion.truncated,
+            )
+        except asyncio.CancelledError as e:
+            error = e
+            raise
+        except Exception as e:
+            logger.exception(f"OCR task {task.task_id} failed")
+            error = e
+            result = OCRTaskResult(task_id=task.task_id, error=str(e) or type(e).__name__)
+        finally:
+            if isinstance(error, asyncio.CancelledError):
+                limiter.discard()
+            else:
+                limiter.release(time.monotonic() - started, error)
+
+        try:
+            await self.task_queue.complete(task, result)
+        except Exception as e:
+            logger.warning(f"Failed to return result of OCR task {task.task_id}: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                task = await self.task_queue.get(self.poll_timeout)
+            except Exception as e:
+                logger.warning(f"OCR task queue unavailable: {e}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            if task is None:
+                continue
+            if task.deadline < time.time():
+                logger.warning(f"Skipped OCR task {task.task_id}, its submitter stopped waiting")
+                try:
+                    await self.task_queue.discard(task)
+                except Exception as e:
+                    logger.warning(f"Failed to drop OCR task {task.task_id}: {e}")
+                continue
+
+            # Hold at most one task while waiting for capacity, leaving the rest to other workers
+            await limiter.acquire()
+            handler = asyncio.create_task(self._handle(task))
+            self._in_flight.add(handler)
+            handler.add_done_callback(self._in_flight.discard)
+
+    def start(self):
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = [t for t in (self._consumer, *self._in_flight) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._consumer = None
@@ -0,0 +1,70 @@
+from typing import Sequence
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def sample_page_indices(page_count: int, sample_pages: int) -> np.ndarray:
+    """Evenly spaced page indices, first and last included; all pages when `sample_pages` is 0."""
+    if sample_pages <= 0 or page_count <= sample_pages:
+        return np.arange(page_count)
+    return np.unique(np.linspace(0, page_count - 1, sample_pages).round().astype(int))
+
+
+def detect_general_positions(
+    pages: Sequence[Sequence[str]],
+    positions: Sequence[int],
+    diff_threshold: float,
+    similar_ratio_threshold: float,
+    sample_pages: int = 0,
+) -> set[int]:
+    """Component positions that hold the same text across pages, i.e. headers and footers.
+
+    `pages` holds the component texts of each page, and a position indexes them
+    (negative from the end). A page is similar at a position when the TF-IDF
+    cosine difference of its component to the mean over pages is at most
+    `diff_threshold`; the position is general when at least
+    `similar_ratio_threshold` of the pages that have it are similar.
+
+    The vocabulary is fitted once over the candidates of every position, and
+    all pages are scored in one pass over a single sparse matrix.
+    """
+    texts: list[str] = []
+    groups: list[int] = []
+    for g, position in enumerate(positions):
+        for i in sample_page_indices(len(pages), sample_pages):
+            page = pages[i]
+            if -len(page) <= position < len(page):
+                texts.append(page[position].strip())
+                groups.append(g)
+    if not texts:
+        return set()
+
+    try:
+        X = TfidfVectorizer(lowercase=True).fit_transform(texts)  # (rows, vocabulary), L2-normalized rows
+    except ValueError:
+        # Empty vocabulary, e.g. only pictures at every position
+        return set()
+
+    group_ids = np.asarray(groups)
+    counts = np.bincount(group_ids, minlength=len(positions))
+
+    # Dense centroid of each position's rows, there are only a few positions
+    centroids = np.zeros((len(positions), X.shape[1]))
+    for g in np.flatnonzero(counts):
+        centroids[g] = np.asarray(X[group_ids == g].mean(axis=0)).ravel()
+
+    # Cosine similarity of every row to its own position's centroid
+    dots = np.asarray(X @ centroids.T)[np.arange(len(texts)), group_ids]
+    row_norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    centroid_norms = np.linalg.norm(centroids, axis=1)
+    norms = row_norms * centroid_norms[group_ids]
+    sims = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+    similar = (1 - sims) <= diff_threshold
+    ratios = np.bincount(group_ids, weights=similar, minlength=len(positions)) / np.maximum(counts, 1)
+    return {
+        position
+        for g, position in enumerate(positions)
+        if counts[g] >= 2 and ratios[g] >= similar_ratio_threshold
+    }
@@ -1,4 +1,4 @@
-from typing import cast
+from typing import Sequence, cast
 from PIL import Image
 import re
 from pydantic import BaseModel
@@ -7,13 +7,10 @@ import json
 
 from shapely.geometry import Polygon
 from shapely.strtree import STRtree
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-from bs4 import BeautifulSoup
-
 from core.base import BaseService
-from services.ocr.service import OCRService, ExtractionResult
+from core.html_table import parse_table, merge_tables
+from services.ocr.service import OCRService, ExtractionResult, PictureCrops
+from services.pdf_extractor.merge_services.header_footer import detect_general_positions
 
 
 
@@ -36,6 +33,7 @@ class TableAwareMergeConfig(BaseModel):
     end_page_offset: int = 0  # Skip last N pages for footer analysis
     begin_num_result_content: int = 2  # Compare first N results to determine general header layout
     end_num_result_content: int = 0  # Compare last N results to determine general footer layout
+    header_footer_sample_pages: int = 0  # Compare at most N evenly spaced pages, 0 for all
 
 
 class TableAwareResultInput(BaseModel):
@@ -126,9 +124,6 @@ class TableAwareMergeService(BaseService):
 
         index = STRtree(polys)
 
-        # Map geometry object → index via STRtree.geometries
-        geom_to_idx = {geom: i for i, geom in enumerate(index.geometries)}
-
         visited = set()
         groups = []
 
@@ -147,12 +142,12 @@ class TableAwareMergeService(BaseService):
                 visited.add(idx)
                 cluster.append(idx)
 
-                # query neighbors
+                # query neighbors, as indices into polys
                 candidates = index.query(polys[idx])
 
                 for cand in candidates:
-                    j = geom_to_idx.get(cand)
-                    if j is None or j in visited:
+                    j = int(cand)
+                    if j in visited:
                         continue
 
                     if self._iou(polys[idx], polys[j]) >= threshold:
@@ -163,88 +158,12 @@ class TableAwareMergeService(BaseService):
             groups.append(
                 _CombinedResults(
                     results=cluster_items,
-                    text="\n".join(t.text for r in cluster_items for t in r).strip()
+                    text="\n".join(r.text for r in cluster_items).strip()
                 )
             )
 
         return groups
 
-    def _flat_combined_results(
-        self,
-        results: list[_CombinedResults]
-    ) -> list[ExtractionResult]:
-        flat: list[ExtractionResult] = []
-        for cr in results:
-            # Dummy extraction result for compare text
-            flat.append(ExtractionResult(
-                bbox=[0, 0, 0, 0],
-                category="Text",
-                text="\n".join(r.text for r in cr.results).strip(),
-            ))
-        return flat
-
-    def _get_result_diff_by_word_feq(
-        self,
-        results: list[ExtractionResult]
-    ) -> float:
-        texts = []
-        for r in results:
-            if r.category == "Picture":
-                texts.append(" ")
-            else:
-                texts.append(r.text.strip())
-        if len(texts) <= 1:
-            return 0.0
-
-        # TF-IDF vectorization
-        vectorizer = TfidfVectorizer(lowercase=True)
-        X = vectorizer.fit_transform(texts)  # shape: (N, V) → sparse matrix
-
-        # centroid of all vectors, still sparse, shape (1, V)
-        centroid = X.mean(axis=0)  # type: ignore
-
-        # convert to regular array (dense)
-        centroid = np.asarray(centroid)
-
-        # cosine similarity for each page vs centroid
-        sims = cosine_similarity(X, centroid)
-
-        # convert similarity → difference (0–1)
-        diffs = 1 - sims
-
-        # return average difference
-        return float(np.mean(diffs))
-
-    def _is_component_index_general(
-        self,
-        group: list[_CombinedResults],
-        config: TableAwareMergeConfig,
-    ) -> bool:
-        if len(group) <= 1:
-            return False
-
-        flat = self._flat_combined_results(group)
-        if not flat:
-            return False
-
-        # Compute per-page diff
-        diffs = []
-        for r in group:
-            r_flat = self._flat_combined_results([r])
-            if not r_flat:
-                continue
-            diff = self._get_result_diff_by_word_feq(r_flat)
-            diffs.append(diff)
-
-        if not diffs:
-            return False
-
-        # Count how many pages have "similar" component
-        similar_count = sum(d <= config.diff_word_freq_threshold for d in diffs)
-        ratio = similar_count / len(diffs)
-
-        return ratio >= config.diff_word_num_component_threshold
-
     def _get_general_layout_from_pages_results(
         self,
         results: list[_PageCombinedResults],
@@ -283,42 +202,38 @@ class TableAwareMergeService(BaseService):
         # Define page layout containers
         first_page = pages[0]
         last_page = pages[-1]
-        used_header_indices = set()
-        used_footer_indices = set()
-
-        # 2. HEADER DETECTION
-        max_header_idx = config.begin_num_result_content
-
-        for idx in range(max_header_idx):
-            group = [p.results[idx] for p in pages if idx < len(p.results)]
-            if len(group) < 2:
-                continue
+        header_indices = list(range(config.begin_num_result_content))
+        footer_indices = [-rev_idx for rev_idx in range(1, config.end_num_result_content + 1)]
+
+        # 2. HEADER / FOOTER DETECTION, all candidate indices at once
+        general_indices = detect_general_positions(
+            [[c.text for c in p.results] for p in pages],
+            header_indices + footer_indices,
+            config.diff_word_freq_threshold,
+            config.diff_word_num_component_threshold,
+            config.header_footer_sample_pages,
+        )
+        used_header_indices = {idx for idx in header_indices if idx in general_indices}
+        used_footer_indices = {idx for idx in footer_indices if idx in general_indices}
 
-            if self._is_component_index_general(group, config):
+        for idx in sorted(used_header_indices):
+            if idx < len(first_page.results):
                 header.append(
                     _PageCombinedResults(
                         page_number=first_page.page_number,
                         results=[first_page.results[idx]],
                     )
                 )
-                used_header_indices.add(idx)
-
-        # 3. FOOTER DETECTION
-        max_footer_idx = config.end_num_result_content
 
-        for rev_idx in range(1, max_footer_idx + 1):
-            group = [p.results[-rev_idx] for p in pages if rev_idx <= len(p.results)]
-            if len(group) < 2:
-                continue
-
-            if self._is_component_index_general(group, config):
+        # 3. FOOTER, from the last page
+        for idx in sorted(used_footer_indices, reverse=True):
+            if -idx <= len(last_page.results):
                 footer.append(
                     _PageCombinedResults(
                         page_number=last_page.page_number,
-                        results=[last_page.results[-rev_idx]],
+                        results=[last_page.results[idx]],
                     )
                 )
-                used_footer_indices.add(len(last_page.results) - rev_idx)
 
         # 4. CONTENT REMAINDER
         for p in pages:
@@ -326,7 +241,7 @@ class TableAwareMergeService(BaseService):
             for i, comp in enumerate(p.results):
                 if i in used_header_indices:
                     continue
-                if i in used_footer_indices:
+                if i - len(p.results) in used_footer_indices:
                     continue
                 new_results.append(comp)
 
@@ -346,31 +261,19 @@ class TableAwareMergeService(BaseService):
         )
     
     def _has_header(self, html: str) -> bool:
-        soup = BeautifulSoup(html, "html.parser")
-        return soup.find("th") is not None
+        table = parse_table(html)
+        return table is not None and table.has_header
 
     def _get_column_count(self, html: str) -> int:
-        soup = BeautifulSoup(html, "html.parser")
-        tr = soup.find("tr")
-        if not tr:
-            return 0
-        return len(tr.find_all(["td", "th"]))
+        table = parse_table(html)
+        return table.first_row_cell_count if table is not None else 0
 
     def _merge_table_html(self, html_list: list[str]) -> str:
         """Merge multiple table HTMLs by concatenating rows."""
-        soups = [BeautifulSoup(h, "html.parser") for h in html_list]
-        base = soups[0]
-        base_tbody = base.find("tbody") or base.find("table")
-        if not base_tbody:
+        tables = [parse_table(h) for h in html_list]
+        if tables[0] is None:
             return html_list[0]
-
-        for s in soups[1:]:
-            tb = s.find("tbody") or s.find("table")
-            if tb:
-                for tr in tb.find_all("tr"):
-                    base_tbody.append(tr)
-
-        return str(base)
+        return merge_tables([t for t in tables if t is not None])
 
     def _get_last_table_component_from_combined(
         self,
@@ -472,7 +375,7 @@ class TableAwareMergeService(BaseService):
 
     def _render_page_to_markdown(
         self,
-        image: Image.Image,
+        image: Image.Image | PictureCrops | None,
         filename: str,
         page: _PageCombinedResults
     ) -> str:
@@ -489,7 +392,7 @@ class TableAwareMergeService(BaseService):
 
     def _combined_results_to_text(
         self,
-        images: list[Image.Image],
+        images: Sequence[Image.Image | PictureCrops | None],
         filename: str,
         results: _ListOfPageCombinedResults
     ) -> str:
@@ -545,7 +448,7 @@ class TableAwareMergeService(BaseService):
 
     def merge(
         self,
-        images: list[Image.Image],
+        images: Sequence[Image.Image | PictureCrops | None],
         filename: str,
         results: list[TableAwareResultInput],
         config: TableAwareMergeConfig,
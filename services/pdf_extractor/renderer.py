@@ -0,0 +1,329 @@
+from typing import AsyncIterator, TypedDict
+import os
+import math
+import time
+import asyncio
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from core.base import BaseService
+from core.metrics import PIPELINE_STAGE_SECONDS
+from core.services.cpu_executor import CPUExecutorService
+from services.pdf_extractor.text_layer import TextLayerOptions, extract_text_layer
+
+
+# PDF content, or the path of a PDF file
+PDFSource = bytes | str
+
+
+def open_pdf(source: PDFSource) -> fitz.Document:
+    if isinstance(source, str):
+        # Pages are read from the file on demand, the document is never held in memory whole
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+class RenderOptions(TypedDict):
+    max_dpi: float
+    min_pixels: int
+    max_pixels: int
+    max_side: int
+
+
+class RenderedPixmap(TypedDict):
+    page_index: int
+    width: int
+    height: int
+    dpi: float
+    samples: bytes  # Empty when the page was taken from its text layer, or handed over in shared memory
+    shared_memory: str | None  # Segment holding the samples instead, unlinked once they are read
+    text_layer: list[dict] | None
+    render_seconds: float
+
+
+class RenderedPage(TypedDict):
+    page_index: int
+    image: Image.Image | None  # None when the page was taken from its text layer
+    width: int
+    height: int
+    dpi: float
+    scale: float  # Rendered pixels per PDF point
+    text_layer: list[dict] | None
+    render_seconds: float
+
+
+# Document opened by this worker, reused across the page ranges it is assigned
+_worker_pdf: tuple[str, fitz.Document] | None = None
+
+
+def _open_worker_pdf(path: str) -> fitz.Document:
+    global _worker_pdf
+    if _worker_pdf is not None and _worker_pdf[0] == path:
+        return _worker_pdf[1]
+    if _worker_pdf is not None:
+        _worker_pdf[1].close()
+    pdf = fitz.open(path, filetype="pdf")
+    _worker_pdf = (path, pdf)
+    return pdf
+
+
+def count_pages(source: PDFSource, max_pages: int | None = None) -> int:
+    '''Number of pages that will be extracted; raises ValueError for invalid documents.'''
+    try:
+        pdf = open_pdf(source)
+    except Exception as e:
+        raise ValueError("Failed to open PDF document") from e
+    page_count = pdf.page_count if not max_pages else min(pdf.page_count, max_pages)
+    pdf.close()
+    return page_count
+
+
+def choose_dpi(rect: fitz.Rect, options: RenderOptions) -> float:
+    '''Highest DPI up to `max_dpi` whose render fits the pixel budget and side limit;
+    pages too small for `min_pixels` at `max_dpi` are rendered at a higher DPI.'''
+    area_in = (rect.width / 72) * (rect.height / 72)
+    if area_in <= 0:
+        return options["max_dpi"]
+
+    dpi = options["max_dpi"]
+    if options["max_pixels"] > 0 and area_in * dpi ** 2 > options["max_pixels"]:
+        dpi = math.sqrt(options["max_pixels"] / area_in)
+        # Leave room for MuPDF rounding each side up by a pixel
+        margin = (rect.width + rect.height) / 72 * dpi + 1
+        dpi = math.sqrt(max(1.0, options["max_pixels"] - margin) / area_in)
+    elif options["min_pixels"] > 0 and area_in * dpi ** 2 < options["min_pixels"]:
+        dpi = math.sqrt(options["min_pixels"] / area_in)
+
+    longest_side_in = max(rect.width, rect.height) / 72
+    if options["max_side"] > 0 and longest_side_in * dpi > options["max_side"]:
+        dpi = options["max_side"] / longest_side_in
+    return dpi
+
+
+def _render_page(page: fitz.Page, dpi: float) -> fitz.Pixmap:
+    # Single render at the DPI chosen from the page size, without alpha so samples are clean RGB
+    zoom = dpi / 72
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+
+
+def render_page_range(
+    source: str | fitz.Document,
+    start: int,
+    stop: int,
+    options: RenderOptions,
+    text_layer_options: TextLayerOptions | None = None,
+    shared: bool = False,
+) -> list[RenderedPixmap]:
+    '''Render pages [start, stop) of a PDF file path or an open document.
+
+    With `text_layer_options`, pages with a reliable native text layer are
+    not rendered; their layout elements are returned instead. With `shared`,
+    samples are written to shared memory rather than returned, so a process
+    pool does not pickle them back through its pipe under the parent's GIL.
+    '''
+    pdf = _open_worker_pdf(source) if isinstance(source, str) else source
+
+    pixmaps: list[RenderedPixmap] = []
+    for page_idx in range(start, stop):
+        started = time.perf_counter()
+        page = pdf.load_page(page_idx)
+        dpi = choose_dpi(page.rect, options)
+
+        if text_layer_options is not None:
+            text_layer = extract_text_layer(page, dpi / 72, text_layer_options)
+            if text_layer is not None:
+                pixmaps.append(RenderedPixmap(
+                    page_index=page_idx,
+                    width=round(page.rect.width * dpi / 72),
+                    height=round(page.rect.height * dpi / 72),
+                    dpi=dpi,
+                    samples=b"",
+                    shared_memory=None,
+                    text_layer=text_layer,
+                    render_seconds=time.perf_counter() - started,
+                ))
+                continue
+
+        pix = _render_page(page, dpi)
+        samples, segment = b"", None
+        if shared:
+            shm = shared_memory.SharedMemory(create=True, size=len(pix.samples_mv))
+            shm.buf[:len(pix.samples_mv)] = pix.samples_mv
+            segment = shm.name
+            shm.close()
+        else:
+            samples = pix.samples
+        pixmaps.append(RenderedPixmap(
+            page_index=page_idx,
+            width=pix.width,
+            height=pix.height,
+            dpi=dpi,
+            samples=samples,
+            shared_memory=segment,
+            text_layer=None,
+            render_seconds=time.perf_counter() - started,
+        ))
+    return pixmaps
+
+
+def pixmap_to_image(pixmap: RenderedPixmap) -> Image.Image:
+    size = (pixmap["width"], pixmap["height"])
+    if pixmap["shared_memory"] is None:
+        return Image.frombytes("RGB", size, pixmap["samples"])
+    shm = shared_memory.SharedMemory(name=pixmap["shared_memory"])
+    try:
+        with shm.buf[:size[0] * size[1] * 3] as samples:
+            return Image.frombytes("RGB", size, samples)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def discard_pixmaps(pixmaps: list[RenderedPixmap]):
+    '''Unlink the shared memory of pixmaps that will not be read.'''
+    for pixmap in pixmaps:
+        if pixmap["shared_memory"] is None:
+            continue
+        try:
+            shm = shared_memory.SharedMemory(name=pixmap["shared_memory"])
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
+
+
+def _discard_result(future: Future[list[RenderedPixmap]]):
+    if not future.cancelled() and future.exception() is None:
+        discard_pixmaps(future.result())
+
+
+class PDFRendererService(BaseService):
+    '''Renders PDF pages off the event loop, in page order.
+
+    Page ranges are rendered in a process pool with one worker per core by
+    default, since MuPDF holds the GIL while it renders; each worker opens the
+    document once from its file, or a temp file. With `PDF_RENDER_WORKERS=0`
+    pages are rendered on a single background thread.
+    '''
+    def __init__(self):
+        self.workers = int(os.getenv("PDF_RENDER_WORKERS", os.cpu_count() or 1))
+        self.pages_per_task = max(1, int(os.getenv("PDF_RENDER_PAGES_PER_TASK", 2)))
+        self.render_options = RenderOptions(
+            max_dpi=float(os.getenv("PDF_MAX_DPI", 400)),
+            min_pixels=int(os.getenv("PDF_TARGET_MIN_PIXELS", 1000000)),
+            max_pixels=int(os.getenv("PDF_TARGET_MAX_PIXELS", 11289600)),  # dots.ocr preprocessing limit
+            max_side=int(os.getenv("PDF_MAX_SIDE", 4500)),
+        )
+        self.text_layer_options = TextLayerOptions(
+            min_chars=int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", 200)),
+            max_image_coverage=float(os.getenv("PDF_TEXT_LAYER_MAX_IMAGE_COVERAGE", 0.05)),
+            max_invalid_char_ratio=float(os.getenv("PDF_TEXT_LAYER_MAX_INVALID_CHAR_RATIO", 0.01)),
+            max_drawings=int(os.getenv("PDF_TEXT_LAYER_MAX_DRAWINGS", 50)),
+            detect_tables=os.getenv("PDF_TEXT_LAYER_DETECT_TABLES", "true").lower() in ("1", "true", "yes"),
+        )
+        self._executor: Executor | None = None
+        self.cpu_executor = CPUExecutorService.provider()
+        self.render_seconds_metric = PIPELINE_STAGE_SECONDS.labels("render")
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                # MuPDF documents must not be shared across threads
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+        return self._executor
+
+    async def count_pages(self, data: PDFSource, max_pages: int | None = None) -> int:
+        '''Open the document in the render executor and count the pages to extract.'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, count_pages, data, max_pages)
+
+    async def iter_pages(
+        self,
+        data: PDFSource,
+        page_count: int,
+        prefetch: int,
+        text_layer: bool = False,
+    ) -> AsyncIterator[RenderedPage]:
+        '''Yield page images in order, rendering at most `prefetch` pages ahead.
+
+        With `text_layer`, born-digital pages are yielded with their native
+        text layer instead of an image.
+        '''
+        text_layer_options = self.text_layer_options if text_layer else None
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        max_pending = max(1, prefetch // self.pages_per_task)
+
+        source: str | fitz.Document
+        temp_path: str | None = None
+        if self.workers > 0 and isinstance(data, str):
+            source = data
+        elif self.workers > 0:
+            fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            source = temp_path
+        else:
+            source = open_pdf(data)
+
+        # Concurrent futures, so a render still running when the pages are abandoned reports its result
+        pending: deque[Future[list[RenderedPixmap]]] = deque()
+        pixmaps: list[RenderedPixmap] = []
+        next_range = 0
+        try:
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < max_pending:
+                    start, stop = ranges[next_range]
+                    pending.append(self.executor.submit(
+                        render_page_range,
+                        source, start, stop, self.render_options, text_layer_options, self.workers > 0,
+                    ))
+                    next_range += 1
+
+                pixmaps = await asyncio.wrap_future(pending[0])
+                pending.popleft()
+                while pixmaps:
+                    pixmap = pixmaps[0]
+                    # Measured in the worker, so it excludes time queued behind other pages
+                    self.render_seconds_metric.observe(pixmap["render_seconds"])
+                    image = None
+                    if pixmap["text_layer"] is None:
+                        image = await self.cpu_executor.run("decode", pixmap_to_image, pixmap)
+                    pixmaps.pop(0)
+                    yield RenderedPage(
+                        page_index=pixmap["page_index"],
+                        image=image,
+                        width=pixmap["width"],
+                        height=pixmap["height"],
+                        dpi=pixmap["dpi"],
+                        scale=pixmap["dpi"] / 72,
+                        text_layer=pixmap["text_layer"],
+                        render_seconds=pixmap["render_seconds"],
+                    )
+        finally:
+            if isinstance(source, str):
+                # Release the shared memory of pages that will not be read
+                discard_pixmaps(pixmaps)
+                for future in pending:
+                    if not future.cancel():
+                        future.add_done_callback(_discard_result)
+                if temp_path is not None:
+                    os.remove(temp_path)
+            else:
+                # Wait for in-flight renders before closing the document under them
+                await asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True)
+                source.close()
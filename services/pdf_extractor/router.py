@@ -1,14 +1,23 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator
+from contextlib import AsyncExitStack
 from fastapi import APIRouter, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from core.interfaces.api_interface import (
     ApiResponse,
+    OCRResponseFormat,
+    PDFStreamFormat,
+    DefaultPDFStreamFormat,
     PDFExtractionMode,
     DefaultPDFExtractionMode,
     PDFMergeAlgorithm,
     DefaultPDFMergeAlgorithm,
+    PDFOCRStrategy,
+    ImageWireFormat,
 )
-from services.pdf_extractor.service import PDFExtractorService, PDFExtractionResult
+from core.utils import spool_upload
+from services.pdf_extractor.service import PDFExtractorService, PDFExtractionResult, PDFStreamEvent
 
 
 router = APIRouter()
@@ -20,27 +29,101 @@ async def extract_from_pdf(
     response_format: Annotated[PDFExtractionMode, Form(...)] = DefaultPDFExtractionMode,
     merge_algorithm: Annotated[PDFMergeAlgorithm, Form(...)] = DefaultPDFMergeAlgorithm,
     max_pages: Annotated[int, Form(...)] = 0,
+    ocr_strategy: Annotated[PDFOCRStrategy | None, Form()] = None,
+    image_format: Annotated[ImageWireFormat | None, Form()] = None,
+    image_quality: Annotated[int | None, Form(ge=1, le=100)] = None,
+    max_pixels: Annotated[int | None, Form(ge=0)] = None,
+    png_compress_level: Annotated[int | None, Form(ge=0, le=9)] = None,
 ):
     # Initialize service
     service = PDFExtractorService.provider()
+    encoding = service.ocr_service.ocr_llm_service.encoding_options(
+        format=image_format,
+        quality=image_quality,
+        max_pixels=max_pixels,
+        png_compress_level=png_compress_level,
+    )
     if max_pages <= 0:
         _max_pages = None
     else:
         _max_pages = max_pages
 
-    # Read PDF data
-    pdf_data = await pdf.read()
+    # Spool PDF data to disk, pages are read from the file on demand
+    async with spool_upload(pdf, suffix=".pdf") as pdf_path:
+        # Call extraction service
+        result = await service.extract(
+            data=pdf_path,
+            filename=pdf.filename,
+            mode=response_format,
+            merge_algorithm=merge_algorithm,
+            max_pages=_max_pages,
+            encoding=encoding,
+            ocr_strategy=ocr_strategy,
+        )
+
+    return ApiResponse(
+        message="PDF extraction successful",
+        data=result,
+    )
+
+
+async def _encode_stream(
+    events: AsyncIterator[PDFStreamEvent],
+    stream_format: PDFStreamFormat,
+) -> AsyncIterator[str]:
+    async for event in events:
+        if stream_format == "sse":
+            yield f"event: {event.event}\ndata: {event.model_dump_json()}\n\n"
+        else:
+            yield event.model_dump_json() + "\n"
+
+
+@router.post("/extract/stream")
+async def stream_from_pdf(
+    pdf: Annotated[UploadFile, File(...)],
+    response_format: Annotated[OCRResponseFormat, Form(...)] = "json",
+    stream_format: Annotated[PDFStreamFormat, Form(...)] = DefaultPDFStreamFormat,
+    max_pages: Annotated[int, Form(...)] = 0,
+    ocr_strategy: Annotated[PDFOCRStrategy | None, Form()] = None,
+    image_format: Annotated[ImageWireFormat | None, Form()] = None,
+    image_quality: Annotated[int | None, Form(ge=1, le=100)] = None,
+    max_pixels: Annotated[int | None, Form(ge=0)] = None,
+    png_compress_level: Annotated[int | None, Form(ge=0, le=9)] = None,
+):
+    '''Stream a start event, one event per page as it completes, and a summary event.'''
+    # Initialize service
+    service = PDFExtractorService.provider()
+    encoding = service.ocr_service.ocr_llm_service.encoding_options(
+        format=image_format,
+        quality=image_quality,
+        max_pixels=max_pixels,
+        png_compress_level=png_compress_level,
+    )
+    _max_pages = max_pages if max_pages > 0 else None
+
+    # Spool PDF data to disk until the stream ends, and reject invalid documents before it starts
+    spool = AsyncExitStack()
+    pdf_path = await spool.enter_async_context(spool_upload(pdf, suffix=".pdf"))
+    try:
+        await service.count_pages(pdf_path, _max_pages)
+    except BaseException:
+        await spool.aclose()
+        raise
 
-    # Call extraction service
-    result = await service.extract(
-        data=pdf_data,
+    events = service.stream(
+        data=pdf_path,
         filename=pdf.filename,
         mode=response_format,
-        merge_algorithm=merge_algorithm,
         max_pages=_max_pages,
+        encoding=encoding,
+        ocr_strategy=ocr_strategy,
+    )
+    return StreamingResponse(
+        _encode_stream(events, stream_format),
+        media_type="text/event-stream" if stream_format == "sse" else "application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering
+        },
+        background=BackgroundTask(spool.aclose),
     )
-
-    return ApiResponse(
-        message="PDF extraction successful",
-        data=result,
-    )
\ No newline at end of file
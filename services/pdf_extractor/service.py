@@ -1,9 +1,10 @@
-from typing import Awaitable
-import fitz  # PyMuPDF
+import os
+from typing import AsyncIterator, Callable, Literal
 from PIL import Image
+import time
 import asyncio
 import uuid
-from io import BytesIO
+import logging
 
 import json
 
@@ -11,29 +12,84 @@ from pydantic import BaseModel
 
 from core.base import BaseService
 from core.interfaces.api_interface import (
+    OCRResponseFormat,
     PDFExtractionMode,
     DefaultPDFExtractionMode,
     PDFMergeAlgorithm,
     DefaultPDFMergeAlgorithm,
+    PDFOCRStrategy,
+    DefaultPDFOCRStrategy,
 )
 from core.services.minio import MinioService
-from services.ocr.service import OCRService, ExtractionResult
+from core.services.cpu_executor import CPUExecutorService
+from core.metrics import PAGES
+from core.tracing import span, record_span
+from core.services.ocr_llm import ImageEncodingOptions
+from services.ocr.service import OCRService, ExtractionResult, PictureCrops
+from services.pdf_extractor.renderer import PDFRendererService, PDFSource, RenderedPage
 from services.pdf_extractor.merge_services.table_aware import (
     TableAwareMergeConfig,
     TableAwareResultInput,
     TableAwareMergeService
 )
 
+logger = logging.getLogger("uvicorn.error")
+
+
+def _source_size(data: PDFSource) -> int:
+    return len(data) if isinstance(data, bytes) else os.path.getsize(data)
+
 
 class _Result(BaseModel):
     page_number: int
     ocr_result: str | list[ExtractionResult]
 
 
+class _PageInfo(BaseModel):
+    page_number: int
+    width: int
+    height: int
+    dpi: float
+    scale: float  # Rendered pixels per PDF point
+    source: Literal["vision", "text_layer"]
+
+
 class PDFExtractionResult(BaseModel):
     total_pages: int
     file: str
     result: str | list[_Result]
+    pages: list[_PageInfo] = []
+
+
+class PDFStreamStart(BaseModel):
+    event: Literal["start"] = "start"
+    total_pages: int
+    file: str
+
+
+class PDFStreamPage(BaseModel):
+    event: Literal["page"] = "page"
+    result: _Result
+    page: _PageInfo
+    completed_pages: int
+    total_pages: int
+
+
+class PDFStreamSummary(BaseModel):
+    event: Literal["summary"] = "summary"
+    total_pages: int
+    file: str
+    pages: list[_PageInfo]
+    elapsed_seconds: float
+
+
+class PDFStreamError(BaseModel):
+    event: Literal["error"] = "error"
+    detail: str
+    completed_pages: int
+
+
+PDFStreamEvent = PDFStreamStart | PDFStreamPage | PDFStreamSummary | PDFStreamError
 
 
 class PDFExtractorService(BaseService):
@@ -41,144 +97,329 @@ class PDFExtractorService(BaseService):
         self.ocr_service = OCRService.provider()
         self.minio_service = MinioService.provider()
         self.table_aware_merge_service = TableAwareMergeService.provider()
+        self.renderer_service = PDFRendererService.provider()
+        self.cpu_executor = CPUExecutorService.provider()
 
         self.pdf_bucket = "pdf-files"
         self.minio_service.create_bucket(self.pdf_bucket)
-        self.pdf_dpi = 400
+        self.render_window = int(os.getenv("PDF_RENDER_WINDOW", 8))  # Max pages in OCR, and rendered ahead of it
+        self.ocr_strategy: PDFOCRStrategy = os.getenv("PDF_OCR_STRATEGY", DefaultPDFOCRStrategy)  # type: ignore
         self.pdf_access_expire_seconds = 604800  # 7 days
 
-    def _pdf_to_images(
-        self,
-        data: bytes,
-        max_pages: int | None = None,
-    ) -> list[Image.Image]:
-        try:
-            pdf = fitz.open(stream=data, filetype="pdf")
-        except Exception as e:
-            raise ValueError("Failed to open PDF document") from e
+    async def count_pages(self, data: PDFSource, max_pages: int | None = None) -> int:
+        '''Number of pages that will be extracted; raises ValueError for invalid documents.'''
+        return await self.renderer_service.count_pages(data, max_pages)
 
-        images = []
-
-        try:
-            for page_idx in range(pdf.page_count):
-                if max_pages and page_idx >= max_pages:
-                    break
+    async def _store_pdf(self, data: PDFSource, filename: str | None) -> tuple[str, str]:
+        '''Save the PDF to MinIO under a unique name; returns the name and its access URL.'''
+        # Generate unique filename
+        if filename is None:
+            filename = str(uuid.uuid4()) + ".pdf"
+        else:
+            filename = filename.rsplit(".", 1)[0] + str(uuid.uuid4())[:8] + ".pdf"
 
-                page = pdf.load_page(page_idx)
+        # Save PDF to Minio, and get access URL; spooled uploads are streamed from disk
+        if isinstance(data, str):
+            access_url = await self.minio_service.publish_file_async(
+                bucket_name=self.pdf_bucket,
+                object_name=filename,
+                file_path=data,
+                expires=self.pdf_access_expire_seconds,
+            )
+        else:
+            access_url = await self.minio_service.publish_async(
+                bucket_name=self.pdf_bucket,
+                object_name=filename,
+                data=data,
+                expires=self.pdf_access_expire_seconds,
+            )
+        return filename, access_url
 
-                # ✅ Render directly using DPI (replaces Matrix(dpi/72))
-                pix = page.get_pixmap(dpi=self.pdf_dpi)
+    async def _iter_ocr_results(
+        self,
+        data: PDFSource,
+        page_count: int,
+        filename: str,
+        ocr_mode: OCRResponseFormat,
+        encoding: ImageEncodingOptions | None,
+        ocr_strategy: PDFOCRStrategy | None,
+        page_infos: list[_PageInfo],
+        picture_crops: dict[int, PictureCrops | None] | None = None,
+    ) -> AsyncIterator[tuple[int, str | list[ExtractionResult]]]:
+        '''OCR pages in parallel, yielding (page index, result) as each page completes.
 
-                # ✅ Safeguard: very rare case when image becomes too large (>4500px)
-                if pix.width > 4500 or pix.height > 4500:
-                    # Render at default 72 DPI instead
-                    pix = page.get_pixmap(dpi=72)
+        `page_infos` is filled in page order as pages are rendered. With
+        `picture_crops`, the picture regions of each page are kept in it.
+        '''
+        # Rasterize lazily: at most `render_window` pages are in OCR, with up to as many rendered
+        # ahead of them, and a page's raster is released as soon as its OCR result is final
+        window = asyncio.Semaphore(self.render_window)
+        done: asyncio.Queue[tuple[int, str | list[ExtractionResult]] | BaseException] = asyncio.Queue()
 
-                mode = "RGBA" if pix.alpha else "RGB"
-                img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+        async def ocr_page(page: RenderedPage):
+            page_idx, image = page["page_index"], page["image"]
+            try:
+                with span(
+                    "page",
+                    start=time.time() - page["render_seconds"],
+                    page_number=page_idx + 1,
+                    width=page["width"],
+                    height=page["height"],
+                    source="vision" if image is not None else "text_layer",
+                ) as page_span:
+                    # Timed in the render worker, so placed at the start of the page
+                    record_span(
+                        "render",
+                        page_span.start,
+                        page_span.start + page["render_seconds"],
+                        dpi=round(page["dpi"], 2),
+                        pixels=page["width"] * page["height"],
+                    )
+                    if image is None:
+                        # Born-digital page: layout comes from the PDF text layer, no LLM call
+                        text_results = [ExtractionResult.model_validate(r) for r in page["text_layer"] or []]
+                        PAGES.labels("text_layer").inc()
+                        if picture_crops is not None:
+                            picture_crops[page_idx] = None
+                        if ocr_mode == "markdown":
+                            done.put_nowait((page_idx, await self.cpu_executor.run(
+                                "markdown",
+                                self.ocr_service.convert_to_markdown,
+                                None,
+                                text_results,
+                                f"{filename}_page_{page_idx}.jpg",
+                            )))
+                        else:
+                            done.put_nowait((page_idx, text_results))
+                        return
 
-                # Always provide clean RGB
-                img = img.convert("RGB")
+                    ocr_result = await self.ocr_service.extract_image(
+                        image=image,
+                        filename=f"{filename}_page_{page_idx}.jpg",
+                        mode=ocr_mode,
+                        encoding=encoding,
+                    )
+                    if isinstance(ocr_result, list):
+                        page_span.set_attribute("elements", len(ocr_result))
+                    if picture_crops is not None and isinstance(ocr_result, list):
+                        picture_crops[page_idx] = await self.cpu_executor.run(
+                            "crop",
+                            PictureCrops,
+                            image,
+                            ocr_result,
+                            self.table_aware_merge_service.image_bbox_scale_factor,
+                        )
+                    done.put_nowait((page_idx, ocr_result))
+            except Exception as e:
+                done.put_nowait(e)
+            finally:
+                window.release()
 
-                images.append(img)
+        # In hybrid mode, pages with a reliable text layer skip the vision model
+        text_layer = (ocr_strategy or self.ocr_strategy) == "hybrid"
+        tasks: list[asyncio.Task] = []
 
-            return images
+        async def feed():
+            # Render off the event loop, starting each page's OCR as soon as it is rendered
+            pages = self.renderer_service.iter_pages(
+                data,
+                page_count,
+                prefetch=self.render_window,
+                text_layer=text_layer,
+            )
+            try:
+                while True:
+                    await window.acquire()
+                    page = await anext(pages, None)
+                    if page is None:
+                        window.release()
+                        break
+                    page_infos.append(_PageInfo(
+                        page_number=page["page_index"] + 1,
+                        width=page["width"],
+                        height=page["height"],
+                        dpi=round(page["dpi"], 2),
+                        scale=round(page["scale"], 4),
+                        source="vision" if page["text_layer"] is None else "text_layer",
+                    ))
+                    tasks.append(asyncio.create_task(ocr_page(page)))
+                    del page
+            except Exception as e:
+                done.put_nowait(e)
+            finally:
+                await pages.aclose()
 
+        feeder = asyncio.create_task(feed())
+        try:
+            for _ in range(page_count):
+                item = await done.get()
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
         finally:
-            pdf.close()
+            feeder.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(feeder, *tasks, return_exceptions=True)
 
     async def extract(
         self,
-        data: bytes,
+        data: PDFSource,
         filename: str | None = None,
         mode: PDFExtractionMode = DefaultPDFExtractionMode,
         merge_algorithm: PDFMergeAlgorithm = DefaultPDFMergeAlgorithm,
         merge_config: dict | None = None,
         max_pages: int | None = None,
+        encoding: ImageEncodingOptions | None = None,
+        ocr_strategy: PDFOCRStrategy | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
     ):
-        # Convert PDF to images
-        images = self._pdf_to_images(data, max_pages=max_pages)
-
-        # Generate unique filename
-        if filename is None:
-            filename = str(uuid.uuid4()) + ".pdf"
-        else:
-            filename = filename.rsplit(".", 1)[0] + str(uuid.uuid4())[:8] + ".pdf"
+        with span(
+            "pdf.extract",
+            filename=filename or "",
+            mode=mode,
+            merge_algorithm=merge_algorithm,
+            bytes=_source_size(data),
+        ) as root:
+            # Open PDF up front so invalid documents fail before anything is uploaded
+            page_count = await self.count_pages(data, max_pages)
+            root.set_attribute("pages", page_count)
+            filename, access_url = await self._store_pdf(data, filename)
 
-        # Save PDF to Minio, and get access URL
-        self.minio_service.upload(
-            bucket_name=self.pdf_bucket,
-            object_name=filename,
-            data=data,
-        )
-        access_url = self.minio_service.get_access_url(
-            bucket_name=self.pdf_bucket,
-            object_name=filename,
-            expires=self.pdf_access_expire_seconds,
-        )
-
-        # Determine OCR mode
-        if mode == "json":
-            ocr_mode = "json"
-        elif mode == "markdown":
-            ocr_mode = "markdown"
-        else:  # merged
-            if merge_algorithm == "table_aware":
+            # Determine OCR mode
+            ocr_mode: OCRResponseFormat
+            if mode == "json":
                 ocr_mode = "json"
-            else:  # simple
+            elif mode == "markdown":
                 ocr_mode = "markdown"
+            else:  # merged
+                if merge_algorithm == "table_aware":
+                    ocr_mode = "json"
+                else:  # simple
+                    ocr_mode = "markdown"
 
-        # Perform OCR parallely
-        tasks: list[Awaitable[str | list[ExtractionResult]]] = []
-        for i, image in enumerate(images):
-            buf = BytesIO()
-            image.save(buf, format="JPEG")
-            buf.seek(0)
-
-            tasks.append(self.ocr_service.extract(
-                data=buf.getvalue(),
-                filename=f"{filename}_page_{i}.jpg",
-                mode=ocr_mode,
-            ))
-        ocr_results = await asyncio.gather(*tasks)
-
-        if mode == "json" or mode == "markdown":
-            results: list[_Result] = []
-            for page_number, ocr_result in enumerate(ocr_results):
-                results.append(_Result(
-                    page_number=page_number + 1,
-                    ocr_result=ocr_result,
-                ))
-            return PDFExtractionResult(
-                total_pages=len(images),
-                file=access_url,
-                result=results,
-            )
+            # Table aware merge only needs the picture regions of each page
+            keep_picture_crops = mode == "merged" and merge_algorithm == "table_aware"
+            picture_crops: dict[int, PictureCrops | None] = {}
+            page_infos: list[_PageInfo] = []
+
+            # Perform OCR parallely
+            ocr_results: list[str | list[ExtractionResult]] = [[] for _ in range(page_count)]
+            completed_pages = 0
+            async for page_idx, ocr_result in self._iter_ocr_results(
+                data,
+                page_count,
+                filename,
+                ocr_mode,
+                encoding,
+                ocr_strategy,
+                page_infos,
+                picture_crops if keep_picture_crops else None,
+            ):
+                ocr_results[page_idx] = ocr_result
+                completed_pages += 1
+                if on_progress is not None:
+                    on_progress(completed_pages, page_count)
+
+            if mode == "json" or mode == "markdown":
+                results: list[_Result] = []
+                for page_number, ocr_result in enumerate(ocr_results):
+                    results.append(_Result(
+                        page_number=page_number + 1,
+                        ocr_result=ocr_result,
+                    ))
+                return PDFExtractionResult(
+                    total_pages=len(ocr_results),
+                    file=access_url,
+                    result=results,
+                    pages=page_infos,
+                )
         
-        # merged
-        if merge_algorithm == "table_aware":
-            table_aware_result_inputs: list[TableAwareResultInput] = [
-                TableAwareResultInput(
-                    page_number=page_number + 1,
-                    ocr_results=ocr_result,
+            # merged
+            if merge_algorithm == "table_aware":
+                table_aware_result_inputs: list[TableAwareResultInput] = [
+                    TableAwareResultInput(
+                        page_number=page_number + 1,
+                        ocr_results=ocr_result,
+                    )
+                    for page_number, ocr_result in enumerate(ocr_results)
+                    if isinstance(ocr_result, list)
+                ]
+                # CPU-bound geometry and picture uploads, kept off the event loop
+                result = await self.cpu_executor.run(
+                    "merge",
+                    self.table_aware_merge_service.merge,
+                    images=[picture_crops[i] for i in range(len(ocr_results))],
+                    filename=filename,
+                    results=table_aware_result_inputs,
+                    config=TableAwareMergeConfig.model_validate(merge_config or {}),
                 )
-                for page_number, ocr_result in enumerate(ocr_results)
-                if isinstance(ocr_result, list)
-            ]
-            result = self.table_aware_merge_service.merge(
-                images=images,
-                filename=filename,
-                results=table_aware_result_inputs,
-                config=TableAwareMergeConfig.model_validate(merge_config or {}),
+
+            else:  # merged_algorithm: simple
+                result = "\n\n".join(
+                    result if isinstance(result, str) else ""
+                    for result in ocr_results
+                )
+            return PDFExtractionResult(
+                total_pages=len(ocr_results),
+                file=access_url,
+                result=result,
+                pages=page_infos,
             )
 
-        else:  # merged_algorithm: simple
-            result = "\n\n".join(
-                result if isinstance(result, str) else ""
-                for result in ocr_results
+    async def stream(
+        self,
+        data: PDFSource,
+        filename: str | None = None,
+        mode: OCRResponseFormat = "json",
+        max_pages: int | None = None,
+        encoding: ImageEncodingOptions | None = None,
+        ocr_strategy: PDFOCRStrategy | None = None,
+    ) -> AsyncIterator[PDFStreamEvent]:
+        '''Yield each page's result as soon as it completes, between a start and a summary event.
+
+        Failures after the start event are reported as an error event, since
+        the response status has already been sent.
+        '''
+        with span(
+            "pdf.stream",
+            filename=filename or "",
+            mode=mode,
+            bytes=_source_size(data),
+        ) as root:
+            started = time.monotonic()
+            page_count = await self.count_pages(data, max_pages)
+            root.set_attribute("pages", page_count)
+            filename, access_url = await self._store_pdf(data, filename)
+            yield PDFStreamStart(total_pages=page_count, file=access_url)
+
+            page_infos: list[_PageInfo] = []
+            completed_pages = 0
+            try:
+                async for page_idx, ocr_result in self._iter_ocr_results(
+                    data,
+                    page_count,
+                    filename,
+                    mode,
+                    encoding,
+                    ocr_strategy,
+                    page_infos,
+                ):
+                    completed_pages += 1
+                    yield PDFStreamPage(
+                        result=_Result(page_number=page_idx + 1, ocr_result=ocr_result),
+                        page=page_infos[page_idx],
+                        completed_pages=completed_pages,
+                        total_pages=page_count,
+                    )
+            except Exception as e:
+                logger.exception("PDF stream failed")
+                yield PDFStreamError(detail=str(e), completed_pages=completed_pages)
+                return
+
+            yield PDFStreamSummary(
+                total_pages=page_count,
+                file=access_url,
+                pages=page_infos,
+                elapsed_seconds=round(time.monotonic() - started, 3),
             )
-        return PDFExtractionResult(
-            total_pages=len(images),
-            file=access_url,
-            result=result,
-        )
\ No newline at end of file
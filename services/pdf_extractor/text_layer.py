@@ -0,0 +1,116 @@
+from typing import TypedDict
+import re
+from collections import Counter
+
+import fitz  # PyMuPDF
+
+
+class TextLayerOptions(TypedDict):
+    min_chars: int  # Fewer characters means a scanned or mostly graphic page
+    max_image_coverage: float  # Fraction of the page covered by raster images
+    max_invalid_char_ratio: float  # Replacement / private-use glyphs from broken font encodings
+    max_drawings: int  # Vector paths, above which the page likely has charts or figures
+    detect_tables: bool  # Send pages with ruled tables to the vision model
+
+
+_LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[•◦▪‣●○■□\-–—*]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+")
+_BOLD_FLAG = 1 << 4
+
+
+def _is_invalid_char(c: str) -> bool:
+    return c == "\ufffd" or "\ue000" <= c <= "\uf8ff"
+
+
+def _image_coverage(page: fitz.Page) -> float:
+    page_area = abs(page.rect)
+    if page_area <= 0:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return min(1.0, covered / page_area)
+
+
+def _block_text(block: dict) -> str:
+    lines = []
+    for line in block["lines"]:
+        text = "".join(span["text"] for span in line["spans"]).strip()
+        if text:
+            lines.append(text)
+    return "\n".join(lines)
+
+
+def _block_font(block: dict) -> tuple[float, bool]:
+    '''Largest font size in the block, and whether all of its text is bold.'''
+    sizes = [span["size"] for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+    bold = all(
+        span["flags"] & _BOLD_FLAG
+        for line in block["lines"] for span in line["spans"] if span["text"].strip()
+    )
+    return (max(sizes) if sizes else 0.0), bold
+
+
+def extract_text_layer(
+    page: fitz.Page,
+    scale: float,
+    options: TextLayerOptions,
+) -> list[dict] | None:
+    '''Build OCR-style layout elements from a page's native text layer.
+
+    Returns None when the text layer is missing or unreliable, or the page has
+    images, figures or tables, so the page must go through the vision model.
+    Bboxes are scaled by `scale` to match the coordinates of a rendered page.
+    '''
+    if any("GlyphLessFont" in font[3] for font in page.get_fonts()):
+        return None  # Invisible OCR text over a scanned image
+
+    if _image_coverage(page) > options["max_image_coverage"]:
+        return None
+
+    blocks = [b for b in page.get_text("dict", sort=True)["blocks"] if b["type"] == 0]
+    texts = [_block_text(b) for b in blocks]
+    chars = [c for text in texts for c in text if not c.isspace()]
+    if len(chars) < options["min_chars"]:
+        return None
+    if sum(_is_invalid_char(c) for c in chars) / len(chars) > options["max_invalid_char_ratio"]:
+        return None
+
+    if len(page.get_cdrawings()) > options["max_drawings"]:
+        return None
+    if options["detect_tables"] and page.find_tables().tables:
+        return None
+
+    # Body font size is the size carrying the most characters
+    size_weights: Counter[float] = Counter()
+    for block in blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                size_weights[round(span["size"], 1)] += len(span["text"].strip())
+    body_size = size_weights.most_common(1)[0][0] if size_weights else 0.0
+
+    height = page.rect.height
+    results: list[dict] = []
+    for block, text in zip(blocks, texts):
+        if not text:
+            continue
+        x0, y0, x1, y1 = block["bbox"]
+        size, bold = _block_font(block)
+        short = len(text) <= 120 and "\n" not in text
+
+        if y1 <= height * 0.06 and short:
+            category = "Page-header"
+        elif y0 >= height * 0.94 and short:
+            category = "Page-footer"
+        elif short and (size >= body_size * 1.25 or (bold and size >= body_size)):
+            category = "Section-header"
+        elif _LIST_ITEM_PATTERN.match(text):
+            category = "List-item"
+        else:
+            category = "Text"
+
+        results.append({
+            "bbox": [round(x0 * scale), round(y0 * scale), round(x1 * scale), round(y1 * scale)],
+            "category": category,
+            "text": text,
+        })
+    return results
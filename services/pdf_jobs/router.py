@@ -0,0 +1,94 @@
+from typing import Annotated
+from fastapi import APIRouter, UploadFile, File, Form
+
+from core.interfaces.api_interface import (
+    ApiResponse,
+    PDFExtractionMode,
+    DefaultPDFExtractionMode,
+    PDFMergeAlgorithm,
+    DefaultPDFMergeAlgorithm,
+    PDFOCRStrategy,
+    ImageWireFormat,
+)
+from core.utils import spool_upload
+from services.pdf_extractor.service import PDFExtractionResult
+from services.pdf_jobs.service import PDFJobService, PDFJob, PDFJobParams
+
+
+router = APIRouter()
+
+
+@router.post("", response_model=ApiResponse[PDFJob])
+async def submit_pdf_job(
+    pdf: Annotated[UploadFile, File(...)],
+    response_format: Annotated[PDFExtractionMode, Form(...)] = DefaultPDFExtractionMode,
+    merge_algorithm: Annotated[PDFMergeAlgorithm, Form(...)] = DefaultPDFMergeAlgorithm,
+    max_pages: Annotated[int, Form(...)] = 0,
+    ocr_strategy: Annotated[PDFOCRStrategy | None, Form()] = None,
+    image_format: Annotated[ImageWireFormat | None, Form()] = None,
+    image_quality: Annotated[int | None, Form(ge=1, le=100)] = None,
+    max_pixels: Annotated[int | None, Form(ge=0)] = None,
+    png_compress_level: Annotated[int | None, Form(ge=0, le=9)] = None,
+):
+    # Initialize service
+    service = PDFJobService.provider()
+    encoding = service.extractor_service.ocr_service.ocr_llm_service.encoding_options(
+        format=image_format,
+        quality=image_quality,
+        max_pixels=max_pixels,
+        png_compress_level=png_compress_level,
+    )
+
+    # Spool PDF data to disk, it is streamed to MinIO from there
+    async with spool_upload(pdf, suffix=".pdf") as pdf_path:
+        job = await service.submit(
+            data=pdf_path,
+            params=PDFJobParams(
+                filename=pdf.filename,
+                mode=response_format,
+                merge_algorithm=merge_algorithm,
+                max_pages=max_pages if max_pages > 0 else None,
+                ocr_strategy=ocr_strategy,
+                encoding=encoding,
+            ),
+        )
+
+    return ApiResponse(
+        message="PDF extraction job queued",
+        data=job,
+    ).as_json_response(202)
+
+
+@router.get("/{job_id}", response_model=ApiResponse[PDFJob])
+async def get_pdf_job(job_id: str):
+    job = await PDFJobService.provider().get(job_id)
+    if job is None:
+        return ApiResponse(message="Job not found").as_json_response(404)
+
+    return ApiResponse(
+        message="PDF extraction job status",
+        data=job,
+    )
+
+
+@router.get("/{job_id}/result", response_model=ApiResponse[PDFExtractionResult])
+async def get_pdf_job_result(job_id: str):
+    service = PDFJobService.provider()
+    job = await service.get(job_id)
+    if job is None:
+        return ApiResponse(message="Job not found").as_json_response(404)
+    if job.status == "failed":
+        return ApiResponse(message="PDF extraction failed", data={
+            "detail": job.error,
+        }).as_json_response(500)
+    if job.status != "completed":
+        return ApiResponse(message=f"Job is {job.status}", data=job).as_json_response(409)
+
+    result = await service.get_result(job_id)
+    if result is None:
+        return ApiResponse(message="Job result expired").as_json_response(404)
+
+    return ApiResponse(
+        message="PDF extraction successful",
+        data=result,
+    )
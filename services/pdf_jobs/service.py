@@ -0,0 +1,330 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import tempfile
+
+from pydantic import BaseModel
+
+from core.base import BaseService
+from core.utils import UPLOAD_SPOOL_DIR
+from core.interfaces.api_interface import (
+    PDFExtractionMode,
+    DefaultPDFExtractionMode,
+    PDFMergeAlgorithm,
+    DefaultPDFMergeAlgorithm,
+    PDFOCRStrategy,
+    PDFJobStatus,
+)
+from core.services.redis import RedisService, AsyncRedisService
+from core.services.minio import MinioService
+from core.services.ocr_llm import ImageEncodingOptions
+from services.pdf_extractor.renderer import PDFSource
+from services.pdf_extractor.service import PDFExtractorService, PDFExtractionResult
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class PDFJobParams(BaseModel):
+    filename: str | None = None
+    mode: PDFExtractionMode = DefaultPDFExtractionMode
+    merge_algorithm: PDFMergeAlgorithm = DefaultPDFMergeAlgorithm
+    max_pages: int | None = None
+    ocr_strategy: PDFOCRStrategy | None = None
+    encoding: ImageEncodingOptions | None = None
+
+
+class PDFJob(BaseModel):
+    job_id: str
+    status: PDFJobStatus
+    params: PDFJobParams
+    total_pages: int
+    completed_pages: int = 0
+    error: str | None = None
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+
+
+class PDFJobStats(BaseModel):
+    workers: int
+    running: int
+    queued: int
+
+
+class PDFJobService(BaseService):
+    '''Runs PDF extractions as background jobs.
+
+    Submitted PDFs are stored in MinIO and their ids pushed to a Redis list.
+    Job state, progress and results are kept in Redis for `PDF_JOB_TTL`
+    seconds. API processes with `PDF_JOB_WORKER_EMBEDDED` set run
+    `PDF_JOB_WORKERS` workers each; a job taken by a worker is parked in the
+    process' own processing list until it finishes.
+    The process holds a lease it renews every third of `PDF_JOB_LEASE`
+    seconds, and the jobs of a process whose lease expired, e.g. after a crash
+    or a redeploy, are queued again by the other processes.
+    '''
+    def __init__(self):
+        self.extractor_service = PDFExtractorService.provider()
+        self.redis_service = RedisService.provider()
+        self.async_redis_service = AsyncRedisService.provider()  # Blocking pops, which outlast the sync client's socket timeout
+        self.minio_service = MinioService.provider()
+
+        self.workers = int(os.getenv("PDF_JOB_WORKERS", 2))
+        self.ttl_seconds = int(os.getenv("PDF_JOB_TTL", 604800))  # 7 days
+        self.poll_timeout = int(os.getenv("PDF_JOB_POLL_TIMEOUT", 5))
+        self.lease_seconds = int(os.getenv("PDF_JOB_LEASE", 30))
+        # Unique per process, a restarted or sibling process never shares a processing list
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.key_prefix = "pdf_jobs"
+        self.queue_key = f"{self.key_prefix}:queue"
+        self.workers_key = f"{self.key_prefix}:workers"
+        self.processing_key = self._processing_key(self.worker_id)
+        self.job_bucket = "pdf-jobs"
+        self.minio_service.create_bucket(self.job_bucket)
+
+        self.running = 0
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+        self._heartbeat_task: asyncio.Task | None = None
+
+    def _processing_key(self, worker_id: str) -> str:
+        return f"{self.key_prefix}:processing:{worker_id}"
+
+    def _lease_key(self, worker_id: str) -> str:
+        return f"{self.key_prefix}:lease:{worker_id}"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.key_prefix}:job:{job_id}"
+
+    def _result_key(self, job_id: str) -> str:
+        return f"{self.key_prefix}:result:{job_id}"
+
+    def _object_name(self, job_id: str) -> str:
+        return f"{job_id}.pdf"
+
+    async def _save(self, job: PDFJob):
+        # Serialized on the loop, so later changes to the job do not race the write
+        await asyncio.to_thread(
+            self.redis_service.set,
+            self._job_key(job.job_id),
+            job.model_dump(mode="json"),
+            expire=self.ttl_seconds,
+        )
+
+    async def get(self, job_id: str) -> PDFJob | None:
+        value = await asyncio.to_thread(self.redis_service.get, self._job_key(job_id))
+        if value is None:
+            return None
+        return PDFJob.model_validate(value)
+
+    async def get_result(self, job_id: str) -> PDFExtractionResult | None:
+        value = await asyncio.to_thread(self.redis_service.get, self._result_key(job_id))
+        if value is None:
+            return None
+        return PDFExtractionResult.model_validate(value)
+
+    async def submit(
+        self,
+        data: PDFSource,
+        params: PDFJobParams,
+    ) -> PDFJob:
+        # Reject invalid documents before they are queued
+        total_pages = await self.extractor_service.count_pages(data, params.max_pages)
+
+        job = PDFJob(
+            job_id=str(uuid.uuid4()),
+            status="queued",
+            params=params,
+            total_pages=total_pages,
+            created_at=time.time(),
+        )
+        if isinstance(data, str):
+            await self.minio_service.upload_file_async(
+                bucket_name=self.job_bucket,
+                object_name=self._object_name(job.job_id),
+                file_path=data,
+            )
+        else:
+            await self.minio_service.upload_async(
+                bucket_name=self.job_bucket,
+                object_name=self._object_name(job.job_id),
+                data=data,
+            )
+        await self._save(job)
+        await asyncio.to_thread(self.redis_service.rpush, self.queue_key, job.job_id)
+        return job
+
+    async def _run(self, job_id: str):
+        job = await self.get(job_id)
+        if job is None:
+            logger.warning(f"PDF job {job_id} expired before it was started")
+            return
+
+        job.status = "running"
+        job.started_at = time.time()
+        job.completed_pages = 0
+        await self._save(job)
+
+        # Progress is written by one task, updates made during a write are coalesced into the next
+        progress = asyncio.Event()
+        reporting = True
+
+        def on_progress(completed_pages: int, total_pages: int):
+            job.completed_pages = completed_pages
+            job.total_pages = total_pages
+            progress.set()
+
+        async def report_progress():
+            while True:
+                await progress.wait()
+                progress.clear()
+                if not reporting:
+                    return
+                try:
+                    await self._save(job)
+                except Exception as e:
+                    logger.warning(f"PDF job {job_id} progress update failed: {e}")
+
+        reporter = asyncio.create_task(report_progress())
+
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf", dir=UPLOAD_SPOOL_DIR)
+        os.close(fd)
+        try:
+            # Stream the input to disk, pages are read from the file on demand
+            await self.minio_service.download_file_async(
+                self.job_bucket,
+                self._object_name(job_id),
+                pdf_path,
+            )
+            result = await self.extractor_service.extract(
+                data=pdf_path,
+                filename=job.params.filename,
+                mode=job.params.mode,
+                merge_algorithm=job.params.merge_algorithm,
+                max_pages=job.params.max_pages,
+                encoding=job.params.encoding,
+                ocr_strategy=job.params.ocr_strategy,
+                on_progress=on_progress,
+            )
+            await asyncio.to_thread(
+                self.redis_service.set,
+                self._result_key(job_id),
+                result.model_dump(mode="json"),
+                expire=self.ttl_seconds,
+            )
+            job.status = "completed"
+        except Exception as e:
+            logger.exception(f"PDF job {job_id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            os.remove(pdf_path)
+            # A progress write in flight finishes first, so it cannot overwrite the final state
+            reporting = False
+            progress.set()
+            await reporter
+
+        job.finished_at = time.time()
+        await self._save(job)
+        try:
+            await self.minio_service.remove_object_async(self.job_bucket, self._object_name(job_id))
+        except Exception as e:
+            logger.warning(f"Failed to remove input of PDF job {job_id}: {e}")
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                # Returns at least every poll_timeout
+                job_id = await self.async_redis_service.blmove(
+                    self.queue_key,
+                    self.processing_key,
+                    self.poll_timeout,
+                    "LEFT",
+                    "RIGHT",
+                )
+            except Exception as e:
+                logger.warning(f"PDF job queue unavailable: {e}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            if job_id is None:
+                continue
+
+            job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+            self.running += 1
+            try:
+                await self._run(job_id)
+            finally:
+                self.running -= 1
+            # Not reached on cancellation, so an interrupted job is picked up again
+            try:
+                await asyncio.to_thread(self.redis_service.lrem, self.processing_key, 1, job_id)
+            except Exception as e:
+                logger.warning(f"Failed to release PDF job {job_id}: {e}")
+
+    def _renew_lease(self):
+        self.redis_service.set(
+            self._lease_key(self.worker_id),
+            {"renewed_at": time.time()},
+            expire=self.lease_seconds,
+        )
+        self.redis_service.sadd(self.workers_key, self.worker_id)
+
+    def _requeue_expired(self):
+        for worker_id in self.redis_service.smembers(self.workers_key):  # type: ignore
+            worker_id = worker_id.decode() if isinstance(worker_id, bytes) else worker_id
+            if worker_id == self.worker_id or self.redis_service.exists(self._lease_key(worker_id)):
+                continue
+            # Each job is moved atomically, so processes reclaiming at the same time never duplicate one
+            while True:
+                job_id = self.redis_service.lmove(self._processing_key(worker_id), self.queue_key, "RIGHT", "LEFT")
+                if job_id is None:
+                    break
+                logger.info(f"Requeued interrupted PDF job {job_id.decode() if isinstance(job_id, bytes) else job_id}")
+            self.redis_service.srem(self.workers_key, worker_id)
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._renew_lease)
+                await asyncio.to_thread(self._requeue_expired)
+            except Exception as e:
+                logger.warning(f"PDF job lease renewal failed: {e}")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    def start(self):
+        if self.workers <= 0 or self._tasks:
+            return
+        self._stopping = False
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Running jobs are cancelled and stay in the processing list, they are
+        # queued again by the next process that sees the lease gone
+        self._stopping = True
+        tasks = self._tasks + ([self._heartbeat_task] if self._heartbeat_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._heartbeat_task = None
+        try:
+            await asyncio.to_thread(self.redis_service.delete, self._lease_key(self.worker_id))
+        except Exception as e:
+            logger.warning(f"Failed to release PDF job lease: {e}")
+
+    def stats(self) -> PDFJobStats:
+        queued = 0
+        try:
+            queued = int(self.redis_service.llen(self.queue_key))  # type: ignore
+        except Exception as e:
+            logger.warning(f"PDF job stats failed: {e}")
+        return PDFJobStats(
+            workers=len(self._tasks),
+            running=self.running,
+            queued=queued,
+        )
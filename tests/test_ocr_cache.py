@@ -0,0 +1,109 @@
+import asyncio
+import itertools
+
+import fakeredis
+import pytest
+from PIL import Image
+
+from core.services import ocr_cache
+from core.services.ocr_cache import OCRCacheService
+from core.services.ocr_llm import EncodedImage, ExtractionResult, OCRCompletion, OCRLLMService
+from core.services.redis import RedisService
+
+
+@pytest.fixture
+def redis_service() -> RedisService:
+    service = RedisService()
+    service.connection_pool = fakeredis.FakeRedis().connection_pool
+    return service
+
+
+@pytest.fixture
+def cache(monkeypatch, redis_service) -> OCRCacheService:
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "true")
+    monkeypatch.setenv("OCR_CACHE_MAX_ENTRIES", "2")
+    service = OCRCacheService()
+    service.redis_service = redis_service
+    return service
+
+
+@pytest.fixture
+def ocr_llm(cache) -> OCRLLMService:
+    service = OCRLLMService()
+    service.cache_service = cache
+    return service
+
+
+def _page(color: str = "white") -> Image.Image:
+    return Image.new("RGB", (200, 300), color)
+
+
+def _result(y: int) -> ExtractionResult:
+    return ExtractionResult(bbox=[0, y, 100, y + 20], category="Text", text=f"line at {y}")
+
+
+def test_cache_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("OCR_CACHE_ENABLED", raising=False)
+    assert not OCRCacheService().enabled
+
+
+def test_make_key_covers_pixels_and_params(cache):
+    params = {"model": "m", "temperature": 0.1}
+    key = cache.make_key(_page(), params)
+
+    assert cache.make_key(_page(), dict(reversed(params.items()))) == key
+    assert cache.make_key(_page("black"), params) != key
+    assert cache.make_key(_page(), {**params, "temperature": 0.2}) != key
+    assert cache.make_key(_page().convert("L"), params) != key
+
+
+def test_least_recently_used_entry_is_evicted(cache, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(ocr_cache.time, "time", lambda: next(clock))
+
+    cache.set("a", [{"text": "a"}])
+    cache.set("b", [{"text": "b"}])
+    assert cache.get("a") == [{"text": "a"}]  # Touched, so "b" is now the oldest
+    cache.set("c", [{"text": "c"}])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [{"text": "a"}]
+    assert cache.get("c") == [{"text": "c"}]
+    assert cache.stats().entries == 2
+
+
+def test_complete_pages_are_served_from_cache(ocr_llm, cache):
+    calls = 0
+
+    async def complete(encoded: EncodedImage) -> OCRCompletion:
+        nonlocal calls
+        calls += 1
+        return OCRCompletion(results=[_result(10)])
+
+    first = asyncio.run(ocr_llm.extract_text_async(_page(), complete=complete))
+    second = asyncio.run(ocr_llm.extract_text_async(_page(), complete=complete))
+
+    assert calls == 1
+    assert second == first
+    assert cache.hits == 1
+
+
+def test_partial_pages_are_not_cached(ocr_llm, cache):
+    calls = 0
+
+    async def complete(encoded: EncodedImage) -> OCRCompletion:
+        nonlocal calls
+        calls += 1
+        # Cut short on the whole page, and nothing recovered from the rest of it
+        whole_page = encoded.height == _page().height
+        return OCRCompletion(results=[_result(10)] if whole_page else [], truncated=True)
+
+    results = asyncio.run(ocr_llm.extract_text_async(_page(), complete=complete))
+
+    assert [r.text for r in results] == ["line at 10"]
+    assert calls == 2
+    assert cache.stats().entries == 0
+
+    asyncio.run(ocr_llm.extract_text_async(_page(), complete=complete))
+    assert calls == 4
+    assert cache.hits == 0
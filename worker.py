@@ -0,0 +1,24 @@
+import os
+import asyncio
+import logging
+
+from core.metrics import serve_metrics
+from services.ocr_worker.service import OCRWorkerService
+
+
+async def main():
+    # Prometheus metrics of a standalone worker, which has no API
+    metrics_port = int(os.getenv("OCR_WORKER_METRICS_PORT", 0))
+    metrics_server = asyncio.create_task(serve_metrics(metrics_port)) if metrics_port > 0 else None
+    try:
+        await OCRWorkerService.provider().run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.cancel()
+
+
+# Standalone OCR worker: python worker.py (with OCR_DISPATCH=redis)
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(main())